@@ -0,0 +1,152 @@
+"""
+Offline end-to-end benchmark for /getinfo.
+
+Starts local stubs for Telegram, Bubblemaps, DexScreener and
+screenshotmachine, points the bot at them and drives getinfo_command with
+synthetic chats. Nothing leaves the machine.
+
+    python -m benchmarks.bench_getinfo --chats 200 --requests 5 --tokens 20
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import resource
+import tempfile
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stubs import StubConfig, StubUpstreams
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=100, help="concurrent synthetic chats")
+    parser.add_argument("--requests", type=int, default=5, help="/getinfo requests sent by each chat, one after another")
+    parser.add_argument("--tokens", type=int, default=20, help="distinct tokens the chats ask about")
+    parser.add_argument("--nodes", type=int, default=150, help="holders in each map-data payload")
+    parser.add_argument("--links", type=int, default=60, help="wallet links in each map-data payload")
+    parser.add_argument("--screenshot-bytes", type=int, default=150_000, help="size of each stub screenshot")
+    parser.add_argument("--telegram-latency", type=float, default=30, help="ms per Telegram call")
+    parser.add_argument("--bubblemaps-latency", type=float, default=300, help="ms per Bubblemaps call")
+    parser.add_argument("--dexscreener-latency", type=float, default=150, help="ms per DexScreener call")
+    parser.add_argument("--screenshot-latency", type=float, default=3000, help="ms per screenshot call")
+    parser.add_argument("--jitter", type=float, default=0.2, help="extra random latency as a fraction of the base latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of failed Bubblemaps/DexScreener/screenshot calls")
+    parser.add_argument("--backend", choices=["local", "external"], default=None, help="SCREENSHOT_BACKEND to use")
+    parser.add_argument("--keep-rate-limits", action="store_true", help="keep per-user/per-chat limits and Telegram pacing (off by default)")
+    return parser.parse_args(argv)
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+def stub_config(latency_ms: float, jitter: float, error_rate: float = 0.0) -> StubConfig:
+    return StubConfig(latency=latency_ms / 1000, jitter=latency_ms / 1000 * jitter, error_rate=error_rate)
+
+async def run(args: argparse.Namespace) -> dict:
+    stubs = StubUpstreams(
+        telegram=stub_config(args.telegram_latency, args.jitter),
+        bubblemaps=stub_config(args.bubblemaps_latency, args.jitter, args.error_rate),
+        dexscreener=stub_config(args.dexscreener_latency, args.jitter, args.error_rate),
+        screenshot=stub_config(args.screenshot_latency, args.jitter, args.error_rate),
+        nodes=args.nodes,
+        links=args.links,
+        screenshot_bytes=args.screenshot_bytes
+    )
+    await stubs.start()
+
+    # The bot reads its endpoints from the environment at import time
+    os.environ.update(stubs.environ())
+    os.environ.setdefault("BUBBLER_TOKEN", "1:benchmark")
+    os.environ["SCREENSHOT_CACHE_DIR"] = tempfile.mkdtemp(prefix="bubbler-bench-")
+    if args.backend:
+        os.environ["SCREENSHOT_BACKEND"] = args.backend
+
+    import main
+    from telebot import types
+
+    if not args.keep_rate_limits:
+        main.RATE_LIMIT_PER_USER = main.RATE_LIMIT_PER_CHAT = 10 ** 9
+        main.sender = main.TelegramSender(main.bot, rate=10 ** 9, chat_rate=10 ** 9, group_rate=10 ** 9)
+
+    await main.http_client.start()
+    if main.SCREENSHOT_BACKEND == "local":
+        main.worker_pool.start()
+        # Wait for the worker processes so startup is not measured
+        await main.worker_pool.run(int)
+
+    tokens = [f"0x{i:040x}" for i in range(1, args.tokens + 1)]
+    latencies: List[float] = []
+    errors = 0
+
+    def make_message(chat_id: int, message_id: int, text: str) -> types.Message:
+        return types.Message.de_json({
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"},
+            "text": text
+        })
+
+    async def chat(chat_id: int) -> None:
+        nonlocal errors
+        for n in range(args.requests):
+            token = tokens[(chat_id * args.requests + n) % len(tokens)]
+            message = make_message(chat_id, n + 1, f"/getinfo eth {token}")
+            start = time.perf_counter()
+            try:
+                await main.getinfo_command(message)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(chat(chat_id) for chat_id in range(1, args.chats + 1)))
+    elapsed = time.perf_counter() - started
+
+    # Reap the workers so their peak RSS is counted
+    main.worker_pool.shutdown(wait=True)
+    await main.http_client.close()
+    await main.bot.close_session()
+    await stubs.stop()
+
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies, default=0) * 1000,
+        "upstream_calls": dict(sorted(stubs.calls.items())),
+        "peak_rss_mb": own / 1024,
+        "peak_rss_children_mb": children / 1024,
+        "map_cache": main.map_cache.stats()
+    }
+
+def report(results: dict) -> str:
+    lines = [
+        f"requests      {results['requests']} ({results['errors']} raised)",
+        f"elapsed       {results['elapsed_s']:.2f} s",
+        f"throughput    {results['rps']:.1f} req/s",
+        f"latency p50   {results['p50_ms']:.0f} ms",
+        f"latency p95   {results['p95_ms']:.0f} ms",
+        f"latency p99   {results['p99_ms']:.0f} ms",
+        f"latency max   {results['max_ms']:.0f} ms",
+        f"peak RSS      {results['peak_rss_mb']:.1f} MB (largest child process {results['peak_rss_children_mb']:.1f} MB)",
+        f"map cache     {results['map_cache']}",
+        "upstream calls:"
+    ]
+    lines += [f"  {name:<32} {count}" for name, count in results["upstream_calls"].items()]
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    print(report(asyncio.run(run(parse_args()))))
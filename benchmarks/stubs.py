@@ -0,0 +1,192 @@
+import json
+import time
+import random
+import asyncio
+from collections import Counter
+from typing import Optional
+from aiohttp import web
+
+class StubConfig:
+    """Behaviour of one stub upstream."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    async def delay(self, rng: random.Random) -> None:
+        latency = self.latency + rng.uniform(0, self.jitter)
+        if latency > 0:
+            await asyncio.sleep(latency)
+
+    def fails(self, rng: random.Random) -> bool:
+        return rng.random() < self.error_rate
+
+class StubUpstreams:
+    """
+    Local stand-ins for Telegram, Bubblemaps, DexScreener and screenshotmachine.
+
+    All four are served by one aiohttp app on a local port, each under its
+    own path prefix, with configurable latency, error rate and payload size.
+    Every request is counted per upstream and per method.
+    """
+
+    def __init__(
+        self,
+        telegram: Optional[StubConfig] = None,
+        bubblemaps: Optional[StubConfig] = None,
+        dexscreener: Optional[StubConfig] = None,
+        screenshot: Optional[StubConfig] = None,
+        nodes: int = 150,
+        links: int = 60,
+        screenshot_bytes: int = 150_000,
+        seed: int = 0
+    ):
+        self.telegram = telegram or StubConfig()
+        self.bubblemaps = bubblemaps or StubConfig()
+        self.dexscreener = dexscreener or StubConfig()
+        self.screenshot = screenshot or StubConfig()
+        self.nodes = nodes
+        self.links = links
+        self.screenshot_bytes = screenshot_bytes
+        self.rng = random.Random(seed)
+        self.calls = Counter()
+        self._message_id = 0
+        self._runner: Optional[web.AppRunner] = None
+        self.port: Optional[int] = None
+
+        self.app = web.Application(client_max_size=50 * 1024 * 1024)
+        self.app.router.add_route("*", "/telegram/bot{token}/{method}", self.handle_telegram)
+        self.app.router.add_get("/bubblemaps/map-data", self.handle_bubblemaps)
+        self.app.router.add_get("/dexscreener/tokens/{addresses}", self.handle_dexscreener)
+        self.app.router.add_get("/screenshot", self.handle_screenshot)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def environ(self) -> dict:
+        """Environment variables that point the bot at these stubs."""
+        return {
+            "TELEGRAM_API_URL": f"{self.base_url}/telegram/bot{{0}}/{{1}}",
+            "BUBBLEMAPS_API_URL": f"{self.base_url}/bubblemaps/map-data",
+            "DEXSCREENER_API_URL": f"{self.base_url}/dexscreener/tokens",
+            "SCREENSHOT_API_URL": f"{self.base_url}/screenshot",
+            "SCREENSHOT_API_TOKEN": "stub"
+        }
+
+    async def start(self) -> None:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def handle_telegram(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[f"telegram.{method}"] += 1
+        # Read uploads in full, as Telegram would
+        await request.read()
+        await self.telegram.delay(self.rng)
+        if self.telegram.fails(self.rng):
+            return web.json_response(
+                {"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1", "parameters": {"retry_after": 1}},
+                status=429
+            )
+
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "StubBot", "username": "stub_bot"}
+        elif method == "deleteMessage":
+            result = True
+        else:
+            self._message_id += 1
+            result = {
+                "message_id": self._message_id,
+                "date": int(time.time()),
+                "chat": {"id": 1, "type": "private"}
+            }
+            if method in ("sendPhoto", "editMessageMedia", "editMessageCaption"):
+                result["photo"] = [{
+                    "file_id": f"stub-file-{self._message_id}",
+                    "file_unique_id": f"stub-{self._message_id}",
+                    "width": 1024,
+                    "height": 768
+                }]
+        return web.json_response({"ok": True, "result": result})
+
+    async def handle_bubblemaps(self, request: web.Request) -> web.Response:
+        self.calls["bubblemaps"] += 1
+        await self.bubblemaps.delay(self.rng)
+        if self.bubblemaps.fails(self.rng):
+            return web.Response(status=500)
+
+        token = request.query.get("token", "")
+        rng = random.Random(token)
+        weights = sorted((rng.paretovariate(1.2) for _ in range(self.nodes)), reverse=True)
+        total = sum(weights) or 1
+        nodes = [
+            {
+                "address": f"0x{rng.getrandbits(160):040x}",
+                "amount": weight * 1000,
+                "is_contract": rng.random() < 0.1,
+                "name": "",
+                "percentage": weight / total * 90,
+                "transaction_count": rng.randrange(1, 5000),
+                "transfer_X721_count": None,
+                "transfer_count": rng.randrange(1, 500)
+            }
+            for weight in weights
+        ]
+        links = [
+            {"source": rng.randrange(self.nodes), "target": rng.randrange(self.nodes), "forward": 1, "backward": 0}
+            for _ in range(self.links)
+        ] if self.nodes else []
+        payload = {
+            "version": 5,
+            "chain": request.query.get("chain", "eth"),
+            "token_address": token,
+            "full_name": "Stub Token",
+            "symbol": "STUB",
+            "is_X721": False,
+            "dt_update": "2024-01-01 00:00:00",
+            "nodes": nodes,
+            "links": links,
+            "token_links": []
+        }
+        return web.Response(body=json.dumps(payload), content_type="application/json")
+
+    async def handle_dexscreener(self, request: web.Request) -> web.Response:
+        self.calls["dexscreener"] += 1
+        await self.dexscreener.delay(self.rng)
+        if self.dexscreener.fails(self.rng):
+            return web.Response(status=500)
+
+        pairs = []
+        for address in request.match_info["addresses"].split(","):
+            rng = random.Random(address)
+            for chain in ("ethereum", "bsc", "base"):
+                pairs.append({
+                    "chainId": chain,
+                    "dexId": "uniswap",
+                    "pairAddress": f"0x{rng.getrandbits(160):040x}",
+                    "baseToken": {"address": address, "name": "Stub Token", "symbol": "STUB"},
+                    "priceUsd": f"{rng.uniform(0.0001, 10):.6f}",
+                    "priceChange": {"m5": 0.1, "h1": 1.5, "h6": -2.0, "h24": 12.3},
+                    "volume": {"m5": 100, "h1": 1000, "h6": 6000, "h24": 24000},
+                    "liquidity": {"usd": rng.uniform(1_000, 1_000_000)},
+                    "fdv": rng.uniform(1e5, 1e9),
+                    "marketCap": rng.uniform(1e5, 1e9)
+                })
+        # Like the real endpoint, one response holds at most 30 pairs
+        return web.json_response({"schemaVersion": "1.0.0", "pairs": pairs[:30]})
+
+    async def handle_screenshot(self, request: web.Request) -> web.Response:
+        self.calls["screenshot"] += 1
+        await self.screenshot.delay(self.rng)
+        if self.screenshot.fails(self.rng):
+            return web.Response(status=500)
+        return web.Response(body=b"\xff\xd8\xff" + bytes(self.screenshot_bytes), content_type="image/jpeg")
@@ -8,9 +8,12 @@ load_dotenv()
 BOT_TOKEN = os.getenv("BUBBLER_TOKEN")
 SCREENSHOT_API_KEY = os.getenv("SCREENSHOT_API_TOKEN")
 
-# API Endpoints
-BUBBLEMAPS_API_URL = "https://api-legacy.bubblemaps.io/map-data"
+# API Endpoints (overridable, e.g. to point at local stubs when benchmarking)
+BUBBLEMAPS_API_URL = os.getenv("BUBBLEMAPS_API_URL", "https://api-legacy.bubblemaps.io/map-data")
 BUBBLEMAPS_UI_URL = "https://bubblemaps.io/token"
+DEXSCREENER_API_URL = os.getenv("DEXSCREENER_API_URL", "https://api.dexscreener.com/latest/dex/tokens")
+SCREENSHOT_API_URL = os.getenv("SCREENSHOT_API_URL", "https://api.screenshotmachine.com")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")  # e.g. a local Bot API server: http://localhost:8081/bot{0}/{1}
 
 # Supported Chains
 SUPPORTED_CHAINS = {
@@ -26,14 +29,158 @@ SUPPORTED_CHAINS = {
     "sonic": "Sonic"
 }
 
+# Update Delivery
+BOT_MODE = os.getenv("BOT_MODE", "polling")                          # "polling" (development) or "webhook"
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")                                # public base URL Telegram posts to
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8080))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")                          # checked against X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 256))              # updates processed concurrently; keep above JOB_CONCURRENCY
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", 1000))       # queued updates before answering 503
+
+# HTTP Connection Pool
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", 100))                    # total open connections
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", 20))   # connections per upstream host
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", 300))              # seconds
+HTTP_KEEPALIVE_TIMEOUT = int(os.getenv("HTTP_KEEPALIVE_TIMEOUT", 60))       # seconds
+
+# Bubblemaps Map-Data Cache
+MAP_CACHE_SIZE = int(os.getenv("MAP_CACHE_SIZE", 1000))                 # entries
+MAP_CACHE_TTL = int(os.getenv("MAP_CACHE_TTL", 300))                    # seconds a map is fresh
+MAP_CACHE_STALE_TTL = int(os.getenv("MAP_CACHE_STALE_TTL", 900))        # seconds a stale map may still be served
+MAP_CACHE_NEGATIVE_TTL = int(os.getenv("MAP_CACHE_NEGATIVE_TTL", 60))   # seconds to remember "map not computed yet"
+
+# Persistent Cache (survives restarts; an empty path disables it)
+PERSISTENT_CACHE_PATH = os.getenv("PERSISTENT_CACHE_PATH", ".cache/bubbler.sqlite3")
+PERSISTENT_CACHE_MAX_BYTES = int(os.getenv("PERSISTENT_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+PERSISTENT_CACHE_COMPACT_INTERVAL = int(os.getenv("PERSISTENT_CACHE_COMPACT_INTERVAL", 300))  # seconds
+PERSISTENT_CACHE_WARM_SIZE = int(os.getenv("PERSISTENT_CACHE_WARM_SIZE", 200))                # tokens preloaded at startup
+
+# Holder History (snapshots of every fetched map; an empty path disables it)
+HISTORY_PATH = os.getenv("HISTORY_PATH", ".cache/history.sqlite3")
+HISTORY_INTERVAL = int(os.getenv("HISTORY_INTERVAL", 3600))                 # minimum seconds between snapshots of a token
+HISTORY_HOLDERS = int(os.getenv("HISTORY_HOLDERS", 1000))                   # largest holders kept per snapshot
+HISTORY_KEYFRAME_INTERVAL = int(os.getenv("HISTORY_KEYFRAME_INTERVAL", 24)) # full snapshot every N; the rest are deltas
+HISTORY_RETENTION_DAYS = float(os.getenv("HISTORY_RETENTION_DAYS", 180))
+HISTORY_COMPACT_INTERVAL = int(os.getenv("HISTORY_COMPACT_INTERVAL", 3600)) # seconds
+
+# Screenshot Cache
+SCREENSHOT_CACHE_DIR = os.getenv("SCREENSHOT_CACHE_DIR", ".cache/screenshots")
+SCREENSHOT_CACHE_TTL = int(os.getenv("SCREENSHOT_CACHE_TTL", 600))                       # seconds
+SCREENSHOT_CACHE_SIZE = int(os.getenv("SCREENSHOT_CACHE_SIZE", 5000))                    # Telegram file_ids kept
+SCREENSHOT_DISK_MAX_FILES = int(os.getenv("SCREENSHOT_DISK_MAX_FILES", 1000))            # JPEGs kept on disk
+SCREENSHOT_DISK_MAX_BYTES = int(os.getenv("SCREENSHOT_DISK_MAX_BYTES", 200 * 1024 * 1024))
+
+# Bubble Map Rendering
+SCREENSHOT_BACKEND = os.getenv("SCREENSHOT_BACKEND", "local")  # "local" renderer or "external" screenshotmachine
+RENDER_MAX_NODES = int(os.getenv("RENDER_MAX_NODES", 150))       # holders drawn per map
+
+# Worker Processes (map analysis and rendering run here, off the event loop)
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", os.getenv("RENDER_WORKERS", 0)))  # 0 = one per CPU core
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", 0))                             # jobs queued or running; 0 = 4 per process
+WORKER_ANALYSIS_MIN_HOLDERS = int(os.getenv("WORKER_ANALYSIS_MIN_HOLDERS", 50000))    # smaller maps are analyzed in-process; 0 never offloads
+
+# Job Queue (orders /getinfo lookups and turns them away under overload)
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", 32))                     # lookups processed at once; 0 = no limit
+JOB_QUEUE_MAX_DEPTH = int(os.getenv("JOB_QUEUE_MAX_DEPTH", 200))            # waiting lookups before new ones are turned away
+JOB_QUEUE_MAX_WAIT = float(os.getenv("JOB_QUEUE_MAX_WAIT", 10))             # seconds a lookup may (be expected to) wait
+JOB_QUEUE_UPDATE_INTERVAL = float(os.getenv("JOB_QUEUE_UPDATE_INTERVAL", 3)) # seconds between queue position updates
+
+# Progressive Replies
+PROGRESSIVE_REPLY = os.getenv("PROGRESSIVE_REPLY", "1") == "1"    # show text first, swap in the map when ready
+PROGRESSIVE_GRACE = float(os.getenv("PROGRESSIVE_GRACE", 0.3))    # seconds to wait for the map before showing text alone
+
+# DexScreener Batching
+DEXSCREENER_BATCH_WINDOW = float(os.getenv("DEXSCREENER_BATCH_WINDOW", 0.05))  # seconds to collect addresses
+DEXSCREENER_BATCH_SIZE = int(os.getenv("DEXSCREENER_BATCH_SIZE", 30))          # addresses per request (API limit)
+DEXSCREENER_MAX_PAIRS = int(os.getenv("DEXSCREENER_MAX_PAIRS", 30))            # pairs per response (API limit); fuller responses are re-checked
+DEXSCREENER_CACHE_TTL = int(os.getenv("DEXSCREENER_CACHE_TTL", 30))            # seconds a price snapshot is reused
+
+# Chain Detection (addresses given without a chain)
+CHAIN_CACHE_SIZE = int(os.getenv("CHAIN_CACHE_SIZE", 10000))                # remembered addresses
+CHAIN_CACHE_TTL = int(os.getenv("CHAIN_CACHE_TTL", 86400))                  # seconds a detected chain is kept
+CHAIN_CACHE_UNLISTED_TTL = int(os.getenv("CHAIN_CACHE_UNLISTED_TTL", 300))  # seconds for tokens without DexScreener pairs
+
+# Multi-Token Commands
+MULTI_TOKEN_MAX = int(os.getenv("MULTI_TOKEN_MAX", 5))                  # addresses per /getinfo or /compare
+MULTI_TOKEN_CONCURRENCY = int(os.getenv("MULTI_TOKEN_CONCURRENCY", 3))  # lookups in flight per command
+
+# Inline Mode
+INLINE_CACHE_SIZE = int(os.getenv("INLINE_CACHE_SIZE", 1000))      # prepared token summaries
+INLINE_CACHE_TTL = int(os.getenv("INLINE_CACHE_TTL", 120))         # seconds a summary is reused
+INLINE_GRACE = float(os.getenv("INLINE_GRACE", 0.4))               # seconds to wait for a missing summary
+INLINE_UPLOAD_CHAT_ID = int(os.getenv("INLINE_UPLOAD_CHAT_ID", 0)) # chat used to upload maps for inline photos; 0 disables
+
+# Watch Alerts
+WATCH_INTERVAL = float(os.getenv("WATCH_INTERVAL", 120))                  # seconds between polls of a token
+WATCH_JITTER = float(os.getenv("WATCH_JITTER", 0.2))                      # +/- fraction of the interval
+WATCH_BATCH_SIZE = int(os.getenv("WATCH_BATCH_SIZE", 30))                 # tokens fetched per polling round
+WATCH_DEFAULT_THRESHOLD = float(os.getenv("WATCH_DEFAULT_THRESHOLD", 10)) # % price move that triggers an alert
+WATCH_TOP20_DELTA = float(os.getenv("WATCH_TOP20_DELTA", 5))              # top-20 concentration change in % points
+WATCH_MAX_PER_CHAT = int(os.getenv("WATCH_MAX_PER_CHAT", 20))
+WATCH_MAX_PENDING_ALERTS = int(os.getenv("WATCH_MAX_PENDING_ALERTS", 1000))  # unsent alerts before polling waits
+WATCH_SYNC_INTERVAL = float(os.getenv("WATCH_SYNC_INTERVAL", 30))        # seconds between reloads of shared subscriptions
+
+# Cache Warmer (keeps popular tokens cached ahead of demand)
+WARMER_INTERVAL = float(os.getenv("WARMER_INTERVAL", 25))               # seconds between rounds; below DEXSCREENER_CACHE_TTL keeps prices warm
+WARMER_TOP = int(os.getenv("WARMER_TOP", 20))                           # tokens kept warm; 0 disables the warmer
+WARMER_BUDGET = int(os.getenv("WARMER_BUDGET", 60))                     # upstream calls and Telegram uploads per round
+WARMER_CONCURRENCY = int(os.getenv("WARMER_CONCURRENCY", 10))            # tokens warmed at once
+WARMER_HALF_LIFE = float(os.getenv("WARMER_HALF_LIFE", 1800))           # seconds for a request's weight to halve
+WARMER_MIN_SCORE = float(os.getenv("WARMER_MIN_SCORE", 2))              # decayed request count needed to be warmed
+WARMER_TRACKED = int(os.getenv("WARMER_TRACKED", 5000))                 # tokens whose request rate is tracked
+WARMER_TRENDING_URL = os.getenv("WARMER_TRENDING_URL", "")              # e.g. https://api.dexscreener.com/token-boosts/top/v1
+WARMER_TRENDING_INTERVAL = float(os.getenv("WARMER_TRENDING_INTERVAL", 600))  # seconds between trending feed fetches
+
+# Shared State (several bot instances behind one webhook)
+SHARED_STATE_URL = os.getenv("SHARED_STATE_URL", "")                     # redis://host:6379/0; empty keeps all state in-process
+SHARED_STATE_PREFIX = os.getenv("SHARED_STATE_PREFIX", "bubbler:")       # key prefix, so several bots can share one Redis
+SHARED_LOCK_TTL = float(os.getenv("SHARED_LOCK_TTL", 15))                # seconds an instance may hold a fetch lock
+
+# Metrics
+METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))                      # 0 disables the /metrics endpoint
+METRICS_LOG_REQUESTS = os.getenv("METRICS_LOG_REQUESTS", "0") == "1"  # one JSON log line per request
+
+# Telegram Sending (Bot API limits: about 30 messages/s overall, 1/s per chat, 20/min per group)
+TELEGRAM_RATE = float(os.getenv("TELEGRAM_RATE", 30))                       # calls per second across all chats
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", 1))              # calls per second in one private chat
+TELEGRAM_GROUP_RATE = float(os.getenv("TELEGRAM_GROUP_RATE", 20))           # calls per minute in one group
+TELEGRAM_BURST = int(os.getenv("TELEGRAM_BURST", 3))                        # calls a chat may get back to back
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", 3))            # retries after a 429
+TELEGRAM_MAX_RETRY_AFTER = float(os.getenv("TELEGRAM_MAX_RETRY_AFTER", 30)) # longest retry_after waited out
+TELEGRAM_STATUS_DELAY = float(os.getenv("TELEGRAM_STATUS_DELAY", 1))        # seconds before a "processing" message is sent
+TELEGRAM_CAPTION_LIMIT = 1024                                               # characters in a photo caption (Bot API limit)
+
 # Rate Limiting
 RATE_LIMIT_PER_USER = 10  # requests per minute
+RATE_LIMIT_PER_CHAT = 30  # requests per minute, shared by everyone in a group
 RATE_LIMIT_WINDOW = 60    # seconds
 
+# Upstream Concurrency Caps (requests in flight across all users)
+BUBBLEMAPS_CONCURRENCY = int(os.getenv("BUBBLEMAPS_CONCURRENCY", 16))
+DEXSCREENER_CONCURRENCY = int(os.getenv("DEXSCREENER_CONCURRENCY", 4))
+SCREENSHOT_CONCURRENCY = int(os.getenv("SCREENSHOT_CONCURRENCY", 4))
+
+# Upstream Timeouts & Circuit Breakers
+BUBBLEMAPS_TIMEOUT = float(os.getenv("BUBBLEMAPS_TIMEOUT", 10))                # seconds per map-data call, queueing included
+DEXSCREENER_TIMEOUT = float(os.getenv("DEXSCREENER_TIMEOUT", 4))               # seconds before replying without prices
+SCREENSHOT_TIMEOUT = float(os.getenv("SCREENSHOT_TIMEOUT", 20))                # seconds before replying without the map
+RENDER_TIMEOUT = float(os.getenv("RENDER_TIMEOUT", 10))                        # seconds of local rendering before falling back
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", 25))                    # seconds for all upstream calls of one request
+BUBBLEMAPS_HEDGE = os.getenv("BUBBLEMAPS_HEDGE", "1") == "1"                   # duplicate map-data requests that run slow
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", 95))                    # latency percentile that triggers the duplicate
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", 0.5))                     # seconds; never hedge sooner than this
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))     # consecutive failures that open a circuit
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", 30))          # seconds an upstream is skipped before a trial call
+
 # Error Messages
 ERROR_MESSAGES = {
     "invalid_address": "❌ Invalid contract address. Please provide a valid address and try again.",
     "rate_limit": "⚠️ Too many requests. Please wait a moment before trying again.",
+    "busy": "⏳ The bot is busy right now. Please try again in a minute.",
+    "state_unavailable": "⚠️ Watches cannot be changed right now. Please try again in a minute.",
     "api_error": "❌ Error fetching data. Please try again later.",
     "screenshot_error": "❌ Error generating screenshot. Please try again later.",
     "invalid_chain": "❌ Invalid chain. Supported chains are: " + ", ".join(SUPPORTED_CHAINS.keys())
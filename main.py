@@ -1,16 +1,92 @@
 import os
+import math
 import logging
 import telebot
+from telebot import types
 from telebot.async_telebot import AsyncTeleBot
 from telebot.handler_backends import State, StatesGroup
-from telebot.storage import StateMemoryStorage
+from telebot.asyncio_storage import StateMemoryStorage, StateRedisStorage
 from dotenv import load_dotenv
 import requests
 import aiohttp
-from typing import Tuple, Optional, Dict
+from typing import Tuple, Optional, Dict, List, Union
 import re
+import time
 import asyncio
 
+from config import (
+    BUBBLEMAPS_API_URL,
+    SCREENSHOT_API_URL,
+    TELEGRAM_API_URL,
+    MAP_CACHE_SIZE,
+    MAP_CACHE_TTL,
+    MAP_CACHE_STALE_TTL,
+    MAP_CACHE_NEGATIVE_TTL,
+    DEXSCREENER_CACHE_TTL,
+    SCREENSHOT_CACHE_TTL,
+    PERSISTENT_CACHE_WARM_SIZE,
+    SCREENSHOT_BACKEND,
+    PROGRESSIVE_REPLY,
+    PROGRESSIVE_GRACE,
+    MULTI_TOKEN_MAX,
+    CHAIN_CACHE_SIZE,
+    CHAIN_CACHE_TTL,
+    CHAIN_CACHE_UNLISTED_TTL,
+    MULTI_TOKEN_CONCURRENCY,
+    INLINE_CACHE_SIZE,
+    INLINE_CACHE_TTL,
+    INLINE_GRACE,
+    INLINE_UPLOAD_CHAT_ID,
+    RATE_LIMIT_PER_USER,
+    RATE_LIMIT_PER_CHAT,
+    RATE_LIMIT_WINDOW,
+    TELEGRAM_CAPTION_LIMIT,
+    ERROR_MESSAGES,
+    BOT_MODE,
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBHOOK_WORKERS,
+    METRICS_PORT,
+    METRICS_LOG_REQUESTS,
+    SHARED_STATE_URL,
+    DEXSCREENER_TIMEOUT,
+    RENDER_TIMEOUT,
+    WORKER_ANALYSIS_MIN_HOLDERS,
+    REQUEST_DEADLINE,
+    BUBBLEMAPS_HEDGE,
+    HEDGE_PERCENTILE,
+    HEDGE_MIN_DELAY,
+    WATCH_INTERVAL,
+    WATCH_SYNC_INTERVAL,
+    SHARED_LOCK_TTL,
+    WARMER_INTERVAL,
+    WARMER_TOP,
+    WARMER_MIN_SCORE,
+    WARMER_TRENDING_URL
+)
+from services.http import http_client, upstream_breakers, upstream_latency, call_upstream
+from services.dexscreener import dexscreener_batcher
+from services.screenshot_cache import screenshot_cache
+from services.persistent_cache import persistent_cache
+from services.history import holder_history
+from services.renderer import map_renderer, placeholder_image
+from services.workers import worker_pool
+from services.job_queue import Overloaded, job_queue
+from services.telegram_sender import StatusMessage, TelegramSender
+from services.warmer import CacheWarmer, WarmBudget
+from services.watcher import WatchScheduler
+from services.webhook import WebhookServer
+from services.metrics_server import MetricsServer
+from services.shared_state import StateUnavailable, shared_state
+from utils.cache import TTLCache
+from utils.singleflight import SingleFlight
+from utils import metrics
+from utils.analytics import top_n
+from utils.mapdata import HolderMap, decode_map_data, dumps, loads
+from utils.metrics import REGISTRY, annotate, request_trace, span, timed, upstream_call
+from utils.resilience import UpstreamUnavailable, hedged, request_deadline, with_timeout
+
 # Load environment variables
 load_dotenv()
 BOT_TOKEN = os.getenv("BUBBLER_TOKEN")
@@ -22,75 +98,121 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize bot with state storage
-state_storage = StateMemoryStorage()
-bot = AsyncTeleBot(BOT_TOKEN)
+if TELEGRAM_API_URL:
+    telebot.asyncio_helper.API_URL = TELEGRAM_API_URL
+
+# Initialize bot with state storage, in Redis when several instances share the load
+state_storage = StateRedisStorage(redis_url=SHARED_STATE_URL) if SHARED_STATE_URL else StateMemoryStorage()
+bot = AsyncTeleBot(BOT_TOKEN, state_storage=state_storage)
+# Everything the bot sends goes through the sender, which paces it to Telegram's limits
+sender = TelegramSender(bot)
 
 # Constants
-BUBBLEMAPS_API_URL = "https://api-legacy.bubblemaps.io/map-data"
 BUBBLEMAPS_UI_URL = "app.bubblemaps.io"
-DEXSCREENER_API_URL = "https://api.dexscreener.com/latest/dex/tokens"
+
+# Address formats, compiled once and shared by validation and chain detection
+EVM_ADDRESS = re.compile(r"^0x[a-fA-F0-9]{40}$")
+SOLANA_ADDRESS = re.compile(r"^[1-9A-HJ-NP-Za-km-z]{32,44}$")
 
 # Chain configurations with DexScreener mappings
 SUPPORTED_CHAINS = {
     "eth": {
         "name": "Ethereum",
-        "address_pattern": r"^0x[a-fA-F0-9]{40}$",
+        "address_pattern": EVM_ADDRESS,
         "address_length": 42,
         "prefix": "0x",
         "dexscreener": "ethereum"
     },
     "bsc": {
         "name": "Binance Smart Chain",
-        "address_pattern": r"^0x[a-fA-F0-9]{40}$",
+        "address_pattern": EVM_ADDRESS,
         "address_length": 42,
         "prefix": "0x",
         "dexscreener": "bsc"
     },
     "ftm": {
         "name": "Fantom",
-        "address_pattern": r"^0x[a-fA-F0-9]{40}$",
+        "address_pattern": EVM_ADDRESS,
         "address_length": 42,
         "prefix": "0x",
         "dexscreener": "fantom"
     },
     "avax": {
         "name": "Avalanche",
-        "address_pattern": r"^0x[a-fA-F0-9]{40}$",
+        "address_pattern": EVM_ADDRESS,
         "address_length": 42,
         "prefix": "0x",
         "dexscreener": "avalanche"
     },
     "arbi": {
         "name": "Arbitrum",
-        "address_pattern": r"^0x[a-fA-F0-9]{40}$",
+        "address_pattern": EVM_ADDRESS,
         "address_length": 42,
         "prefix": "0x",
         "dexscreener": "arbitrum"
     },
     "poly": {
         "name": "Polygon",
-        "address_pattern": r"^0x[a-fA-F0-9]{40}$",
+        "address_pattern": EVM_ADDRESS,
         "address_length": 42,
         "prefix": "0x",
         "dexscreener": "polygon"
     },
     "base": {
         "name": "Base",
-        "address_pattern": r"^0x[a-fA-F0-9]{40}$",
+        "address_pattern": EVM_ADDRESS,
         "address_length": 42,
         "prefix": "0x",
         "dexscreener": "base"
     },
     "sol": {
         "name": "Solana",
-        "address_pattern": r"^[1-9A-HJ-NP-Za-km-z]{32,44}$",
+        "address_pattern": SOLANA_ADDRESS,
         "address_length": None,  # Variable length
         "prefix": None,
         "dexscreener": "solana"
     }
 }
 
+# DexScreener chainId -> our chain name, for EVM chains that share one address format
+CHAINS_BY_DEXSCREENER_ID = {config["dexscreener"]: chain for chain, config in SUPPORTED_CHAINS.items()}
+EVM_CHAINS_BY_DEXSCREENER_ID = {
+    config["dexscreener"]: chain
+    for chain, config in SUPPORTED_CHAINS.items()
+    if config["address_pattern"] is EVM_ADDRESS
+}
+
+# Bubblemaps map-data cache keyed by (chain, address)
+map_cache = TTLCache(
+    max_size=MAP_CACHE_SIZE,
+    ttl=MAP_CACHE_TTL,
+    stale_ttl=MAP_CACHE_STALE_TTL,
+    negative_ttl=MAP_CACHE_NEGATIVE_TTL
+)
+_map_refreshes: Dict[Tuple[str, str], asyncio.Task] = {}
+
+# Summarized DexScreener data keyed by (chain, address); prices move, so the TTL is short
+dex_cache = TTLCache(max_size=MAP_CACHE_SIZE, ttl=DEXSCREENER_CACHE_TTL)
+
+# Formatted token info for inline answers, keyed by (chain, address)
+inline_cache = TTLCache(max_size=INLINE_CACHE_SIZE, ttl=INLINE_CACHE_TTL)
+_inline_preparations: Dict[Tuple[str, str], asyncio.Task] = {}
+
+# Detected chain of bare EVM addresses, keyed by lowercased address
+resolved_chains = TTLCache(max_size=CHAIN_CACHE_SIZE, ttl=CHAIN_CACHE_TTL)
+
+# Concurrent lookups for the same token share one set of upstream calls
+token_flights = SingleFlight()
+
+# Background writes to the shared state
+_shared_writes = set()
+
+# Telegram file_id of the uploaded placeholder photo, set after the first upload
+_placeholder_file_id: Optional[str] = None
+
+class TokenNotFoundError(ValueError):
+    """Bubblemaps has no map for this token (yet)."""
+
 # Define states
 class UserStates(StatesGroup):
     waiting_for_address = State()
@@ -113,7 +235,7 @@ def validate_contract_address(chain: str, address: str) -> Tuple[bool, Optional[
         return False, f"Invalid address length for {chain_config['name']}"
     
     # Check pattern
-    if not re.match(chain_config["address_pattern"], address):
+    if not chain_config["address_pattern"].match(address):
         return False, f"Invalid address format for {chain_config['name']}"
     
     return True, None
@@ -122,8 +244,9 @@ def extract_chain_and_address(text: str) -> Tuple[Optional[str], Optional[str],
     """Extract chain and address from user input."""
     parts = text.strip().split()
     
+    # No chain given: None means "detect it", see resolve_chain
     if len(parts) == 1:
-        return "eth", parts[0], None
+        return None, parts[0], None
     
     if len(parts) == 2:
         chain = parts[0].lower()
@@ -133,112 +256,419 @@ def extract_chain_and_address(text: str) -> Tuple[Optional[str], Optional[str],
     
     return None, None, "Invalid format. Use: /getinfo [chain] [address] or /getinfo [address]"
 
-async def get_token_data(chain: str, address: str) -> dict:
-    """Fetch token data from Bubblemaps API."""
-    async with aiohttp.ClientSession() as session:
-        async with session.get(
+def looks_like_address(text: str) -> bool:
+    return bool(EVM_ADDRESS.match(text) or SOLANA_ADDRESS.match(text))
+
+ADDRESS_FORMAT_ERROR = "Invalid address format. Use a 0x... address (EVM chains) or a Solana address."
+
+async def resolve_chain(address: str) -> Optional[str]:
+    """
+    Detect the chain of an address given without one; None if it is not an address.
+
+    Solana addresses are recognized by format. EVM addresses look the same
+    on every chain, so the chain with the most liquid DexScreener pair wins;
+    the same response also fills the DexScreener cache for that chain.
+    Tokens without pairs fall back to Ethereum.
+    """
+    address = address.strip()
+    if SOLANA_ADDRESS.match(address):
+        return "sol"
+    if not EVM_ADDRESS.match(address):
+        return None
+
+    entry = resolved_chains.get(address.lower())
+    if entry is not None:
+        return entry.value
+
+    try:
+        pairs = await with_timeout("DexScreener", dexscreener_batcher.get_pairs(address), DEXSCREENER_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Chain detection failed for {address}: {str(e)}")
+        return "eth"
+
+    liquidity: Dict[str, float] = {}
+    for pair in pairs:
+        chain = EVM_CHAINS_BY_DEXSCREENER_ID.get(pair.get('chainId'))
+        if chain is not None:
+            liquidity[chain] = max(liquidity.get(chain, 0.0), float((pair.get('liquidity') or {}).get('usd', 0)))
+
+    if not liquidity:
+        # Unlisted tokens may get pairs soon, so remember the fallback briefly
+        resolved_chains.set(address.lower(), "eth", ttl=CHAIN_CACHE_UNLISTED_TTL)
+        return "eth"
+
+    chain = max(liquidity, key=liquidity.get)
+    resolved_chains.set(address.lower(), chain)
+    cache_dex_data(token_key(chain, address), summarize_pairs(chain, pairs))
+    return chain
+
+async def resolve_tokens(tokens: List[Tuple[Optional[str], str]]) -> List[Tuple[str, str]]:
+    """Fill in detected chains and drop duplicates that only differed by a missing chain."""
+    chains = await asyncio.gather(*(
+        resolve_chain(address) if chain is None else asyncio.sleep(0, chain)
+        for chain, address in tokens
+    ))
+    resolved = []
+    seen = set()
+    for chain, (_, address) in zip(chains, tokens):
+        key = token_key(chain, address)
+        if key not in seen:
+            seen.add(key)
+            resolved.append((chain, address))
+    return resolved
+
+def parse_token_list(text: str) -> Tuple[List[Tuple[Optional[str], str]], Optional[str]]:
+    """
+    Parse "[chain] <address> [[chain] <address> ...]" into (tokens, error).
+    A chain name applies to the addresses after it; addresses before any
+    chain name get None, to be filled in by resolve_tokens. Duplicates are dropped.
+    """
+    chain = None
+    tokens = []
+    seen = set()
+    for part in text.strip().split():
+        if part.lower() in SUPPORTED_CHAINS:
+            chain = part.lower()
+            continue
+        if chain is None:
+            is_valid, error_msg = looks_like_address(part), ADDRESS_FORMAT_ERROR
+        else:
+            is_valid, error_msg = validate_contract_address(chain, part)
+        if not is_valid:
+            return [], f"{part}: {error_msg}"
+        key = token_key(chain, part)
+        if key not in seen:
+            seen.add(key)
+            tokens.append((chain, part))
+
+    if not tokens:
+        return [], "Please provide at least one contract address."
+    if len(tokens) > MULTI_TOKEN_MAX:
+        return [], f"You can look up at most {MULTI_TOKEN_MAX} tokens at once."
+    return tokens, None
+
+def token_key(chain: str, address: str) -> Tuple[str, str]:
+    """Cache key for a token. EVM addresses are case-insensitive."""
+    address = address.strip()
+    if address.startswith("0x"):
+        address = address.lower()
+    return chain, address
+
+def shared_key(kind: str, key: Tuple[str, str]) -> str:
+    """Key of a token's entry in the state shared between bot instances."""
+    return f"{kind}:{key[0]}:{key[1]}"
+
+async def fetch_token_data(chain: str, address: str) -> HolderMap:
+    """
+    Fetch token data from Bubblemaps API.
+    A duplicate request goes out when the first one is slower than HEDGE_PERCENTILE of recent calls.
+    """
+    async def attempt() -> HolderMap:
+        return await call_upstream(
+            "bubblemaps",
+            lambda: request_token_data(chain, address),
+            ok_errors=(TokenNotFoundError,)
+        )
+
+    delay = upstream_latency["bubblemaps"].percentile(HEDGE_PERCENTILE) if BUBBLEMAPS_HEDGE else None
+    if delay is not None:
+        delay = max(delay, HEDGE_MIN_DELAY)
+    return await hedged(attempt, delay, on_hedge=lambda: metrics.hedged_requests.inc(upstream="bubblemaps"))
+
+async def request_token_data(chain: str, address: str) -> HolderMap:
+    """One map-data request."""
+    with upstream_call("bubblemaps") as call:
+        async with http_client.session.get(
             BUBBLEMAPS_API_URL,
             params={"token": address, "chain": chain}
         ) as response:
+            call["status"] = response.status
             if response.status == 401:
-                raise ValueError("Token not found or maps hasn't been computed yet")
+                raise TokenNotFoundError("Token not found or maps hasn't been computed yet")
             if response.status != 200:
                 raise ValueError(f"API error: {response.status}")
-            
-            return await response.json()
+
+            # Keep only the fields the bot uses; the raw payload is dropped here
+            return decode_map_data(await response.read())
+
+async def _load_token_data(key: Tuple[str, str], chain: str, address: str) -> HolderMap:
+    """Fetch map-data and store the outcome in the cache."""
+    try:
+        if shared_state.distributed:
+            # One instance fetches, the others read its result
+            data = await shared_state.get_or_load(
+                shared_key("map", key),
+                lambda: fetch_token_data(chain, address),
+                MAP_CACHE_TTL,
+                SHARED_LOCK_TTL,
+                HolderMap.to_bytes,
+                HolderMap.from_bytes
+            )
+        else:
+            data = await fetch_token_data(chain, address)
+    except TokenNotFoundError as e:
+        map_cache.set_negative(key, str(e))
+        raise
+    map_cache.set(key, data)
+    persistent_cache.put("map", key, data, MAP_CACHE_TTL, MAP_CACHE_STALE_TTL, serialize=HolderMap.to_bytes)
+    holder_history.record(key, data)
+    return data
+
+def _schedule_map_refresh(key: Tuple[str, str], chain: str, address: str) -> None:
+    """Revalidate a stale map in the background, once per key."""
+    if key in _map_refreshes:
+        return
+
+    async def refresh():
+        try:
+            await token_flights.do(("map",) + key, lambda: _load_token_data(key, chain, address))
+        except Exception as e:
+            logger.warning(f"Background refresh failed for {chain}:{address}: {str(e)}")
+        finally:
+            _map_refreshes.pop(key, None)
+
+    _map_refreshes[key] = asyncio.create_task(refresh())
+
+async def get_token_data(chain: str, address: str) -> HolderMap:
+    """Get token data, served from cache when possible."""
+    key = token_key(chain, address)
+    persistent_cache.touch(key)
+    entry = map_cache.get(key)
+    if entry is not None:
+        if entry.negative:
+            raise TokenNotFoundError(entry.value)
+        if not map_cache.is_fresh(entry):
+            _schedule_map_refresh(key, chain, address)
+        data = entry.value
+    else:
+        data = await token_flights.do(("map",) + key, lambda: _load_token_data(key, chain, address))
+    return await analyze_map(key, data)
+
+async def analyze_map(key: Tuple[str, str], data: HolderMap) -> HolderMap:
+    """Analyze large maps in a worker process; smaller ones are analyzed in-process when first formatted."""
+    if data.analyzed or not WORKER_ANALYSIS_MIN_HOLDERS or len(data) < WORKER_ANALYSIS_MIN_HOLDERS:
+        return data
+    try:
+        with span("analyze"):
+            await token_flights.do(("analyze",) + key, lambda: worker_pool.analyze(data))
+    except Exception as e:
+        logger.error(f"Error analyzing map in a worker: {str(e)}")
+    return data
+
+def summarize_pairs(chain: str, pairs: List[Dict]) -> Dict:
+    """Market data of the most liquid DexScreener pair on `chain`, {} if there is none."""
+    # Filter pairs for the specific chain
+    chain_pairs = [
+        pair for pair in pairs 
+        if pair.get('chainId') == SUPPORTED_CHAINS[chain]['dexscreener']
+    ]
+
+    if not chain_pairs:
+        return {}
+
+    # Get the pair with highest liquidity
+    main_pair = max(chain_pairs, key=lambda x: float(x.get('liquidity', {}).get('usd', 0)))
+
+    return {
+        'price': float(main_pair.get('priceUsd', 0)),
+        'price_change': {
+            '5m': float(main_pair.get('priceChange', {}).get('m5', 0)),
+            '1h': float(main_pair.get('priceChange', {}).get('h1', 0)),
+            '6h': float(main_pair.get('priceChange', {}).get('h6', 0)),
+            '24h': float(main_pair.get('priceChange', {}).get('h24', 0))
+        },
+        'volume': {
+            '5m': float(main_pair.get('volume', {}).get('m5', 0)),
+            '1h': float(main_pair.get('volume', {}).get('h1', 0)),
+            '6h': float(main_pair.get('volume', {}).get('h6', 0)),
+            '24h': float(main_pair.get('volume', {}).get('h24', 0))
+        },
+        'liquidity': float(main_pair.get('liquidity', {}).get('usd', 0)),
+        'dex': main_pair.get('dexId', 'unknown'),
+        'pair_address': main_pair.get('pairAddress'),
+        'fdv': float(main_pair.get('fdv', 0)),
+        'market_cap': float(main_pair.get('marketCap', 0))
+    }
+
+def cache_dex_data(key: Tuple[str, str], dex_data: Dict, share: bool = True) -> None:
+    if dex_data:
+        dex_cache.set(key, dex_data)
+        persistent_cache.put("dex", key, dex_data, DEXSCREENER_CACHE_TTL, serialize=dumps)
+        if share and shared_state.distributed:
+            schedule_shared_write(shared_key("dex", key), dumps(dex_data), DEXSCREENER_CACHE_TTL)
+
+def schedule_shared_write(key: str, value: bytes, ttl: float) -> None:
+    """Write to the shared state without making the reply wait for it."""
+    task = asyncio.ensure_future(shared_state.set(key, value, ttl))
+    _shared_writes.add(task)
+    task.add_done_callback(_shared_writes.discard)
 
 async def get_dexscreener_data(chain: str, address: str) -> Dict:
     """Fetch token data from DexScreener API."""
+    key = token_key(chain, address)
+    entry = dex_cache.get(key)
+    if entry is not None:
+        return entry.value
+
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{DEXSCREENER_API_URL}/{address}") as response:
-                if response.status != 200:
-                    logger.warning(f"DexScreener API error: {response.status}")
-                    return {}
-
-                data = await response.json()
-                pairs = data.get('pairs', [])
-                
-                # Filter pairs for the specific chain
-                chain_pairs = [
-                    pair for pair in pairs 
-                    if pair.get('chainId') == SUPPORTED_CHAINS[chain]['dexscreener']
-                ]
-                
-                if not chain_pairs:
-                    return {}
-
-                # Get the pair with highest liquidity
-                main_pair = max(chain_pairs, key=lambda x: float(x.get('liquidity', {}).get('usd', 0)))
-                
-                return {
-                    'price': float(main_pair.get('priceUsd', 0)),
-                    'price_change': {
-                        '5m': float(main_pair.get('priceChange', {}).get('m5', 0)),
-                        '1h': float(main_pair.get('priceChange', {}).get('h1', 0)),
-                        '6h': float(main_pair.get('priceChange', {}).get('h6', 0)),
-                        '24h': float(main_pair.get('priceChange', {}).get('h24', 0))
-                    },
-                    'volume': {
-                        '5m': float(main_pair.get('volume', {}).get('m5', 0)),
-                        '1h': float(main_pair.get('volume', {}).get('h1', 0)),
-                        '6h': float(main_pair.get('volume', {}).get('h6', 0)),
-                        '24h': float(main_pair.get('volume', {}).get('h24', 0))
-                    },
-                    'liquidity': float(main_pair.get('liquidity', {}).get('usd', 0)),
-                    'dex': main_pair.get('dexId', 'unknown'),
-                    'pair_address': main_pair.get('pairAddress'),
-                    'fdv': float(main_pair.get('fdv', 0)),
-                    'market_cap': float(main_pair.get('marketCap', 0))
-                }
+        if shared_state.distributed:
+            blob = await shared_state.get(shared_key("dex", key))
+            if blob is not None:
+                dex_data = loads(blob)
+                cache_dex_data(key, dex_data, share=False)
+                return dex_data
+
+        # Batched with other callers; pairs for every chain come back at once
+        pairs = await with_timeout("DexScreener", dexscreener_batcher.get_pairs(address), DEXSCREENER_TIMEOUT)
+        dex_data = summarize_pairs(chain, pairs)
+        cache_dex_data(key, dex_data)
+        return dex_data
+    except UpstreamUnavailable as e:
+        # The reply goes out without market data
+        logger.warning(f"Skipping DexScreener data: {str(e)}")
+        return {}
     except Exception as e:
         logger.error(f"Error fetching DexScreener data: {str(e)}")
         return {}
 
-def format_token_info(data: dict, chain: str, address: str, dex_data: dict) -> str:
-    """Format token information into a readable message."""
-    top_holders = data.get('nodes', [])
-    
-    # Calculate decentralization score
-    top_20_concentration = sum(node['percentage'] for node in top_holders[:20])
-    decentralization_score = max(0, 100 - (top_20_concentration / 2))
-    
-    # Format numbers
-    def format_currency(value):
-        if value >= 1_000_000_000:
-            return f"${value/1_000_000_000:.2f}B"
-        elif value >= 1_000_000:
-            return f"${value/1_000_000:.2f}M"
-        elif value >= 1_000:
-            return f"${value/1_000:.2f}K"
-        else:
-            return f"${value:.2f}"
-
-    def format_price(value):
-        if value < 0.00000001:
-            return f"${value:.12f}"
-        elif value < 0.01:
-            return f"${value:.8f}"
-        elif value < 1:
-            return f"${value:.4f}"
-        else:
-            return f"${value:.2f}"
+async def fetch_screenshot(chain: str, address: str) -> bytes:
+    """Fetch a screenshot of the token's bubble map."""
+    screenshot_url = (
+        f"{SCREENSHOT_API_URL}"
+        f"?key={os.getenv('SCREENSHOT_API_TOKEN')}"
+        f"&url={BUBBLEMAPS_UI_URL}/{chain}/token/{address}"
+        "&dimension=1024x768"
+        "&device=desktop"
+        "&format=jpg"
+        "&cacheLimit=0"
+        "&delay=3000"
+    )
 
-    def format_price_change(value):
-        emoji = "🟢" if value > 0 else "🔴" if value < 0 else "⚪"
-        return f"{emoji}{value:+.1f}%"
-    
-    def format_percentage(value):
-        return f"{value:.1f}%"
+    async def request() -> bytes:
+        with upstream_call("screenshot") as call:
+            async with http_client.session.get(screenshot_url) as screenshot_response:
+                call["status"] = screenshot_response.status
+                if screenshot_response.status != 200:
+                    raise ValueError(f"Screenshot API error: {screenshot_response.status}")
+                return await screenshot_response.read()
+
+    return await call_upstream("screenshot", request)
+
+async def fetch_token_bundle(chain: str, address: str) -> Tuple[HolderMap, Dict]:
+    """Fetch Bubblemaps and DexScreener data, coalesced per token."""
+    key = token_key(chain, address)
+    cache_warmer.record(key, chain, address)
 
-    message = (
-        f"🔍 *{data.get('full_name', 'Unknown Token')} ({data.get('symbol', 'UNKNOWN')})*\n"
+    async def fetch():
+        return await asyncio.gather(
+            timed("bubblemaps", get_token_data(chain, address)),
+            timed("dexscreener", get_dexscreener_data(chain, address))
+        )
+
+    return await token_flights.do(("data",) + key, fetch)
+
+async def fetch_map_image(chain: str, address: str, token_data: HolderMap) -> bytes:
+    """Render the bubble map locally, falling back to the screenshot service."""
+    if SCREENSHOT_BACKEND == "local" and map_renderer.available:
+        try:
+            with span("render"):
+                return await with_timeout("Renderer", map_renderer.render(token_data), RENDER_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Error rendering bubble map: {str(e)}")
+    return await fetch_screenshot(chain, address)
+
+async def _load_screenshot(key: Tuple[str, str], chain: str, address: str, token_data: HolderMap) -> bytes:
+    """Read the screenshot from disk, or produce and store it."""
+    content = await screenshot_cache.load(key)
+    if content is None:
+        content = await fetch_map_image(chain, address, token_data)
+        await screenshot_cache.save(key, content)
+    return content
+
+async def get_screenshot(chain: str, address: str, token_data: HolderMap) -> Union[str, bytes]:
+    """
+    Get the bubble map screenshot, coalesced per token.
+    Returns a Telegram file_id when the photo was already uploaded, raw bytes otherwise.
+    """
+    key = token_key(chain, address)
+    file_id = screenshot_cache.get_file_id(key)
+    if file_id:
+        return file_id
+    if shared_state.distributed:
+        # Uploaded by another instance; file_ids are valid for the whole bot
+        blob = await shared_state.get(shared_key("file_id", key))
+        if blob is not None:
+            screenshot_cache.set_file_id(key, blob.decode())
+            return blob.decode()
+
+    return await token_flights.do(
+        ("screenshot",) + key,
+        lambda: _load_screenshot(key, chain, address, token_data)
+    )
+
+def remember_file_id(key: Tuple[str, str], file_id: str) -> None:
+    """Reuse an uploaded photo for later sends, across restarts too."""
+    screenshot_cache.set_file_id(key, file_id)
+    persistent_cache.put("screenshot", key, file_id, SCREENSHOT_CACHE_TTL, serialize=str.encode)
+    if shared_state.distributed:
+        schedule_shared_write(shared_key("file_id", key), file_id.encode(), SCREENSHOT_CACHE_TTL)
+
+def top_holder_concentration(data: HolderMap, count: int = 20) -> float:
+    """Percentage of supply held by the top `count` holders."""
+    return top_n(data.percentages, count)
+
+def format_currency(value: float) -> str:
+    if value >= 1_000_000_000:
+        return f"${value/1_000_000_000:.2f}B"
+    elif value >= 1_000_000:
+        return f"${value/1_000_000:.2f}M"
+    elif value >= 1_000:
+        return f"${value/1_000:.2f}K"
+    else:
+        return f"${value:.2f}"
+
+def format_price(value: float) -> str:
+    if value < 0.00000001:
+        return f"${value:.12f}"
+    elif value < 0.01:
+        return f"${value:.8f}"
+    elif value < 1:
+        return f"${value:.4f}"
+    else:
+        return f"${value:.2f}"
+
+def format_price_change(value: float) -> str:
+    emoji = "🟢" if value > 0 else "🔴" if value < 0 else "⚪"
+    return f"{emoji}{value:+.1f}%"
+
+def format_percentage(value: float) -> str:
+    return f"{value:.1f}%"
+
+def score_emoji(score: float) -> str:
+    return "🟢" if score >= 70 else "🟡" if score >= 40 else "🔴"
+
+def telegram_length(text: str) -> int:
+    """Length as Telegram counts it, in UTF-16 code units (most emoji count twice)."""
+    return len(text.encode("utf-16-le")) // 2
+
+def format_token_info(data: HolderMap, chain: str, address: str, dex_data: dict, limit: int = TELEGRAM_CAPTION_LIMIT) -> str:
+    """
+    Format token information into a readable message. The message is also
+    a photo caption, so past `limit` characters the concentration metrics
+    are left out first, then the smallest of the listed holders.
+    """
+    # Concentration metrics; linked wallets are scored as one holder
+    stats = data.stats
+    decentralization_score = stats.decentralization_score
+    
+    header = (
+        f"🔍 *{data.title}*\n"
         f"`{address}`\n"
         f"{SUPPORTED_CHAINS[chain]['name']}\n"
     )
 
     if dex_data:
-        message += (
+        header += (
             f"💰 P: {format_price(dex_data['price'])} "
             f"MC: {format_currency(dex_data['market_cap'])} "
             f"L: {format_currency(dex_data['liquidity'])}\n"
@@ -247,37 +677,132 @@ def format_token_info(data: dict, chain: str, address: str, dex_data: dict) -> s
         )
 
     # Add decentralization score with emoji indicator
-    score_emoji = "🟢" if decentralization_score >= 70 else "🟡" if decentralization_score >= 40 else "🔴"
-    message += (
-        f"Decentralization Score: {score_emoji}{format_percentage(decentralization_score)} "
-        f"Top20: {format_percentage(top_20_concentration)}\n"
-        f"👥 Holders: {len(top_holders):,}\n\n"
-        f"Top Holders:\n"
+    header += (
+        f"Decentralization Score (clustered): {score_emoji(decentralization_score)}{format_percentage(decentralization_score)} "
+        f"Top20: {format_percentage(stats.top20)}\n"
     )
+    metrics = f"📐 Gini: {stats.gini:.2f} HHI: {stats.hhi:,.0f} Nakamoto: {stats.nakamoto or '>' + str(stats.holders)}\n"
+    if stats.clusters:
+        metrics += (
+            f"🔗 Clusters: {stats.clusters} ({stats.clustered_wallets} wallets) "
+            f"Largest: {format_percentage(stats.largest_cluster)} "
+            f"Top20 clustered: {format_percentage(stats.cluster_top20)}\n"
+        )
+    count = f"👥 Holders: {len(data):,}\n"
 
     # Add top 15 holders with emojis for ranking
-    for i, holder in enumerate(top_holders[:15], 1):
+    shown = min(15, len(data))
+    holders = zip(
+        data.percentages[:shown].tolist(),
+        data.transaction_counts[:shown].tolist(),
+        data.contracts[:shown].tolist()
+    )
+    lines = []
+    for i, (percentage, tx_count, is_contract) in enumerate(holders, 1):
         rank_emoji = "👑" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else "•"
-        percentage = holder.get('percentage', 0)
-        tx_count = holder.get('transaction_count', 0)
-        is_contract = holder.get('is_contract', False)
         
-        message += (
-            f"{rank_emoji}{format_percentage(percentage)}"
-        )
+        line = f"{rank_emoji}{format_percentage(percentage)}"
         
         if tx_count > 0:
-            message += f" | 🔄 {tx_count:,} txns"
+            line += f" | 🔄 {tx_count:,} txns"
         if is_contract:
-            message += " | 📜 Contract"
+            line += " | 📜 Contract"
         
-        message += "\n"
+        lines.append(line + "\n")
 
     # Add Bubblemaps URL
-    message += f"\n🔍 View on Bubblemaps:\nhttps://{BUBBLEMAPS_UI_URL}/{chain}/token/{address}"
+    footer = f"\n🔍 View on Bubblemaps:\nhttps://{BUBBLEMAPS_UI_URL}/{chain}/token/{address}"
+
+    def build() -> str:
+        return header + metrics + count + "\nTop Holders:\n" + "".join(lines) + footer
 
+    message = build()
+    if telegram_length(message) > limit:
+        metrics = ""
+        message = build()
+    while telegram_length(message) > limit and len(lines) > 3:
+        lines.pop()
+        message = build()
     return message
 
+# Outcome of one lookup in a multi-token command: None while pending
+LookupResult = Optional[Union[Tuple[HolderMap, Dict], Exception]]
+
+def lookup_error(error: Exception) -> str:
+    if isinstance(error, Overloaded):
+        return "the bot is busy, try again in a minute"
+    return str(error) if isinstance(error, ValueError) else "lookup failed"
+
+def format_token_summary(chain: str, address: str, result: LookupResult) -> str:
+    """A few lines per token for multi-token /getinfo replies."""
+    if result is None:
+        return f"🔄 `{address}`"
+    if isinstance(result, Exception):
+        return f"⚠️ `{address}`\nError: {lookup_error(result)}"
+
+    data, dex_data = result
+    stats = data.stats
+    lines = [f"🔍 *{data.title}* - {SUPPORTED_CHAINS[chain]['name']}", f"`{address}`"]
+    if dex_data:
+        lines.append(
+            f"💰 P: {format_price(dex_data['price'])} "
+            f"MC: {format_currency(dex_data['market_cap'])} "
+            f"L: {format_currency(dex_data['liquidity'])} "
+            f"24H: {format_price_change(dex_data['price_change']['24h'])}"
+        )
+    lines.append(
+        f"Score (cl.): {score_emoji(stats.decentralization_score)}{format_percentage(stats.decentralization_score)} "
+        f"Top20: {format_percentage(stats.top20)} "
+        f"Clusters: {stats.clusters}"
+    )
+    return "\n".join(lines)
+
+def format_multi_token_info(tokens: List[Tuple[str, str]], results: Dict[int, LookupResult]) -> str:
+    """Summaries of several tokens; pending ones show a spinner."""
+    return "\n\n".join(
+        format_token_summary(chain, address, results.get(i)) for i, (chain, address) in enumerate(tokens)
+    )
+
+def format_comparison(tokens: List[Tuple[str, str]], results: Dict[int, LookupResult]) -> str:
+    """Side-by-side table of price, market data and concentration, one column per token."""
+    rows = ["", "Price", "MC", "Liq", "24H", "Top20", "Top20 cl.", "Gini", "Score cl."]
+    columns = []
+    notes = []
+    for i, (chain, address) in enumerate(tokens):
+        result = results.get(i)
+        if result is None or isinstance(result, Exception):
+            mark = "…" if result is None else "n/a"
+            columns.append([f"{address[:6]}…"] + [mark] * (len(rows) - 1))
+            if result is not None:
+                notes.append(f"⚠️ `{address}`: {lookup_error(result)}")
+            continue
+
+        data, dex_data = result
+        stats = data.stats
+        market = [
+            format_price(dex_data['price']),
+            format_currency(dex_data['market_cap']),
+            format_currency(dex_data['liquidity']),
+            f"{dex_data['price_change']['24h']:+.1f}%"
+        ] if dex_data else ["-"] * 4
+        columns.append([data.symbol.replace("`", "")[:10]] + market + [
+            format_percentage(stats.top20),
+            format_percentage(stats.cluster_top20),
+            f"{stats.gini:.2f}",
+            format_percentage(stats.decentralization_score)
+        ])
+
+    widths = [max(len(row) for row in rows)] + [max(len(cell) for cell in column) for column in columns]
+    lines = []
+    for r, label in enumerate(rows):
+        cells = [label.ljust(widths[0])] + [column[r].rjust(width) for column, width in zip(columns, widths[1:])]
+        lines.append("  ".join(cells).rstrip())
+
+    text = "📊 *Token comparison*\n```\n" + "\n".join(lines) + "\n```"
+    if notes:
+        text += "\n" + "\n".join(notes)
+    return text
+
 @bot.message_handler(commands=['start'])
 async def start_command(message):
     """Handle /start command."""
@@ -289,7 +814,7 @@ async def start_command(message):
         "Example: /getinfo sol ABC123...\n\n"
         "Use /help for more information."
     )
-    await bot.reply_to(message, welcome_text, parse_mode="Markdown")
+    await sender.reply_to(message, welcome_text, parse_mode="Markdown")
 
 @bot.message_handler(commands=['help'])
 async def help_command(message):
@@ -299,6 +824,12 @@ async def help_command(message):
         "*Available Commands:*\n"
         "• /start - Start the bot\n"
         "• /getinfo [chain] [address] - Get token information\n"
+        f"• /getinfo [chain] [address] [address]... - Summaries of up to {MULTI_TOKEN_MAX} tokens\n"
+        "• /compare [chain] [address] [address]... - Side-by-side comparison\n"
+        "• /watch [chain] [address] [threshold%] - Alert on price or holder moves\n"
+        "• /unwatch [chain] [address] - Stop watching a token\n"
+        "• /watchlist - Show watched tokens\n"
+        "• /history [chain] [address] [days] - Holder concentration over time\n"
         "• /help - Show this help message\n\n"
         "*Supported Chains:*\n"
     )
@@ -309,7 +840,14 @@ async def help_command(message):
     help_text += "• ETH/BSC/etc: 0x... (42 characters)\n"
     help_text += "• Solana: Base58 format (32-44 characters)"
     
-    await bot.reply_to(message, help_text, parse_mode="Markdown")
+    await sender.reply_to(message, help_text, parse_mode="Markdown")
+
+async def within_rate_limits(message) -> bool:
+    """Each user and each group has its own budget, shared by every bot instance, so no one can starve the rest."""
+    return (
+        await shared_state.allow(f"ratelimit:user:{message.from_user.id}", RATE_LIMIT_PER_USER, RATE_LIMIT_WINDOW)
+        and await shared_state.allow(f"ratelimit:chat:{message.chat.id}", RATE_LIMIT_PER_CHAT, RATE_LIMIT_WINDOW)
+    )
 
 @bot.message_handler(commands=['getinfo'])
 async def getinfo_command(message):
@@ -317,100 +855,890 @@ async def getinfo_command(message):
     try:
         command_text = message.text.split(' ', 1)[1] if len(message.text.split(' ', 1)) > 1 else ''
         if not command_text:
-            await bot.reply_to(
+            await sender.reply_to(
                 message,
                 "Please provide a contract address.\n"
-                "Format: [chain] [address] or just [address] for Ethereum\n"
+                "Format: [chain] [address] or just [address] to detect the chain\n"
                 "Example: eth 0x123...abc or 0x123...abc"
             )
             return
 
-        await process_token_info(message, command_text)
+        if not await within_rate_limits(message):
+            metrics.requests_total.inc(command="getinfo", outcome="rate_limited")
+            await sender.reply_to(message, ERROR_MESSAGES["rate_limit"])
+            return
+
+        tokens, error = parse_token_list(command_text)
+        if len(tokens) > 1:
+            with request_trace("getinfo_multi", log=METRICS_LOG_REQUESTS, chat_id=message.chat.id), request_deadline(REQUEST_DEADLINE):
+                await stream_token_lookups(message, await resolve_tokens(tokens), format_multi_token_info)
+            return
+        parts = command_text.split()
+        # Several addresses were given: report the one that failed instead of a format error
+        if error and len(parts) > 1 and (len(parts) > 2 or parts[0].lower() not in SUPPORTED_CHAINS and looks_like_address(parts[0])):
+            await sender.reply_to(message, error)
+            return
+
+        with request_trace("getinfo", log=METRICS_LOG_REQUESTS, chat_id=message.chat.id), request_deadline(REQUEST_DEADLINE):
+            await process_token_info(message, command_text)
+
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}", exc_info=True)
+        await sender.reply_to(message, "An unexpected error occurred. Please try again later.")
+
+@bot.message_handler(commands=['compare'])
+async def compare_command(message):
+    """Handle /compare command."""
+    try:
+        command_text = message.text.split(' ', 1)[1] if len(message.text.split(' ', 1)) > 1 else ''
+        tokens, error = parse_token_list(command_text)
+        if error:
+            await sender.reply_to(message, error)
+            return
+        if len(tokens) < 2:
+            await sender.reply_to(message, "Please provide at least two addresses to compare.")
+            return
+
+        # Before chain detection, which may call DexScreener for every address
+        if not await within_rate_limits(message):
+            metrics.requests_total.inc(command="compare", outcome="rate_limited")
+            await sender.reply_to(message, ERROR_MESSAGES["rate_limit"])
+            return
+        tokens = await resolve_tokens(tokens)
+        if len(tokens) < 2:
+            # The same token given with and without its chain
+            await sender.reply_to(message, "Please provide at least two addresses to compare.")
+            return
+
+        with request_trace("compare", log=METRICS_LOG_REQUESTS, chat_id=message.chat.id), request_deadline(REQUEST_DEADLINE):
+            await stream_token_lookups(message, tokens, format_comparison)
+
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}", exc_info=True)
+        await sender.reply_to(message, "An unexpected error occurred. Please try again later.")
+
+async def stream_token_lookups(message, tokens: List[Tuple[str, str]], render) -> None:
+    """
+    Look up several tokens concurrently and edit the reply as each one lands.
+    At most MULTI_TOKEN_CONCURRENCY lookups of one command are in flight.
+    """
+    semaphore = asyncio.Semaphore(MULTI_TOKEN_CONCURRENCY)
+    results: Dict[int, LookupResult] = {}
+    private = message.chat.type == "private"
+
+    async def lookup(index: int, chain: str, address: str) -> None:
+        async with semaphore:
+            try:
+                # Each lookup waits for its own job queue slot, like a single /getinfo
+                async with job_queue.slot(request_priority(chain, address, private)):
+                    results[index] = await fetch_token_bundle(chain, address)
+            except Exception as e:
+                if not isinstance(e, (ValueError, Overloaded)):
+                    logger.error(f"Error looking up {chain}:{address}: {str(e)}")
+                results[index] = e
+
+    text = render(tokens, results)
+    with span("placeholder"):
+        reply = await sender.reply_to(message, text, parse_mode="Markdown")
+
+    tasks = [asyncio.ensure_future(lookup(i, chain, address)) for i, (chain, address) in enumerate(tokens)]
+    for finished, next_done in enumerate(asyncio.as_completed(tasks), 1):
+        await next_done
+        updated = render(tokens, results)
+        # Lookups that finish together are shown by one edit
+        if updated == text:
+            continue
+        try:
+            with span("send_text"):
+                # Progress edits are skipped while the chat is over its limit; the last one always goes out
+                edited = await sender.edit_message_text(
+                    updated,
+                    reply.chat.id,
+                    reply.message_id,
+                    optional=finished < len(tasks),
+                    parse_mode="Markdown"
+                )
+            if edited is not None:
+                text = updated
+        except telebot.asyncio_helper.ApiTelegramException as e:
+            logger.warning(f"Error updating multi-token reply: {str(e)}")
+
+    if any(isinstance(result, Exception) for result in results.values()):
+        annotate(outcome="partial")
+
+async def upload_inline_photo(chain: str, address: str, token_data: HolderMap) -> None:
+    """Upload the map to INLINE_UPLOAD_CHAT_ID so inline answers can reference its file_id."""
+    key = token_key(chain, address)
+    content = await get_screenshot(chain, address, token_data)
+    if not isinstance(content, bytes):
+        return
+    sent = await sender.send_photo(INLINE_UPLOAD_CHAT_ID, photo=content, disable_notification=True)
+    if sent.photo:
+        remember_file_id(key, sent.photo[-1].file_id)
+    try:
+        await sender.delete_message(INLINE_UPLOAD_CHAT_ID, sent.message_id)
+    except Exception as e:
+        logger.warning(f"Error deleting inline upload: {str(e)}")
+
+async def prepare_inline_result(chain: str, address: str) -> Tuple[str, str]:
+    """Fetch and format a token for inline answers, then upload its map in the background."""
+    key = token_key(chain, address)
+    # Inline queries are speculative, so they wait behind chats of the same kind
+    async with job_queue.slot(request_priority(chain, address, private=False)):
+        token_data, dex_data = await fetch_token_bundle(chain, address)
+    prepared = (token_data.title, format_token_info(token_data, chain, address, dex_data))
+    inline_cache.set(key, prepared)
+
+    if INLINE_UPLOAD_CHAT_ID and not screenshot_cache.get_file_id(key):
+        _schedule_inline_task(("inline_photo",) + key, upload_inline_photo(chain, address, token_data))
+    return prepared
+
+def _schedule_inline_task(key: Tuple, coro) -> asyncio.Task:
+    """Run an inline preparation step in the background, once per key."""
+    task = _inline_preparations.get(key)
+    if task is not None:
+        coro.close()
+        return task
+
+    def finished(task: asyncio.Task) -> None:
+        _inline_preparations.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Inline preparation {key} failed: {str(task.exception())}")
+
+    task = _inline_preparations[key] = asyncio.ensure_future(coro)
+    task.add_done_callback(finished)
+    return task
+
+def inline_results(chain: str, address: str, title: str, text: str) -> List:
+    """The map with the summary as caption when it has been uploaded, plus the summary alone."""
+    key = token_key(chain, address)
+    content = types.InputTextMessageContent(text, parse_mode="Markdown", disable_web_page_preview=True)
+    results = [types.InlineQueryResultArticle(
+        id=f"t:{chain}:{address}"[:64],
+        title=title,
+        description=f"{SUPPORTED_CHAINS[chain]['name']} token info",
+        input_message_content=content
+    )]
+    file_id = screenshot_cache.get_file_id(key)
+    if file_id and telegram_length(text) <= TELEGRAM_CAPTION_LIMIT:
+        results.insert(0, types.InlineQueryResultCachedPhoto(
+            id=f"p:{chain}:{address}"[:64],
+            photo_file_id=file_id,
+            title=title,
+            caption=text,
+            parse_mode="Markdown"
+        ))
+    return results
+
+@bot.inline_handler(func=lambda query: True)
+async def inline_query(query):
+    """
+    Handle inline queries from prepared summaries.
+    Misses get a quick placeholder while the summary is prepared in the background.
+    """
+    try:
+        tokens, error = parse_token_list(query.query)
+        if error:
+            await sender.answer_inline_query(query.id, [], cache_time=300)
+            return
+
+        # Inline lookups share the user's budget with their commands
+        if not await shared_state.allow(f"ratelimit:user:{query.from_user.id}", RATE_LIMIT_PER_USER, RATE_LIMIT_WINDOW):
+            metrics.requests_total.inc(command="inline", outcome="rate_limited")
+            await sender.answer_inline_query(query.id, [], cache_time=1, is_personal=True)
+            return
+
+        chain, address = (await resolve_tokens(tokens[:1]))[0]
+        key = token_key(chain, address)
+        with request_trace("inline", log=METRICS_LOG_REQUESTS), request_deadline(REQUEST_DEADLINE):
+            entry = inline_cache.get(key)
+            prepared = entry.value if entry else None
+            if prepared is None:
+                # Served in time when the map is cached and only DexScreener has to answer
+                task = _schedule_inline_task(("inline",) + key, prepare_inline_result(chain, address))
+                done, _ = await asyncio.wait({task}, timeout=INLINE_GRACE)
+                if done and not task.cancelled() and task.exception() is None:
+                    prepared = task.result()
+
+            if prepared is not None:
+                results = inline_results(chain, address, *prepared)
+                await sender.answer_inline_query(query.id, results, cache_time=INLINE_CACHE_TTL)
+                return
+
+            annotate(outcome="pending")
+            placeholder = types.InlineQueryResultArticle(
+                id=f"w:{chain}:{address}"[:64],
+                title="🔄 Preparing token info...",
+                description="Type the address again in a few seconds for the full summary",
+                input_message_content=types.InputTextMessageContent(
+                    f"🔍 View on Bubblemaps:\nhttps://{BUBBLEMAPS_UI_URL}/{chain}/token/{address}"
+                )
+            )
+            await sender.answer_inline_query(query.id, [placeholder], cache_time=1, is_personal=True)
 
+    except Exception as e:
+        logger.error(f"Error answering inline query: {str(e)}", exc_info=True)
+
+PROCESSING_TEXT = "🔄 Processing your request..."
+
+async def send_placeholder(message, caption: str = PROCESSING_TEXT, **kwargs) -> Optional[types.Message]:
+    """Reply with a placeholder photo whose caption and media are edited later."""
+    global _placeholder_file_id
+
+    sent = await sender.send_photo(
+        message.chat.id,
+        photo=_placeholder_file_id or placeholder_image(),
+        caption=caption,
+        reply_to_message_id=message.message_id,
+        optional=True,
+        **kwargs
+    )
+    if _placeholder_file_id is None and sent is not None and sent.photo:
+        _placeholder_file_id = sent.photo[-1].file_id
+    return sent
+
+def status_message(message) -> StatusMessage:
+    """The processing message of a lookup, only sent if the answer is not ready quickly."""
+    if PROGRESSIVE_REPLY:
+        return sender.status(
+            message,
+            PROCESSING_TEXT,
+            send=lambda caption, **kwargs: send_placeholder(message, caption, **kwargs),
+            photo=True
+        )
+    return sender.status(message, PROCESSING_TEXT)
+
+async def reply_progressively(message, chain: str, address: str, status: StatusMessage):
+    """
+    Answer in place: the placeholder's caption becomes the token info as soon
+    as the data arrives, then the map is swapped in with a media edit.
+    """
+    try:
+        token_data, dex_data = await fetch_token_bundle(chain, address)
+    except ValueError as e:
+        annotate(outcome="unavailable" if isinstance(e, UpstreamUnavailable) else "invalid")
+        await status.answer(f"Error: {str(e)}")
+        return
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}", exc_info=True)
-        await bot.reply_to(message, "An unexpected error occurred. Please try again later.")
+        annotate(outcome="error")
+        await status.answer("An unexpected error occurred. Please try again later.")
+        return
+
+    with span("format"):
+        response_text = format_token_info(token_data, chain, address, dex_data)
+
+    # Skip the text-only step when the map is ready almost immediately (e.g. cached)
+    image_task = asyncio.ensure_future(timed("screenshot", get_screenshot(chain, address, token_data)))
+    done, _ = await asyncio.wait({image_task}, timeout=PROGRESSIVE_GRACE)
+    if not done:
+        with span("send_text"):
+            await status.show(response_text, parse_mode="Markdown")
+
+    try:
+        screenshot_content = await image_task
+    except Exception as e:
+        logger.error(f"Error generating bubble map image: {str(e)}")
+        annotate(outcome="no_image")
+        await status.answer(response_text, parse_mode="Markdown")
+        return
+
+    with span("send_photo"):
+        sent = await status.answer_photo(screenshot_content, response_text, parse_mode="Markdown")
+
+    # Later sends reference the uploaded file instead of re-uploading it
+    if isinstance(screenshot_content, bytes) and isinstance(sent, types.Message) and sent.photo:
+        remember_file_id(token_key(chain, address), sent.photo[-1].file_id)
 
 async def process_token_info(message, command_text):
     """Process token information request."""
+    status = None
     try:
         chain, address, error = extract_chain_and_address(command_text)
         if error:
-            await bot.reply_to(message, error)
+            annotate(outcome="invalid")
+            await sender.reply_to(message, error)
             return
 
+        if chain is None:
+            with span("detect_chain"):
+                chain = await resolve_chain(address)
+            if chain is None:
+                annotate(outcome="invalid")
+                await sender.reply_to(message, ADDRESS_FORMAT_ERROR)
+                return
+
         is_valid, error_msg = validate_contract_address(chain, address)
         if not is_valid:
-            await bot.reply_to(message, error_msg)
+            annotate(outcome="invalid")
+            await sender.reply_to(message, error_msg)
             return
 
-        # Send processing message
-        processing_msg = await bot.reply_to(message, "🔄 Processing your request...")
+        annotate(chain=chain, address=address)
+        # Shows the queue position while the lookup waits, then serves as the processing message
+        status = status_message(message)
+
+        async def show_position(position: int) -> None:
+            await status.show(f"⏳ Lots of requests right now, you are #{position} in line...")
 
         try:
-            # Fetch data concurrently
-            token_data, dex_data = await asyncio.gather(
-                get_token_data(chain, address),
-                get_dexscreener_data(chain, address)
-            )
-            
-            # Get screenshot
-            async with aiohttp.ClientSession() as session:
-                screenshot_url = (
-                    f"https://api.screenshotmachine.com"
-                    f"?key={os.getenv('SCREENSHOT_API_TOKEN')}"
-                    f"&url={BUBBLEMAPS_UI_URL}/{chain}/token/{address}"
-                    "&dimension=1024x768"
-                    "&device=desktop"
-                    "&format=jpg"
-                    "&cacheLimit=0"
-                    "&delay=3000"
-                )
-                async with session.get(screenshot_url) as screenshot_response:
-                    if screenshot_response.status != 200:
-                        raise ValueError(f"Screenshot API error: {screenshot_response.status}")
-                    screenshot_content = await screenshot_response.read()
+            async with job_queue.slot(request_priority(chain, address, message.chat.type == "private"), show_position):
+                await status.update(PROCESSING_TEXT)
+                if PROGRESSIVE_REPLY:
+                    await reply_progressively(message, chain, address, status)
+                else:
+                    await reply_with_photo(message, chain, address, status)
+        except Overloaded:
+            annotate(outcome="busy")
+            await status.answer(ERROR_MESSAGES["busy"])
 
-            response_text = format_token_info(token_data, chain, address, dex_data)
-            
-            # Send response with screenshot
-            await bot.send_photo(
-                message.chat.id,
-                photo=screenshot_content,
-                caption=response_text,
-                parse_mode="Markdown",
-                reply_to_message_id=message.message_id
-            )
+    except ValueError as e:
+        if isinstance(e, UpstreamUnavailable):
+            annotate(outcome="unavailable")
+        else:
+            annotate(outcome="not_found" if isinstance(e, TokenNotFoundError) else "invalid")
+        error_msg = f"Error: {str(e)}"
+        await answer_text(message, status, error_msg)
+    
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}", exc_info=True)
+        annotate(outcome="error")
+        await answer_text(message, status, "An unexpected error occurred. Please try again later.")
+
+    finally:
+        if status is not None:
+            status.cancel()
+
+def request_priority(chain: str, address: str, private: bool) -> int:
+    """Job queue priority, lower first: cached tokens and private chats go ahead of the rest."""
+    cached = map_cache.peek(token_key(chain, address)) is not None
+    return (0 if cached else 1) + (0 if private else 1)
 
-        except aiohttp.ClientError as e:
-            logger.error(f"API error: {str(e)}")
+async def answer_text(message, status: Optional[StatusMessage], text: str) -> None:
+    """Answer through the processing message when there is one."""
+    if status is not None:
+        await status.answer(text)
+    else:
+        await sender.reply_to(message, text)
+
+async def reply_with_photo(message, chain: str, address: str, status: StatusMessage):
+    """Answer with a new photo message once everything is ready, replacing the processing message if it was sent."""
+    try:
+        # Fetch data concurrently, sharing in-flight lookups with other chats
+        token_data, dex_data = await fetch_token_bundle(chain, address)
+        
+        with span("format"):
             response_text = format_token_info(token_data, chain, address, dex_data)
-            await bot.reply_to(message, response_text, parse_mode="Markdown")
+
+        # Get screenshot; without one the text goes out alone
+        try:
+            with span("screenshot"):
+                screenshot_content = await get_screenshot(chain, address, token_data)
+        except Exception as e:
+            logger.error(f"Error generating bubble map image: {str(e)}")
+            annotate(outcome="no_image")
+            await status.answer(response_text, parse_mode="Markdown")
+            return
         
-        finally:
-            # Clean up
+        # Send response with screenshot
+        with span("send_photo"):
+            sent = await status.answer_photo(screenshot_content, response_text, parse_mode="Markdown")
+
+        # Later sends reference the uploaded file instead of re-uploading it
+        if isinstance(screenshot_content, bytes) and sent.photo:
+            remember_file_id(token_key(chain, address), sent.photo[-1].file_id)
+
+    except aiohttp.ClientError as e:
+        # The photo upload failed; send the text alone
+        logger.error(f"API error: {str(e)}")
+        annotate(outcome="no_image")
+        await status.answer(response_text, parse_mode="Markdown")
+
+async def fetch_watch_snapshot(chain: str, address: str) -> Tuple[Optional[float], Optional[float]]:
+    """Current price and top-20 concentration of a watched token."""
+    dex_data, token_data = await asyncio.gather(
+        get_dexscreener_data(chain, address),
+        get_token_data(chain, address),
+        return_exceptions=True
+    )
+    price = dex_data.get('price') if isinstance(dex_data, dict) and dex_data else None
+    top20 = top_holder_concentration(token_data) if isinstance(token_data, HolderMap) else None
+    return price, top20
+
+async def fetch_watch_batch(tokens):
+    """Snapshots for a batch of watched tokens; DexScreener calls share one batched request."""
+    snapshots = await asyncio.gather(*(fetch_watch_snapshot(chain, address) for chain, address in tokens))
+    return {token_key(chain, address): snapshot for (chain, address), snapshot in zip(tokens, snapshots)}
+
+async def send_watch_alert(chat_id: int, text: str):
+    """Deliver a watch alert, dropping the chat's watches if the bot was blocked or removed."""
+    try:
+        await sender.send_message(chat_id, text, parse_mode="Markdown", disable_web_page_preview=True)
+    except telebot.asyncio_helper.ApiTelegramException as e:
+        if e.error_code == 403:
+            fields = [watch_field(chat_id, sub.chain, sub.address) for sub in watch_scheduler.subscriptions(chat_id)]
+            watch_scheduler.unsubscribe_chat(chat_id)
             try:
-                await bot.delete_message(message.chat.id, processing_msg.message_id)
-            except Exception as e:
-                logger.error(f"Error deleting processing message: {str(e)}")
+                await shared_state.hdel(WATCH_HASH, *fields)
+            except StateUnavailable:
+                logger.warning(f"Could not drop the watches of chat {chat_id} from shared state")
+        raise
+
+async def is_watch_leader() -> bool:
+    """Only one bot instance polls watched tokens; another takes over if it stops renewing."""
+    try:
+        return await shared_state.acquire("watch:leader", 2 * WATCH_INTERVAL)
+    except StateUnavailable:
+        # Without the shared lock every instance would think it leads and alert twice
+        return False
+
+watch_scheduler = WatchScheduler(fetch_watch_batch, send_watch_alert, should_poll=is_watch_leader)
+
+# Shared hash of every subscription: "chat_id:chain:address" -> {"chain", "address", "threshold"}
+WATCH_HASH = "watch"
+
+def watch_field(chat_id: int, chain: str, address: str) -> str:
+    return f"{chat_id}:{chain}:{token_key(chain, address)[1]}"
+
+async def load_watch_subscriptions() -> None:
+    """Make the scheduler's subscriptions match the shared (or, for one instance, stored) ones."""
+    wanted = {}
+    for field, value in (await shared_state.hgetall(WATCH_HASH)).items():
+        chat_id = int(field.split(":", 1)[0])
+        entry = loads(value)
+        key = token_key(entry["chain"], entry["address"])
+        wanted[(chat_id, key)] = (entry["chain"], entry["address"], entry["threshold"])
+    watch_scheduler.sync(wanted)
+
+async def sync_watch_subscriptions() -> None:
+    """Pick up subscriptions added or removed on other bot instances. Cancel the task to stop."""
+    while True:
+        try:
+            await load_watch_subscriptions()
+        except StateUnavailable:
+            # An unreadable hash is not an empty one; keep the subscriptions until it can be read
+            pass
+        except Exception as e:
+            logger.error(f"Error syncing watch subscriptions: {str(e)}")
+        await asyncio.sleep(WATCH_SYNC_INTERVAL)
+
+WATCH_USAGE = "Format: [chain] [address] [threshold%]\nExample: eth 0x123...abc 15"
+
+def parse_watch_args(text: str) -> Tuple[Optional[str], Optional[str], Optional[float], Optional[str]]:
+    """Parse "[chain] <address> [threshold]" into (chain, address, threshold, error); chain is None if not given."""
+    parts = text.strip().split()
+    threshold = None
+    if len(parts) >= 2:
+        try:
+            threshold = float(parts[-1].rstrip('%'))
+            parts = parts[:-1]
+        except ValueError:
+            pass
+    if threshold is not None and (not math.isfinite(threshold) or threshold <= 0):
+        return None, None, None, f"Threshold must be a positive percentage.\n{WATCH_USAGE}"
+
+    chain, address, error = parse_token_address(" ".join(parts))
+    if error:
+        return None, None, None, error
+    return chain, address, threshold, None
+
+def parse_token_address(text: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """Parse and validate "[chain] <address>" into (chain, address, error); chain is None if not given."""
+    chain, address, error = extract_chain_and_address(text)
+    if error:
+        return None, None, error
+
+    if chain is None:
+        is_valid, error_msg = looks_like_address(address), ADDRESS_FORMAT_ERROR
+    else:
+        is_valid, error_msg = validate_contract_address(chain, address)
+    if not is_valid:
+        return None, None, error_msg
+    return chain, address, None
+
+@bot.message_handler(commands=['watch'])
+async def watch_command(message):
+    """Handle /watch command."""
+    command_text = message.text.split(' ', 1)[1] if len(message.text.split(' ', 1)) > 1 else ''
+    if not command_text:
+        await sender.reply_to(message, f"Please provide a contract address.\n{WATCH_USAGE}")
+        return
+
+    chain, address, threshold, error = parse_watch_args(command_text)
+    if error:
+        await sender.reply_to(message, error)
+        return
+    if not await within_rate_limits(message):
+        metrics.requests_total.inc(command="watch", outcome="rate_limited")
+        await sender.reply_to(message, ERROR_MESSAGES["rate_limit"])
+        return
+    if chain is None:
+        chain = await resolve_chain(address)
+
+    key = token_key(chain, address)
+    previous = next((sub for sub in watch_scheduler.subscriptions(message.chat.id) if token_key(sub.chain, sub.address) == key), None)
+    subscription, error = watch_scheduler.subscribe(message.chat.id, key, chain, address, threshold)
+    if error:
+        await sender.reply_to(message, error)
+        return
+    try:
+        await shared_state.hset(
+            WATCH_HASH,
+            watch_field(message.chat.id, chain, address),
+            dumps({"chain": chain, "address": address, "threshold": subscription.threshold})
+        )
+    except StateUnavailable:
+        # A watch only this instance knows about would be dropped by the next sync
+        if previous is not None:
+            watch_scheduler.subscribe(message.chat.id, key, previous.chain, previous.address, previous.threshold)
+        else:
+            watch_scheduler.unsubscribe(message.chat.id, key)
+        await sender.reply_to(message, ERROR_MESSAGES["state_unavailable"])
+        return
+
+    await sender.reply_to(
+        message,
+        f"👀 Watching `{address}` on {SUPPORTED_CHAINS[chain]['name']}.\n"
+        f"You'll get an alert when the price moves {subscription.threshold:g}% or Top20 concentration shifts.",
+        parse_mode="Markdown"
+    )
+
+@bot.message_handler(commands=['unwatch'])
+async def unwatch_command(message):
+    """Handle /unwatch command."""
+    command_text = message.text.split(' ', 1)[1] if len(message.text.split(' ', 1)) > 1 else ''
+    chain, address, error = extract_chain_and_address(command_text) if command_text else (None, None, "Please provide a contract address.")
+    if error:
+        await sender.reply_to(message, error)
+        return
+    if chain is None:
+        # Match the watched token regardless of its chain
+        chains = [
+            sub.chain for sub in watch_scheduler.subscriptions(message.chat.id)
+            if token_key(sub.chain, sub.address) == token_key(sub.chain, address)
+        ]
+        chain = chains[0] if chains else "eth"
+
+    key = token_key(chain, address)
+    if not any(token_key(sub.chain, sub.address) == key for sub in watch_scheduler.subscriptions(message.chat.id)):
+        await sender.reply_to(message, "This token is not on your watchlist.")
+        return
+    try:
+        # Shared state first, so the next sync cannot bring the watch back
+        await shared_state.hdel(WATCH_HASH, watch_field(message.chat.id, chain, address))
+    except StateUnavailable:
+        await sender.reply_to(message, ERROR_MESSAGES["state_unavailable"])
+        return
+    watch_scheduler.unsubscribe(message.chat.id, key)
+    await sender.reply_to(message, f"✅ Stopped watching `{address}`.", parse_mode="Markdown")
+
+@bot.message_handler(commands=['watchlist'])
+async def watchlist_command(message):
+    """Handle /watchlist command."""
+    subscriptions = watch_scheduler.subscriptions(message.chat.id)
+    if not subscriptions:
+        await sender.reply_to(message, "You are not watching any tokens. Use /watch [chain] [address] to start.")
+        return
+
+    lines = [f"• {sub.chain} `{sub.address}` ±{sub.threshold:g}%" for sub in subscriptions]
+    await sender.reply_to(message, "👀 *Watched tokens:*\n" + "\n".join(lines), parse_mode="Markdown")
+
+# Days of history shown when /history is not given a number
+HISTORY_DEFAULT_DAYS = 7
+SPARKLINE = "▁▂▃▄▅▆▇█"
+
+def sparkline(values: List[float], width: int = 24) -> str:
+    """A row of block characters tracing `values`, resampled to at most `width` points."""
+    if len(values) > width:
+        values = [values[i * len(values) // width] for i in range(width - 1)] + [values[-1]]
+    low, high = min(values), max(values)
+    span = (high - low) or 1
+    return "".join(SPARKLINE[round((value - low) / span * (len(SPARKLINE) - 1))] for value in values)
+
+def short_address(address: str) -> str:
+    return f"{address[:6]}…{address[-4:]}" if len(address) > 12 else address
+
+def format_history(
+    title: str,
+    address: str,
+    days: float,
+    points: List[Tuple[int, int, float]],
+    changes: List[Tuple[str, float, float]]
+) -> str:
+    """How concentration, holder count and the biggest holders moved over the snapshots in `points`."""
+    (first_at, first_holders, first_top20), (_, holders, top20) = points[0], points[-1]
+    since = time.strftime("%Y-%m-%d %H:%M UTC", time.gmtime(first_at))
+    message = f"📈 *{title}* - last {days:g} days\n`{address}`\n"
+    if len(points) == 1:
+        return message + (
+            f"First snapshot taken {since}, check back later to see changes.\n\n"
+            f"Top20: {format_percentage(top20)}\n"
+            f"👥 Holders: {holders:,}"
+        )
+
+    message += (
+        f"{len(points)} snapshots since {since}\n\n"
+        f"Top20: {format_percentage(first_top20)} → {format_percentage(top20)} ({top20 - first_top20:+.1f})\n"
+        f"👥 Holders: {first_holders:,} → {holders:,} ({holders - first_holders:+,})\n"
+        f"Top20 trend: {sparkline([point[2] for point in points])}\n"
+    )
+    if changes:
+        message += "\nBiggest holders:\n"
+        for holder, then, now in changes:
+            if not then:
+                change = f"new, {format_percentage(now)}"
+            elif not now:
+                change = f"left, was {format_percentage(then)}"
+            else:
+                change = f"{format_percentage(then)} → {format_percentage(now)} ({now - then:+.1f})"
+            message += f"• `{short_address(holder)}` {change}\n"
+    return message.rstrip()
+
+@bot.message_handler(commands=['history', 'diff'])
+async def history_command(message):
+    """Handle /history command."""
+    try:
+        command_text = message.text.split(' ', 1)[1] if len(message.text.split(' ', 1)) > 1 else ''
+        parts = command_text.split()
+        days = HISTORY_DEFAULT_DAYS
+        if len(parts) >= 2:
+            try:
+                days = float(parts[-1].lower().rstrip('d'))
+                parts = parts[:-1]
+            except ValueError:
+                pass
+        chain, address, error = parse_token_address(" ".join(parts)) if parts else (None, None, "Please provide a contract address.")
+        if not error and not (math.isfinite(days) and days > 0):
+            error = "The number of days must be a positive number."
+        if error:
+            await sender.reply_to(message, error)
+            return
+
+        if not holder_history.enabled:
+            await sender.reply_to(message, "Holder history is not enabled on this bot.")
+            return
+        if not await within_rate_limits(message):
+            metrics.requests_total.inc(command="history", outcome="rate_limited")
+            await sender.reply_to(message, ERROR_MESSAGES["rate_limit"])
+            return
+
+        with request_trace("history", log=METRICS_LOG_REQUESTS, chat_id=message.chat.id), request_deadline(REQUEST_DEADLINE):
+            if chain is None:
+                chain = await resolve_chain(address)
+            key = token_key(chain, address)
+            # Nothing older than the retention period is kept
+            days = min(days, holder_history.retention / 86400)
+            since = time.time() - days * 86400
+            try:
+                async with job_queue.slot(request_priority(chain, address, message.chat.type == "private")):
+                    # A fresh fetch adds today's snapshot; the history itself is local
+                    title = address
+                    try:
+                        title = (await get_token_data(chain, address)).title
+                    except ValueError:
+                        pass
+                    points = await holder_history.series(key, since)
+                    changes = await holder_history.compare(key, since) if points else []
+            except Overloaded:
+                annotate(outcome="busy")
+                await sender.reply_to(message, ERROR_MESSAGES["busy"])
+                return
+
+            if not points:
+                annotate(outcome="empty")
+                await sender.reply_to(
+                    message,
+                    "No history for this token yet. A snapshot is taken whenever its map is fetched, "
+                    "check back later."
+                )
+                return
+            await sender.reply_to(message, format_history(title, address, days, points, changes), parse_mode="Markdown")
 
-    except ValueError as e:
-        error_msg = f"Error: {str(e)}"
-        await bot.reply_to(message, error_msg)
-    
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}", exc_info=True)
-        await bot.reply_to(message, "An unexpected error occurred. Please try again later.")
+        await sender.reply_to(message, "An unexpected error occurred. Please try again later.")
+
+async def warm_token(chain: str, address: str, budget: WarmBudget) -> None:
+    """
+    Refresh the map-data, DexScreener data and map image of a token if they
+    would expire before the next warming round, taking each upstream call
+    and Telegram upload from `budget`.
+    """
+    key = token_key(chain, address)
+
+    entry = map_cache.peek(key)
+    if entry is not None and entry.negative:
+        return
+    if entry is None or map_cache.ttl_left(entry) < WARMER_INTERVAL:
+        if not budget.take():
+            return
+        metrics.warmer_calls.inc(kind="map")
+        try:
+            # Shares the fetch with any lookup of the same token in flight
+            token_data = await token_flights.do(("map",) + key, lambda: _load_token_data(key, chain, address))
+        except Exception as e:
+            logger.warning(f"Warmer could not refresh map-data for {chain}:{address}: {str(e)}")
+            return
+    else:
+        token_data = entry.value
+
+    entry = dex_cache.peek(key)
+    if (entry is None or dex_cache.ttl_left(entry) < WARMER_INTERVAL) and budget.take():
+        metrics.warmer_calls.inc(kind="dexscreener")
+        try:
+            # Tokens are warmed concurrently, so these lookups share batched requests
+            pairs = await dexscreener_batcher.get_pairs(address)
+            cache_dex_data(key, summarize_pairs(chain, pairs))
+        except Exception as e:
+            logger.warning(f"Warmer could not refresh DexScreener data for {chain}:{address}: {str(e)}")
+
+    file_id = screenshot_cache.file_ids.peek(key)
+    if file_id is None or screenshot_cache.file_ids.ttl_left(file_id) < WARMER_INTERVAL:
+        renders_locally = SCREENSHOT_BACKEND == "local" and map_renderer.available
+        if screenshot_cache.disk_ttl_left(key) < WARMER_INTERVAL and (renders_locally or budget.take()):
+            metrics.warmer_calls.inc(kind="image")
+            try:
+                await screenshot_cache.save(key, await fetch_map_image(chain, address, token_data))
+            except Exception as e:
+                logger.warning(f"Warmer could not refresh the map image for {chain}:{address}: {str(e)}")
+                return
+        # A file_id lets the next reply skip the upload too
+        if INLINE_UPLOAD_CHAT_ID and budget.take():
+            metrics.warmer_calls.inc(kind="telegram")
+            await upload_inline_photo(chain, address, token_data)
+
+async def fetch_trending_tokens() -> List[Tuple[str, str]]:
+    """(chain, address) of the tokens listed by WARMER_TRENDING_URL, on supported chains."""
+    async def request():
+        with upstream_call("dexscreener") as call:
+            async with http_client.session.get(WARMER_TRENDING_URL) as response:
+                call["status"] = response.status
+                if response.status != 200:
+                    raise ValueError(f"Trending feed error: {response.status}")
+                return loads(await response.read())
+
+    entries = await call_upstream("dexscreener", request, use_deadline=False)
+    tokens = []
+    for entry in entries if isinstance(entries, list) else []:
+        chain = CHAINS_BY_DEXSCREENER_ID.get(entry.get('chainId'))
+        address = entry.get('tokenAddress')
+        if chain and address and validate_contract_address(chain, address)[0]:
+            tokens.append((chain, address))
+    return tokens
+
+cache_warmer = CacheWarmer(warm_token, fetch_trending_tokens if WARMER_TRENDING_URL else None)
+
+def collect_metrics():
+    """Copy cache and in-flight state into the metrics gauges before each scrape."""
+    caches = (
+        ("map_data", map_cache),
+        ("dexscreener", dex_cache),
+        ("screenshot_file_id", screenshot_cache.file_ids),
+        ("inline", inline_cache)
+    )
+    for name, cache in caches:
+        stats = cache.stats()
+        metrics.cache_hit_ratio.set(stats["hit_ratio"], cache=name)
+        metrics.cache_entries.set(stats["size"], cache=name)
+    metrics.coalesced_in_flight.set(len(token_flights))
+    metrics.warmer_tracked.set(len(cache_warmer))
+    metrics.job_queue_depth.set(len(job_queue))
+    for name, breaker in upstream_breakers.items():
+        metrics.circuit_open.set(int(breaker.is_open), upstream=name)
+
+REGISTRY.on_collect(collect_metrics)
+
+async def warm_caches() -> None:
+    """Preload the most requested tokens from the persistent cache."""
+    entries = await persistent_cache.warm(
+        PERSISTENT_CACHE_WARM_SIZE,
+        {"map": HolderMap.from_bytes, "dex": loads, "screenshot": bytes.decode}
+    )
+    for kind, key, value, ttl in entries:
+        if kind == "map":
+            # Entries past their TTL are served stale and refreshed on first use
+            map_cache.set(key, value, ttl=ttl)
+            # Popular before the restart, so worth keeping warm until demand says otherwise
+            cache_warmer.record(key, *key, weight=WARMER_MIN_SCORE)
+        elif ttl > 0 and kind == "dex":
+            dex_cache.set(key, value, ttl=ttl)
+        elif ttl > 0 and kind == "screenshot":
+            screenshot_cache.file_ids.set(key, value, ttl=ttl)
+    if entries:
+        logger.info(f"Warmed {len(entries)} cache entries from {persistent_cache.path}")
+
+async def run_webhook():
+    """Receive updates through a webhook instead of long polling."""
+    if not WEBHOOK_URL:
+        raise ValueError("WEBHOOK_URL must be set when BOT_MODE=webhook")
+
+    server = WebhookServer(bot)
+    await server.start()
+    try:
+        await bot.set_webhook(
+            url=WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            max_connections=min(100, WEBHOOK_WORKERS)
+        )
+        logger.info(f"Webhook registered at {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
 
 async def main():
     """Start the bot."""
     logger.info("Starting bot...")
+    await http_client.start()
+    if SCREENSHOT_BACKEND == "local" or WORKER_ANALYSIS_MIN_HOLDERS:
+        worker_pool.start()
+    persistent_cache.start()
+    holder_history.start()
+    try:
+        await warm_caches()
+    except Exception as e:
+        logger.error(f"Error warming caches: {str(e)}")
+    await shared_state.start()
+    try:
+        await load_watch_subscriptions()
+    except Exception as e:
+        logger.error(f"Error loading watch subscriptions: {str(e)}")
+    persistent_task = asyncio.create_task(persistent_cache.run())
+    history_task = asyncio.create_task(holder_history.run())
+    watch_task = asyncio.create_task(watch_scheduler.run())
+    # A single instance makes every change itself
+    sync_task = asyncio.create_task(sync_watch_subscriptions()) if shared_state.distributed else None
+    warmer_task = asyncio.create_task(cache_warmer.run()) if WARMER_TOP else None
+    metrics_server = MetricsServer() if METRICS_PORT else None
+    if metrics_server:
+        await metrics_server.start()
     try:
         bot_info = await bot.get_me()
         logger.info(f"Bot connected successfully! Bot name: {bot_info.first_name}")
-        await bot.infinity_polling()
+        if BOT_MODE == "webhook":
+            await run_webhook()
+        else:
+            # getUpdates fails with 409 while a webhook is set, e.g. after running in webhook mode
+            await bot.remove_webhook()
+            await bot.infinity_polling()
     except Exception as e:
         logger.error(f"Failed to start bot: {e}")
+    finally:
+        logger.info(f"Map cache stats: {map_cache.stats()}")
+        watch_task.cancel()
+        if sync_task:
+            sync_task.cancel()
+        if warmer_task:
+            warmer_task.cancel()
+        persistent_task.cancel()
+        persistent_cache.close()
+        history_task.cancel()
+        holder_history.close()
+        await shared_state.close()
+        worker_pool.shutdown()
+        if metrics_server:
+            await metrics_server.stop()
+        await http_client.close()
+        await bot.close_session()
 
 if __name__ == "__main__":
     asyncio.run(main())
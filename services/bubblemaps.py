@@ -2,6 +2,7 @@ import aiohttp
 import asyncio
 from typing import Dict, Any, Optional
 from config import BUBBLEMAPS_API_URL, SUPPORTED_CHAINS
+from services.http import http_client
 
 class BubblemapsAPI:
     def __init__(self):
@@ -9,12 +10,12 @@ class BubblemapsAPI:
         self._lock = asyncio.Lock()
     
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
+        # Borrow the shared pool; it is closed by its owner, not here
+        self.session = http_client.session
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
-            await self.session.close()
+        pass
     
     async def get_token_data(self, chain: str, address: str) -> Dict[str, Any]:
         """
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Union
+from config import DEXSCREENER_API_URL, DEXSCREENER_BATCH_WINDOW, DEXSCREENER_BATCH_SIZE, DEXSCREENER_MAX_PAIRS
+from services.http import http_client, call_upstream
+from utils.mapdata import loads
+from utils.metrics import upstream_call
+
+logger = logging.getLogger(__name__)
+
+def normalize_address(address: str) -> str:
+    """EVM addresses are case-insensitive, Solana addresses are not."""
+    address = address.strip()
+    return address.lower() if address.startswith("0x") else address
+
+class DexScreenerBatcher:
+    """
+    Micro-batches DexScreener token lookups from concurrent callers.
+
+    Addresses requested within `window` seconds (or until `max_batch`
+    distinct addresses are pending) go out as one comma-separated request,
+    and each caller gets back the pairs whose base token is its address.
+
+    The endpoint returns at most `max_pairs` pairs per request, so a few
+    heavily traded tokens can crowd the others out of a full response.
+    Addresses a full response has no pairs for are asked again in smaller
+    requests instead of being reported as having no market data.
+    """
+
+    def __init__(
+        self,
+        window: float = DEXSCREENER_BATCH_WINDOW,
+        max_batch: int = DEXSCREENER_BATCH_SIZE,
+        max_pairs: int = DEXSCREENER_MAX_PAIRS
+    ):
+        self.window = window
+        self.max_batch = max_batch
+        self.max_pairs = max_pairs
+        self._pending: Dict[str, List[asyncio.Future]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+        self.requests = 0
+        self.lookups = 0
+
+    async def get_pairs(self, address: str) -> List[dict]:
+        """All DexScreener pairs (on every chain) for a token address."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(normalize_address(address), []).append(future)
+        self.lookups += 1
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, {}
+        task = asyncio.ensure_future(self._fetch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _request(self, addresses: List[str]) -> List[dict]:
+        with upstream_call("dexscreener") as call:
+            async with http_client.session.get(f"{DEXSCREENER_API_URL}/{','.join(addresses)}") as response:
+                call["status"] = response.status
+                if response.status != 200:
+                    raise ValueError(f"DexScreener API error: {response.status}")
+                data = loads(await response.read())
+                return data.get('pairs') or []
+
+    async def _fetch(self, batch: Dict[str, List[asyncio.Future]]) -> None:
+        try:
+            # The batch serves several requests, so only the DexScreener timeout applies
+            by_address = await self._lookup(list(batch))
+        except Exception as e:
+            by_address = {address: e for address in batch}
+
+        for address, futures in batch.items():
+            result = by_address[address]
+            for future in futures:
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    async def _lookup(self, addresses: List[str]) -> Dict[str, Union[List[dict], Exception]]:
+        """Pairs per address, asking again for the addresses a full response may have cut off."""
+        self.requests += 1
+        pairs = await call_upstream("dexscreener", lambda: self._request(addresses), use_deadline=False)
+
+        by_address: Dict[str, Union[List[dict], Exception]] = {address: [] for address in addresses}
+        for pair in pairs:
+            base_address = normalize_address(pair.get('baseToken', {}).get('address', ''))
+            if base_address in by_address:
+                by_address[base_address].append(pair)
+
+        missing = [address for address in addresses if not by_address[address]]
+        if len(pairs) < self.max_pairs or not missing or len(addresses) == 1:
+            # Nothing was cut off, or a token alone filled the response
+            return by_address
+        if len(missing) < len(addresses):
+            parts = [missing]
+        else:
+            # Pairs quoting in these tokens filled the response; halve until each fits
+            parts = [missing[:len(missing) // 2], missing[len(missing) // 2:]]
+
+        results = await asyncio.gather(*(self._lookup(part) for part in parts), return_exceptions=True)
+        for part, result in zip(parts, results):
+            if isinstance(result, Exception):
+                by_address.update((address, result) for address in part)
+            else:
+                by_address.update(result)
+        return by_address
+
+# Create a singleton instance
+dexscreener_batcher = DexScreenerBatcher()
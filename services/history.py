@@ -0,0 +1,369 @@
+import os
+import time
+import asyncio
+import sqlite3
+import logging
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from config import (
+    HISTORY_PATH,
+    HISTORY_INTERVAL,
+    HISTORY_HOLDERS,
+    HISTORY_KEYFRAME_INTERVAL,
+    HISTORY_RETENTION_DAYS,
+    HISTORY_COMPACT_INTERVAL
+)
+from utils.analytics import top_n
+from utils.mapdata import HolderMap
+from utils.snapshots import Snapshot, decode, encode_delta, encode_keyframe, holder_ids, is_keyframe
+
+logger = logging.getLogger(__name__)
+
+TokenKey = Tuple[str, str]
+# (unix time, holder count, top-20 concentration in %)
+Point = Tuple[int, int, float]
+# (holder address, % of supply at the first snapshot, % at the latest)
+HolderChange = Tuple[str, float, float]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS addresses (
+    id INTEGER PRIMARY KEY,
+    address TEXT NOT NULL UNIQUE,
+    refs INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS tokens (
+    id INTEGER PRIMARY KEY,
+    chain TEXT NOT NULL,
+    address TEXT NOT NULL,
+    UNIQUE (chain, address)
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    token INTEGER NOT NULL,
+    taken_at INTEGER NOT NULL,
+    keyframe INTEGER NOT NULL,
+    holders INTEGER NOT NULL,
+    top20 REAL NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (token, taken_at)
+) WITHOUT ROWID;
+"""
+
+# The snapshots from the last keyframe at or before a time up to that time, oldest first
+CHAIN_QUERY = """
+SELECT taken_at, data FROM snapshots
+WHERE token = ? AND taken_at <= ? AND taken_at >= (
+    SELECT MAX(taken_at) FROM snapshots WHERE token = ? AND keyframe = 1 AND taken_at <= ?
+)
+ORDER BY taken_at
+"""
+
+# Snapshots past the retention period: all but the last keyframe before the cutoff
+# and what follows it, or every snapshot of a token nobody looked up since
+EXPIRED_QUERY = """
+SELECT token, taken_at, data FROM snapshots
+WHERE taken_at < :cutoff AND (
+    taken_at < (
+        SELECT MAX(k.taken_at) FROM snapshots AS k
+        WHERE k.token = snapshots.token AND k.keyframe = 1 AND k.taken_at <= :cutoff
+    )
+    OR token IN (SELECT token FROM snapshots GROUP BY token HAVING MAX(taken_at) < :cutoff)
+)
+"""
+
+class HolderHistory:
+    """
+    Time series of each token's holder distribution, in SQLite.
+
+    Every fetched map is recorded, at most once per `interval` per token.
+    Holder addresses are interned to integer IDs and a snapshot stores the
+    `holders` largest as packed arrays, written as the changes since the
+    token's previous snapshot with a full keyframe every `keyframe_interval`
+    snapshots, so reading any snapshot decodes a short chain. Holder count
+    and top-20 concentration sit in their own columns, so time-series
+    queries read no snapshot data at all.
+
+    Like PersistentCache, all database work runs on one background thread;
+    `record` only queues work.
+    """
+
+    def __init__(
+        self,
+        path: str = HISTORY_PATH,
+        interval: int = HISTORY_INTERVAL,
+        holders: int = HISTORY_HOLDERS,
+        keyframe_interval: int = HISTORY_KEYFRAME_INTERVAL,
+        retention_days: float = HISTORY_RETENTION_DAYS,
+        compact_interval: float = HISTORY_COMPACT_INTERVAL,
+        max_latest: int = 1024,
+        max_address_ids: int = 200_000
+    ):
+        self.path = path
+        self.interval = max(1, interval)
+        self.holders = holders
+        self.keyframe_interval = max(1, keyframe_interval)
+        self.retention = retention_days * 86400
+        self.compact_interval = compact_interval
+        self.max_latest = max_latest
+        self.max_address_ids = max_address_ids
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        # Background thread only: token id -> (taken_at, snapshot, deltas since its keyframe)
+        self._latest: "OrderedDict[int, Tuple[int, Snapshot, int]]" = OrderedDict()
+        self._address_ids: Dict[str, int] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def start(self) -> None:
+        if self.enabled and self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="holder-history")
+
+    def record(self, key: TokenKey, data: HolderMap) -> None:
+        """Queue a snapshot of a freshly fetched map."""
+        if self._executor is None or not len(data):
+            return
+        count = min(self.holders, len(data))
+        future = self._executor.submit(
+            self._record, key, int(time.time()),
+            data.addresses[:count], data.percentages[:count],
+            len(data), top_n(data.percentages, 20)
+        )
+        future.add_done_callback(self._log_failure)
+
+    async def series(self, key: TokenKey, since: float) -> List[Point]:
+        """Holder count and top-20 concentration of every snapshot since `since`, oldest first."""
+        if self._executor is None:
+            return []
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._series, key, int(since))
+
+    async def compare(self, key: TokenKey, since: float, count: int = 10) -> List[HolderChange]:
+        """
+        How the `count` biggest holders changed between the first snapshot
+        since `since` and the latest one, biggest first. Holders that
+        arrived or left show 0% on the other side.
+        """
+        if self._executor is None:
+            return []
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._compare, key, int(since), count)
+
+    async def run(self) -> None:
+        """Drop snapshots past the retention period. Cancel the task to stop."""
+        if self._executor is None:
+            return
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.compact_interval)
+            try:
+                await loop.run_in_executor(self._executor, self._compact, int(time.time() - self.retention))
+            except Exception as e:
+                logger.error(f"Error compacting holder history: {str(e)}")
+
+    def close(self) -> None:
+        """Finish queued snapshots and close the database."""
+        if self._executor is None:
+            return
+        executor, self._executor = self._executor, None
+        executor.submit(self._close).add_done_callback(self._log_failure)
+        executor.shutdown(wait=True)
+
+    @staticmethod
+    def _log_failure(future) -> None:
+        if future.exception() is not None:
+            logger.warning(f"Holder history write failed: {str(future.exception())}")
+
+    # Everything below runs on the background thread
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.executescript(SCHEMA)
+            if "refs" not in [column[1] for column in conn.execute("PRAGMA table_info(addresses)")]:
+                # Written before addresses were reference counted
+                with conn:
+                    conn.execute("ALTER TABLE addresses ADD COLUMN refs INTEGER NOT NULL DEFAULT 0")
+                    self._reference(conn, (blob for (blob,) in conn.execute("SELECT data FROM snapshots")), 1)
+            self._conn = conn
+        return self._conn
+
+    def _token_id(self, conn: sqlite3.Connection, key: TokenKey, create: bool = False) -> Optional[int]:
+        if create:
+            conn.execute("INSERT OR IGNORE INTO tokens (chain, address) VALUES (?, ?)", key)
+        row = conn.execute("SELECT id FROM tokens WHERE chain = ? AND address = ?", key).fetchone()
+        return row[0] if row else None
+
+    def _intern(self, conn: sqlite3.Connection, addresses: Sequence[str]) -> np.ndarray:
+        """IDs of `addresses`, assigning new ones as needed."""
+        missing = list({address for address in addresses if address not in self._address_ids})
+        if missing:
+            if len(self._address_ids) + len(missing) > self.max_address_ids:
+                self._address_ids.clear()
+                missing = list(set(addresses))
+            conn.executemany("INSERT OR IGNORE INTO addresses (address) VALUES (?)", ((address,) for address in missing))
+            for start in range(0, len(missing), 500):
+                chunk = missing[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT address, id FROM addresses WHERE address IN ({','.join('?' * len(chunk))})",
+                    chunk
+                )
+                self._address_ids.update(rows)
+        return np.fromiter((self._address_ids[address] for address in addresses), dtype=np.uint32, count=len(addresses))
+
+    def _addresses(self, conn: sqlite3.Connection, ids: Sequence[int]) -> Dict[int, str]:
+        ids = list(ids)
+        found = {}
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            found.update(conn.execute(
+                f"SELECT id, address FROM addresses WHERE id IN ({','.join('?' * len(chunk))})",
+                chunk
+            ))
+        return found
+
+    def _load(self, conn: sqlite3.Connection, token: int, at: int) -> Optional[Tuple[int, Snapshot, int]]:
+        """The last snapshot at or before `at`, with the number of deltas since its keyframe."""
+        rows = conn.execute(CHAIN_QUERY, (token, at, token, at)).fetchall()
+        snapshot = None
+        for _, blob in rows:
+            snapshot = decode(blob, snapshot)
+        return (rows[-1][0], snapshot, len(rows) - 1) if rows else None
+
+    def _latest_snapshot(self, conn: sqlite3.Connection, token: int) -> Optional[Tuple[int, Snapshot, int]]:
+        latest = self._latest.get(token)
+        if latest is not None:
+            self._latest.move_to_end(token)
+            return latest
+        latest = self._load(conn, token, 2 ** 62)
+        if latest is not None:
+            self._remember(token, latest)
+        return latest
+
+    def _remember(self, token: int, latest: Tuple[int, Snapshot, int]) -> None:
+        self._latest[token] = latest
+        self._latest.move_to_end(token)
+        while len(self._latest) > self.max_latest:
+            self._latest.popitem(last=False)
+
+    def _record(
+        self,
+        key: TokenKey,
+        taken_at: int,
+        addresses: Sequence[str],
+        percentages: np.ndarray,
+        holders: int,
+        top20: float
+    ) -> None:
+        conn = self._db()
+        with conn:
+            token = self._token_id(conn, key, create=True)
+            previous = self._latest_snapshot(conn, token)
+            if previous is not None and taken_at - previous[0] < self.interval:
+                return
+
+            known = [i for i, address in enumerate(addresses) if address]
+            ids = self._intern(conn, [addresses[i] for i in known])
+            snapshot = Snapshot.from_holders(ids, percentages[known])
+
+            blob = encode_keyframe(snapshot)
+            deltas = 0
+            if previous is not None and previous[2] + 1 < self.keyframe_interval:
+                delta = encode_delta(previous[1], snapshot)
+                # A delta larger than a keyframe (e.g. after a big reshuffle) is not worth keeping
+                if len(delta) < len(blob):
+                    blob, deltas = delta, previous[2] + 1
+
+            conn.execute(
+                "INSERT INTO snapshots VALUES (?, ?, ?, ?, ?, ?)",
+                (token, taken_at, int(is_keyframe(blob)), holders, top20, blob)
+            )
+            self._reference(conn, [blob], 1)
+        self._remember(token, (taken_at, snapshot, deltas))
+
+    def _series(self, key: TokenKey, since: int) -> List[Point]:
+        conn = self._db()
+        token = self._token_id(conn, key)
+        if token is None:
+            return []
+        return conn.execute(
+            "SELECT taken_at, holders, top20 FROM snapshots WHERE token = ? AND taken_at >= ? ORDER BY taken_at",
+            (token, since)
+        ).fetchall()
+
+    def _compare(self, key: TokenKey, since: int, count: int) -> List[HolderChange]:
+        conn = self._db()
+        token = self._token_id(conn, key)
+        if token is None:
+            return []
+        (first_at,) = conn.execute(
+            "SELECT MIN(taken_at) FROM snapshots WHERE token = ? AND taken_at >= ?",
+            (token, since)
+        ).fetchone()
+        latest = self._latest_snapshot(conn, token)
+        first = self._load(conn, token, first_at) if first_at is not None else None
+        if first is None or latest is None:
+            return []
+
+        before, after = first[1], latest[1]
+        ids = np.union1d(before.largest(count)[0], after.largest(count)[0])
+        then, now = before.percentages(ids), after.percentages(ids)
+        order = np.argsort(-np.maximum(then, now), kind="stable")[:count]
+        addresses = self._addresses(conn, ids[order].tolist())
+        return [
+            (addresses.get(int(ids[i]), "?"), float(then[i]), float(now[i]))
+            for i in order
+        ]
+
+    def _reference(self, conn: sqlite3.Connection, blobs: Iterable[bytes], sign: int) -> np.ndarray:
+        """
+        Count snapshots in (sign 1) or out (sign -1) of the `refs` of the
+        addresses they mention. Returns the IDs whose count changed.
+        """
+        ids = [np.unique(holder_ids(blob)) for blob in blobs]
+        if not ids:
+            return np.zeros(0, dtype=np.uint32)
+        ids, counts = np.unique(np.concatenate(ids), return_counts=True)
+        conn.executemany(
+            "UPDATE addresses SET refs = refs + ? WHERE id = ?",
+            zip((sign * counts).tolist(), ids.tolist())
+        )
+        return ids
+
+    def _compact(self, cutoff: int) -> None:
+        conn = self._db()
+        with conn:
+            expired = []
+            blobs = []
+            for token, taken_at, blob in conn.execute(EXPIRED_QUERY, {"cutoff": cutoff}):
+                expired.append((token, taken_at))
+                blobs.append(blob)
+            if expired:
+                conn.executemany("DELETE FROM snapshots WHERE token = ? AND taken_at = ?", expired)
+                # Only the addresses the dropped snapshots mentioned can have lost their last reference
+                released = self._reference(conn, blobs, -1)
+                conn.executemany("DELETE FROM addresses WHERE id = ? AND refs <= 0", ((i,) for i in released.tolist()))
+                conn.executemany(
+                    "DELETE FROM tokens WHERE id = ? AND NOT EXISTS (SELECT 1 FROM snapshots WHERE token = ?)",
+                    ((token, token) for token in {token for token, _ in expired})
+                )
+                # Freed IDs may be handed out again
+                self._address_ids.clear()
+        self._latest.clear()
+        conn.execute("PRAGMA incremental_vacuum")
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+# Create a singleton instance
+holder_history = HolderHistory()
@@ -0,0 +1,145 @@
+import time
+import asyncio
+import aiohttp
+from typing import Any, Awaitable, Callable, Optional, Tuple, Type
+from config import (
+    HTTP_POOL_LIMIT,
+    HTTP_POOL_LIMIT_PER_HOST,
+    HTTP_DNS_CACHE_TTL,
+    HTTP_KEEPALIVE_TIMEOUT,
+    BUBBLEMAPS_CONCURRENCY,
+    DEXSCREENER_CONCURRENCY,
+    SCREENSHOT_CONCURRENCY,
+    BUBBLEMAPS_TIMEOUT,
+    DEXSCREENER_TIMEOUT,
+    SCREENSHOT_TIMEOUT,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_TIMEOUT
+)
+from utils.ratelimit import UpstreamLimiter
+from utils.resilience import CircuitBreaker, LatencyTracker, UpstreamUnavailable, time_left
+from utils.metrics import upstream_requests
+
+UPSTREAM_NAMES = {"bubblemaps": "Bubblemaps", "dexscreener": "DexScreener", "screenshot": "The screenshot service"}
+
+class HttpClient:
+    """Process-wide aiohttp session shared by every outbound call."""
+
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """
+        The shared session. Opened lazily if main() has not started it yet.
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=HTTP_POOL_LIMIT,
+                limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+                ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+                keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def start(self) -> aiohttp.ClientSession:
+        """
+        Open the connection pool. Safe to call more than once.
+        """
+        return self.session
+
+    async def close(self) -> None:
+        """
+        Close the pool and every keep-alive connection in it.
+        """
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+# Create singleton instances
+http_client = HttpClient()
+upstream_limits = UpstreamLimiter({
+    "bubblemaps": BUBBLEMAPS_CONCURRENCY,
+    "dexscreener": DEXSCREENER_CONCURRENCY,
+    "screenshot": SCREENSHOT_CONCURRENCY
+})
+upstream_timeouts = {
+    "bubblemaps": BUBBLEMAPS_TIMEOUT,
+    "dexscreener": DEXSCREENER_TIMEOUT,
+    "screenshot": SCREENSHOT_TIMEOUT
+}
+upstream_breakers = {name: CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT) for name in upstream_timeouts}
+upstream_latency = {name: LatencyTracker() for name in upstream_timeouts}
+
+async def call_upstream(
+    name: str,
+    fetch: Callable[[], Awaitable[Any]],
+    ok_errors: Tuple[Type[BaseException], ...] = (),
+    use_deadline: bool = True
+) -> Any:
+    """
+    Run one upstream call behind its concurrency cap, circuit breaker and timeout.
+
+    The timeout is shortened to what is left of the request deadline unless
+    `use_deadline` is off (for work shared by many requests). Time-outs,
+    connection errors and an open circuit raise UpstreamUnavailable; other
+    exceptions pass through. Exceptions listed in `ok_errors` are answers,
+    not failures, and do not count against the breaker.
+
+    Waiting for a slot under the upstream's concurrency cap is bounded by the
+    same timeout but does not count against the breaker: a queue on our side
+    says nothing about the upstream's health. The call itself then gets the
+    full timeout again (still within the deadline).
+    """
+    label = UPSTREAM_NAMES.get(name, name)
+    timeout = time_left(upstream_timeouts[name]) if use_deadline else upstream_timeouts[name]
+    if timeout <= 0:
+        raise UpstreamUnavailable(f"{label} was skipped, the request ran out of time")
+
+    breaker = upstream_breakers[name]
+    if not breaker.allow():
+        upstream_requests.inc(upstream=name, status="circuit_open")
+        raise UpstreamUnavailable(f"{label} is temporarily unavailable, please try again shortly")
+
+    slot = upstream_limits.limit(name)
+    try:
+        await asyncio.wait_for(slot.acquire(), timeout)
+    except asyncio.TimeoutError:
+        upstream_requests.inc(upstream=name, status="queue_timeout")
+        raise UpstreamUnavailable(f"{label} is busy, please try again shortly")
+    try:
+        return await _call_with_breaker(name, label, fetch, ok_errors, use_deadline)
+    finally:
+        slot.release()
+
+async def _call_with_breaker(
+    name: str,
+    label: str,
+    fetch: Callable[[], Awaitable[Any]],
+    ok_errors: Tuple[Type[BaseException], ...],
+    use_deadline: bool
+) -> Any:
+    breaker = upstream_breakers[name]
+    timeout = time_left(upstream_timeouts[name]) if use_deadline else upstream_timeouts[name]
+    if timeout <= 0:
+        raise UpstreamUnavailable(f"{label} was skipped, the request ran out of time")
+
+    start = time.monotonic()
+    try:
+        result = await asyncio.wait_for(fetch(), timeout)
+    except ok_errors:
+        breaker.record_success()
+        raise
+    except asyncio.TimeoutError:
+        breaker.record_failure()
+        raise UpstreamUnavailable(f"{label} did not respond in time")
+    except aiohttp.ClientError as e:
+        breaker.record_failure()
+        raise UpstreamUnavailable(f"{label} is unreachable: {str(e)}")
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+    upstream_latency[name].observe(time.monotonic() - start)
+    return result
@@ -0,0 +1,148 @@
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+from config import JOB_CONCURRENCY, JOB_QUEUE_MAX_DEPTH, JOB_QUEUE_MAX_WAIT, JOB_QUEUE_UPDATE_INTERVAL
+from utils import metrics
+from utils.metrics import span
+
+logger = logging.getLogger(__name__)
+
+class Overloaded(Exception):
+    """The job queue turned a request away."""
+
+class JobQueue:
+    """
+    Admission control for token lookups.
+
+    At most `concurrency` jobs run at once; the rest wait in priority order
+    (lower first, then by arrival). A job is turned away with Overloaded
+    when `max_depth` jobs already wait and it does not outrank the lowest of
+    them (which it otherwise displaces), when its expected wait, estimated
+    from recent job durations, exceeds `max_wait`, or once it has actually
+    waited that long. So under overload a request is either answered within
+    a bounded time or told right away to come back later.
+
+    Waiting jobs hear their position when they join and then every
+    `update_interval` seconds while it changes.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = JOB_CONCURRENCY,
+        max_depth: int = JOB_QUEUE_MAX_DEPTH,
+        max_wait: float = JOB_QUEUE_MAX_WAIT,
+        update_interval: float = JOB_QUEUE_UPDATE_INTERVAL,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.concurrency = concurrency
+        self.max_depth = max_depth
+        self.max_wait = max_wait
+        self.update_interval = update_interval
+        self._clock = clock
+        self.running = 0
+        # Heap of [priority, arrival, future]; a job may start once its future is resolved
+        self._waiting: List[list] = []
+        self._arrivals = itertools.count()
+        # Moving average of job durations, None until a job finishes
+        self._job_seconds: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._waiting)
+
+    def expected_wait(self, ahead: int) -> float:
+        """Seconds until a job with `ahead` jobs before it should start."""
+        if not self.concurrency or self._job_seconds is None:
+            return 0.0
+        return (ahead + 1) / self.concurrency * self._job_seconds
+
+    def _position(self, entry: list) -> int:
+        return 1 + sum(1 for other in self._waiting if other[:2] < entry[:2])
+
+    def _remove(self, entry: list) -> None:
+        if entry in self._waiting:
+            self._waiting.remove(entry)
+            heapq.heapify(self._waiting)
+
+    def _shed(self, reason: str) -> Overloaded:
+        metrics.jobs_shed.inc(reason=reason)
+        return Overloaded(reason)
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        priority: int,
+        on_position: Optional[Callable[[int], Awaitable[None]]] = None
+    ) -> AsyncIterator[None]:
+        """Wait for a free slot and hold it for the body of the block."""
+        with span("queue"):
+            await self._acquire(priority, on_position)
+        started = self._clock()
+        try:
+            yield
+        finally:
+            elapsed = self._clock() - started
+            self._job_seconds = elapsed if self._job_seconds is None else 0.8 * self._job_seconds + 0.2 * elapsed
+            self._release()
+
+    async def _acquire(self, priority: int, on_position) -> None:
+        if not self.concurrency or (self.running < self.concurrency and not self._waiting):
+            self.running += 1
+            return
+
+        if len(self._waiting) >= self.max_depth:
+            lowest = max(self._waiting, key=lambda other: other[:2], default=None)
+            if lowest is None or lowest[0] <= priority:
+                raise self._shed("depth")
+            # Make room by turning away the newest of the lowest-priority jobs
+            self._remove(lowest)
+            lowest[2].set_exception(self._shed("displaced"))
+
+        ahead = sum(1 for other in self._waiting if other[0] <= priority)
+        if self.expected_wait(ahead) > self.max_wait:
+            raise self._shed("wait")
+
+        entry = [priority, next(self._arrivals), asyncio.get_running_loop().create_future()]
+        heapq.heappush(self._waiting, entry)
+        give_up = self._clock() + self.max_wait
+        shown = None
+        try:
+            while True:
+                position = self._position(entry)
+                if on_position is not None and position != shown:
+                    shown = position
+                    try:
+                        await on_position(position)
+                    except Exception as e:
+                        logger.warning(f"Error reporting queue position: {str(e)}")
+
+                remaining = give_up - self._clock()
+                if remaining <= 0 and not entry[2].done():
+                    self._remove(entry)
+                    raise self._shed("timeout")
+                try:
+                    # Overloaded if displaced by a higher-priority job
+                    await asyncio.wait_for(asyncio.shield(entry[2]), max(0, min(remaining, self.update_interval)))
+                    return
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            self._remove(entry)
+            if entry[2].done() and not entry[2].cancelled() and entry[2].exception() is None:
+                # A slot was handed over just as this job gave up; pass it on
+                self._release()
+            raise
+
+    def _release(self) -> None:
+        self.running -= 1
+        while self._waiting and (not self.concurrency or self.running < self.concurrency):
+            entry = heapq.heappop(self._waiting)
+            if not entry[2].done():
+                self.running += 1
+                entry[2].set_result(None)
+
+# Create a singleton instance
+job_queue = JobQueue()
@@ -0,0 +1,36 @@
+import logging
+from typing import Optional
+from aiohttp import web
+from config import METRICS_HOST, METRICS_PORT
+from utils.metrics import REGISTRY, Registry
+
+logger = logging.getLogger(__name__)
+
+class MetricsServer:
+    """Serves the metrics registry at /metrics in the Prometheus text format."""
+
+    def __init__(self, host: str = METRICS_HOST, port: int = METRICS_PORT, registry: Registry = REGISTRY):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self._runner: Optional[web.AppRunner] = None
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(
+            text=self.registry.render(),
+            content_type="text/plain",
+            headers={"X-Content-Type-Options": "nosniff"}
+        )
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Metrics available at http://{self.host}:{self.port}/metrics")
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
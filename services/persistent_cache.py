@@ -0,0 +1,275 @@
+import os
+import time
+import asyncio
+import sqlite3
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from config import (
+    PERSISTENT_CACHE_PATH,
+    PERSISTENT_CACHE_MAX_BYTES,
+    PERSISTENT_CACHE_COMPACT_INTERVAL
+)
+
+logger = logging.getLogger(__name__)
+
+TokenKey = Tuple[str, str]
+# (kind, key, value, seconds until the value goes stale; may be negative)
+WarmEntry = Tuple[str, TokenKey, Any, float]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    kind TEXT NOT NULL,
+    chain TEXT NOT NULL,
+    address TEXT NOT NULL,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL,
+    stale_until REAL NOT NULL,
+    PRIMARY KEY (kind, chain, address)
+);
+CREATE TABLE IF NOT EXISTS tokens (
+    chain TEXT NOT NULL,
+    address TEXT NOT NULL,
+    hits INTEGER NOT NULL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (chain, address)
+);
+CREATE TABLE IF NOT EXISTS hashes (
+    name TEXT NOT NULL,
+    field TEXT NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (name, field)
+);
+CREATE INDEX IF NOT EXISTS entries_stale_until ON entries (stale_until);
+"""
+
+# Recently and frequently requested tokens score highest: hits / (1 + days since the last request)
+SCORE = "{t}hits / (1.0 + (? - {t}last_access) / 86400.0)"
+
+class PersistentCache:
+    """
+    SQLite-backed cache tier that survives restarts.
+
+    Holds map-data, DexScreener snapshots and screenshot file_ids per token,
+    each with its own TTL, plus how often and how recently each token was
+    requested. All database work runs on one background thread; `put` and
+    `touch` only queue work, so requests never wait on the disk. Compaction
+    drops expired entries, then the lowest-scoring tokens until the file
+    fits in `max_bytes`.
+
+    Small hashes (a single instance's watch subscriptions) are kept here
+    too; they never expire and are not counted against `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        path: str = PERSISTENT_CACHE_PATH,
+        max_bytes: int = PERSISTENT_CACHE_MAX_BYTES,
+        compact_interval: float = PERSISTENT_CACHE_COMPACT_INTERVAL
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.compact_interval = compact_interval
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._accesses: Counter = Counter()
+        self._last_access: Dict[TokenKey, float] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def start(self) -> None:
+        if self.enabled and self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="persistent-cache")
+
+    def put(
+        self,
+        kind: str,
+        key: TokenKey,
+        value: Any,
+        ttl: float,
+        stale_ttl: float = 0,
+        serialize: Optional[Callable[[Any], bytes]] = None
+    ) -> None:
+        """Queue a write; `serialize` also runs on the background thread."""
+        if self._executor is None:
+            return
+        now = time.time()
+        future = self._executor.submit(self._put, kind, key, value, serialize, now + ttl, now + ttl + stale_ttl)
+        future.add_done_callback(self._log_failure)
+
+    def touch(self, key: TokenKey) -> None:
+        """Count a request for `key`; counts are written with the next flush."""
+        if self._executor is not None:
+            self._accesses[key] += 1
+            self._last_access[key] = time.time()
+
+    def hset(self, name: str, field: str, value: bytes) -> None:
+        """Queue a write of one hash field."""
+        if self._executor is not None:
+            self._executor.submit(self._hset, name, field, value).add_done_callback(self._log_failure)
+
+    def hdel(self, name: str, *fields: str) -> None:
+        """Queue the removal of hash fields."""
+        if self._executor is not None and fields:
+            self._executor.submit(self._hdel, name, fields).add_done_callback(self._log_failure)
+
+    async def hashes(self) -> Dict[str, Dict[str, bytes]]:
+        """Every stored hash, as name -> field -> value."""
+        if self._executor is None:
+            return {}
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._hashes)
+
+    async def warm(self, limit: int, decoders: Dict[str, Callable[[bytes], Any]]) -> List[WarmEntry]:
+        """Live entries of the `limit` highest-scoring tokens, decoded off the event loop."""
+        if self._executor is None:
+            return []
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._warm, limit, decoders)
+
+    async def run(self) -> None:
+        """Flush access counts and compact periodically. Cancel the task to stop."""
+        if self._executor is None:
+            return
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.compact_interval)
+            try:
+                await loop.run_in_executor(self._executor, self._flush_and_compact, self._take_accesses())
+            except Exception as e:
+                logger.error(f"Error compacting persistent cache: {str(e)}")
+
+    def close(self) -> None:
+        """Write pending access counts and close the database."""
+        if self._executor is None:
+            return
+        executor, self._executor = self._executor, None
+        executor.submit(self._flush_and_close, self._take_accesses()).add_done_callback(self._log_failure)
+        executor.shutdown(wait=True)
+
+    def _take_accesses(self) -> List[Tuple[str, str, int, float]]:
+        accesses = [(chain, address, hits, self._last_access[(chain, address)]) for (chain, address), hits in self._accesses.items()]
+        self._accesses.clear()
+        self._last_access.clear()
+        return accesses
+
+    @staticmethod
+    def _log_failure(future) -> None:
+        if future.exception() is not None:
+            logger.warning(f"Persistent cache write failed: {str(future.exception())}")
+
+    # Everything below runs on the background thread
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _put(self, kind: str, key: TokenKey, value: Any, serialize, expires_at: float, stale_until: float) -> None:
+        blob = serialize(value) if serialize else value
+        with self._db() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, key[0], key[1], blob, expires_at, stale_until)
+            )
+
+    def _hset(self, name: str, field: str, value: bytes) -> None:
+        with self._db() as conn:
+            conn.execute("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?)", (name, field, value))
+
+    def _hdel(self, name: str, fields: Tuple[str, ...]) -> None:
+        with self._db() as conn:
+            conn.executemany("DELETE FROM hashes WHERE name = ? AND field = ?", [(name, field) for field in fields])
+
+    def _hashes(self) -> Dict[str, Dict[str, bytes]]:
+        hashes: Dict[str, Dict[str, bytes]] = {}
+        for name, field, value in self._db().execute("SELECT name, field, value FROM hashes"):
+            hashes.setdefault(name, {})[field] = value
+        return hashes
+
+    def _warm(self, limit: int, decoders: Dict[str, Callable[[bytes], Any]]) -> List[WarmEntry]:
+        now = time.time()
+        rows = self._db().execute(
+            f"""
+            SELECT e.kind, e.chain, e.address, e.value, e.expires_at
+            FROM (SELECT chain, address FROM tokens ORDER BY {SCORE.format(t='')} DESC LIMIT ?) AS t
+            JOIN entries AS e ON e.chain = t.chain AND e.address = t.address
+            WHERE e.stale_until > ?
+            """,
+            (now, limit, now)
+        ).fetchall()
+
+        warmed = []
+        for kind, chain, address, blob, expires_at in rows:
+            decode = decoders.get(kind)
+            if decode is None:
+                continue
+            try:
+                warmed.append((kind, (chain, address), decode(blob), expires_at - now))
+            except Exception as e:
+                logger.warning(f"Skipping unreadable {kind} entry for {chain}:{address}: {str(e)}")
+        return warmed
+
+    def _flush(self, conn: sqlite3.Connection, accesses: List[Tuple[str, str, int, float]]) -> None:
+        conn.executemany(
+            """
+            INSERT INTO tokens VALUES (?, ?, ?, ?)
+            ON CONFLICT (chain, address) DO UPDATE SET
+                hits = hits + excluded.hits,
+                last_access = MAX(last_access, excluded.last_access)
+            """,
+            accesses
+        )
+
+    def _flush_and_compact(self, accesses: List[Tuple[str, str, int, float]]) -> None:
+        conn = self._db()
+        now = time.time()
+        with conn:
+            self._flush(conn, accesses)
+            conn.execute("DELETE FROM entries WHERE stale_until <= ?", (now,))
+
+            total = conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                # Evict whole tokens, lowest score first
+                ranked = conn.execute(
+                    f"""
+                    SELECT e.chain, e.address, SUM(LENGTH(e.value))
+                    FROM entries AS e LEFT JOIN tokens AS t ON e.chain = t.chain AND e.address = t.address
+                    GROUP BY e.chain, e.address
+                    ORDER BY COALESCE({SCORE.format(t='t.')}, 0)
+                    """,
+                    (now,)
+                ).fetchall()
+                evicted = []
+                for chain, address, size in ranked:
+                    if total <= self.max_bytes:
+                        break
+                    evicted.append((chain, address))
+                    total -= size
+                conn.executemany("DELETE FROM entries WHERE chain = ? AND address = ?", evicted)
+
+            # Forget tokens nobody asked for in 30 days
+            conn.execute("DELETE FROM tokens WHERE last_access < ?", (now - 30 * 86400,))
+        conn.execute("PRAGMA incremental_vacuum")
+
+    def _flush_and_close(self, accesses: List[Tuple[str, str, int, float]]) -> None:
+        if accesses:
+            with self._db() as conn:
+                self._flush(conn, accesses)
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+# Create a singleton instance
+persistent_cache = PersistentCache()
@@ -0,0 +1,245 @@
+import io
+import math
+import zlib
+import struct
+import random
+import functools
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+from config import RENDER_MAX_NODES
+from services.workers import WorkerPool, worker_pool
+from utils.analytics import cluster_labels
+from utils.mapdata import HolderMap
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:  # Pillow is optional; callers fall back to the screenshot service
+    Image = None
+
+RENDERER_AVAILABLE = Image is not None
+
+# Canvas
+WIDTH = 1024
+HEIGHT = 768
+MARGIN = 24
+HEADER = 56
+
+# Colors
+BACKGROUND = (14, 16, 27)
+TEXT_COLOR = (236, 238, 245)
+MUTED_TEXT_COLOR = (140, 146, 170)
+WALLET_COLOR = (84, 110, 160)
+CONTRACT_COLOR = (232, 136, 40)
+LINK_COLOR = (96, 100, 130)
+CLUSTER_COLORS = [
+    (155, 89, 232),
+    (46, 204, 150),
+    (236, 72, 120),
+    (52, 152, 240),
+    (241, 196, 15),
+    (26, 188, 200),
+    (231, 76, 60),
+    (160, 200, 60)
+]
+
+Circle = Tuple[float, float, float]
+
+def _pack(radii: Sequence[float], gap: float, seed: int = 0) -> List[Tuple[float, float]]:
+    """
+    Place circles (largest first) around the origin without overlaps.
+
+    Each circle is tried at random angles on a ring just inside the one the
+    previous circle landed on, moving outwards until it fits. A grid keeps overlap
+    checks local, so packing a few hundred circles stays cheap.
+    """
+    rng = random.Random(seed)
+    order = sorted(range(len(radii)), key=lambda i: -radii[i])
+    positions: List[Tuple[float, float]] = [(0.0, 0.0)] * len(radii)
+    if not order:
+        return positions
+
+    cell = 2 * radii[order[0]] + gap
+    grid: Dict[Tuple[int, int], List[Circle]] = {}
+    last_rho = 0.0
+
+    def fits(x: float, y: float, r: float) -> bool:
+        # Neighbours are at most the largest radius away from their cell
+        span = int(math.ceil((r + gap + cell / 2) / cell))
+        cx, cy = int(math.floor(x / cell)), int(math.floor(y / cell))
+        for gx in range(cx - span, cx + span + 1):
+            for gy in range(cy - span, cy + span + 1):
+                for ox, oy, o_r in grid.get((gx, gy), ()):
+                    if (x - ox) ** 2 + (y - oy) ** 2 < (r + o_r + gap) ** 2:
+                        return False
+        return True
+
+    for i in order:
+        r = radii[i]
+        if i == order[0]:
+            x, y = 0.0, 0.0
+        else:
+            # Radii only shrink, so the free ring is near where the last circle went
+            rho = max(0.0, last_rho - 2 * r)
+            while True:
+                for _ in range(12):
+                    angle = rng.random() * 2 * math.pi
+                    x, y = rho * math.cos(angle), rho * math.sin(angle)
+                    if fits(x, y, r):
+                        last_rho = rho
+                        break
+                else:
+                    rho += max(r, gap)
+                    continue
+                break
+
+        positions[i] = (x, y)
+        grid.setdefault((int(math.floor(x / cell)), int(math.floor(y / cell))), []).append((x, y, r))
+
+    return positions
+
+def _font(size: int):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1 has a single bitmap font
+        return ImageFont.load_default()
+
+def render_bubble_map(
+    percentages: Sequence[float],
+    contracts: Sequence[bool],
+    links: Sequence[Tuple[int, int]],
+    title: str,
+    width: int = WIDTH,
+    height: int = HEIGHT
+) -> bytes:
+    """
+    Draw a bubble map as JPEG bytes.
+
+    Bubble area follows the holder percentage, contracts are drawn in their
+    own color and wallets connected by links are packed together as one
+    cluster. Runs in a worker process, so it only takes plain sequences.
+    """
+    count = len(percentages)
+    max_pct = max(percentages, default=0) or 1.0
+    # Keep tiny holders visible next to whales
+    radii = [math.sqrt(max(pct, max_pct * 0.002)) for pct in percentages]
+    gap = 0.08 * math.sqrt(max_pct)
+
+    endpoints = np.asarray(links, dtype=np.int64).reshape(-1, 2)
+    labels = cluster_labels(count, endpoints[:, 0], endpoints[:, 1]).tolist()
+    clusters: Dict[int, List[int]] = {}
+    for i, root in enumerate(labels):
+        clusters.setdefault(root, []).append(i)
+    roots = list(clusters)
+
+    # Pack members inside each cluster, then pack the clusters themselves
+    centers: List[Tuple[float, float]] = [(0.0, 0.0)] * count
+    cluster_radii = []
+    for root in roots:
+        members = clusters[root]
+        offsets = _pack([radii[i] for i in members], gap / 2, seed=root)
+        for i, offset in zip(members, offsets):
+            centers[i] = offset
+        cluster_radii.append(max(math.hypot(*centers[i]) + radii[i] for i in members))
+
+    cluster_positions = _pack(cluster_radii, gap)
+    for root, (cx, cy) in zip(roots, cluster_positions):
+        for i in clusters[root]:
+            centers[i] = (centers[i][0] + cx, centers[i][1] + cy)
+
+    # Fit the layout into the drawing area
+    image = Image.new("RGB", (width, height), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    area_w, area_h = width - 2 * MARGIN, height - HEADER - 2 * MARGIN
+    if count:
+        min_x = min(x - r for (x, _), r in zip(centers, radii))
+        max_x = max(x + r for (x, _), r in zip(centers, radii))
+        min_y = min(y - r for (_, y), r in zip(centers, radii))
+        max_y = max(y + r for (_, y), r in zip(centers, radii))
+        scale = min(area_w / ((max_x - min_x) or 1), area_h / ((max_y - min_y) or 1))
+        offset_x = MARGIN + (area_w - (max_x - min_x) * scale) / 2 - min_x * scale
+        offset_y = HEADER + MARGIN + (area_h - (max_y - min_y) * scale) / 2 - min_y * scale
+        points = [(x * scale + offset_x, y * scale + offset_y) for x, y in centers]
+
+        for source, target in links:
+            draw.line([points[source], points[target]], fill=LINK_COLOR, width=2)
+
+        cluster_colors = {}
+        for root in roots:
+            if len(clusters[root]) > 1:
+                cluster_colors[root] = CLUSTER_COLORS[len(cluster_colors) % len(CLUSTER_COLORS)]
+
+        label_font = _font(14)
+        for i in range(count):
+            x, y = points[i]
+            r = radii[i] * scale
+            if contracts[i]:
+                color = CONTRACT_COLOR
+            else:
+                color = cluster_colors.get(labels[i], WALLET_COLOR)
+            draw.ellipse([x - r, y - r, x + r, y + r], fill=color, outline=BACKGROUND)
+            if r >= 18:
+                draw.text((x, y), f"{percentages[i]:.1f}%", fill=TEXT_COLOR, font=label_font, anchor="mm")
+
+    draw.text((MARGIN, MARGIN), title, fill=TEXT_COLOR, font=_font(24))
+    legend_font = _font(14)
+    x = width - MARGIN
+    for name, color in (("linked cluster", CLUSTER_COLORS[0]), ("contract", CONTRACT_COLOR), ("wallet", WALLET_COLOR)):
+        x -= draw.textlength(name, font=legend_font)
+        draw.text((x, MARGIN + 14), name, fill=MUTED_TEXT_COLOR, font=legend_font, anchor="lm")
+        draw.ellipse([x - 18, MARGIN + 8, x - 6, MARGIN + 20], fill=color)
+        x -= 36
+
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=85)
+    return output.getvalue()
+
+def _solid_png(width: int, height: int, color: Tuple[int, int, int]) -> bytes:
+    """Encode a single-color PNG with the standard library only."""
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+    row = b"\x00" + bytes(color) * width
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(row * height, 9))
+        + chunk(b"IEND", b"")
+    )
+
+@functools.lru_cache(maxsize=1)
+def placeholder_image() -> bytes:
+    """An empty map canvas, shown until the real map is ready. Rendered once."""
+    if RENDERER_AVAILABLE:
+        return render_bubble_map([], [], [], "BubblerMaps")
+    return _solid_png(WIDTH, HEIGHT, BACKGROUND)
+
+def render_job(blob: bytes) -> bytes:
+    """Worker side of rendering: HolderMap bytes in, JPEG bytes out."""
+    token_data = HolderMap.from_bytes(blob)
+    links = list(zip(token_data.sources.tolist(), token_data.targets.tolist()))
+    return render_bubble_map(
+        token_data.percentages.tolist(), token_data.contracts.tolist(), links, token_data.title
+    )
+
+class MapRenderer:
+    """Renders bubble maps in the worker processes so the event loop never blocks."""
+
+    def __init__(self, pool: WorkerPool = worker_pool, max_nodes: int = RENDER_MAX_NODES):
+        self.pool = pool
+        self.max_nodes = max_nodes
+
+    @property
+    def available(self) -> bool:
+        return RENDERER_AVAILABLE
+
+    async def render(self, token_data: HolderMap) -> bytes:
+        """Render the bubble map of a decoded Bubblemaps map."""
+        if not self.available:
+            raise RuntimeError("Pillow is not installed")
+        # Only the drawn holders travel to the worker, without their addresses
+        blob = token_data.head(self.max_nodes).to_bytes(with_addresses=False)
+        return await self.pool.run(render_job, blob)
+
+# Create a singleton instance
+map_renderer = MapRenderer()
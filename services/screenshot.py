@@ -1,6 +1,7 @@
 import aiohttp
 from typing import Optional
-from config import BUBBLEMAPS_UI_URL, SCREENSHOT_API_KEY
+from config import BUBBLEMAPS_UI_URL, SCREENSHOT_API_KEY, SCREENSHOT_API_URL
+from services.http import http_client
 
 class ScreenshotService:
     def __init__(self):
@@ -8,12 +9,12 @@ class ScreenshotService:
         self.api_key = SCREENSHOT_API_KEY
     
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
+        # Borrow the shared pool; it is closed by its owner, not here
+        self.session = http_client.session
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
-            await self.session.close()
+        pass
     
     async def generate_screenshot(self, chain: str, address: str) -> Optional[bytes]:
         """
@@ -24,7 +25,7 @@ class ScreenshotService:
         
         url = f"{BUBBLEMAPS_UI_URL}/{chain}/{address}"
         screenshot_url = (
-            f"https://api.screenshotmachine.com"
+            f"{SCREENSHOT_API_URL}"
             f"?key={self.api_key}"
             f"&url={url}"
             "&dimension=1024x768"
@@ -0,0 +1,110 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Optional, Tuple
+from config import (
+    SCREENSHOT_CACHE_DIR,
+    SCREENSHOT_CACHE_TTL,
+    SCREENSHOT_CACHE_SIZE,
+    SCREENSHOT_DISK_MAX_FILES,
+    SCREENSHOT_DISK_MAX_BYTES
+)
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+class ScreenshotCache:
+    """
+    Two-level screenshot cache keyed by (chain, address).
+
+    Telegram file_ids of already uploaded photos are kept in memory so a
+    repeat send costs neither a download nor an upload. The JPEG bytes
+    themselves live in a bounded directory that survives restarts.
+    """
+
+    def __init__(
+        self,
+        directory: str = SCREENSHOT_CACHE_DIR,
+        ttl: int = SCREENSHOT_CACHE_TTL,
+        max_file_ids: int = SCREENSHOT_CACHE_SIZE,
+        max_files: int = SCREENSHOT_DISK_MAX_FILES,
+        max_bytes: int = SCREENSHOT_DISK_MAX_BYTES
+    ):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.file_ids = TTLCache(max_size=max_file_ids, ttl=ttl)
+
+    def get_file_id(self, key: Tuple[str, str]) -> Optional[str]:
+        """Telegram file_id of a fresh, already uploaded screenshot."""
+        entry = self.file_ids.get(key)
+        return entry.value if entry else None
+
+    def set_file_id(self, key: Tuple[str, str], file_id: str) -> None:
+        self.file_ids.set(key, file_id)
+
+    async def load(self, key: Tuple[str, str]) -> Optional[bytes]:
+        """Read fresh screenshot bytes from disk, if any."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._read, self._path(key))
+
+    async def save(self, key: Tuple[str, str], content: bytes) -> None:
+        """Write screenshot bytes to disk and prune the directory to its bounds."""
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self._write, self._path(key), content)
+        except OSError as e:
+            logger.warning(f"Error saving screenshot to disk: {str(e)}")
+
+    def disk_ttl_left(self, key: Tuple[str, str]) -> float:
+        """Seconds until the screenshot on disk expires; negative if it is missing or expired."""
+        try:
+            return self.ttl - (time.time() - os.path.getmtime(self._path(key)))
+        except OSError:
+            return -1.0
+
+    def _path(self, key: Tuple[str, str]) -> str:
+        chain, address = key
+        return os.path.join(self.directory, f"{chain}_{address}.jpg")
+
+    def _read(self, path: str) -> Optional[bytes]:
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write(self, path: str, content: bytes) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        self._prune()
+
+    def _prune(self) -> None:
+        """Drop expired files, then the oldest ones until both bounds hold."""
+        now = time.time()
+        files = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".jpg"):
+                continue
+            stat = entry.stat()
+            if now - stat.st_mtime > self.ttl:
+                os.remove(entry.path)
+            else:
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+
+        files.sort(reverse=True)
+        total_bytes = 0
+        for i, (_, size, path) in enumerate(files):
+            total_bytes += size
+            if i >= self.max_files or total_bytes > self.max_bytes:
+                os.remove(path)
+
+# Create a singleton instance
+screenshot_cache = ScreenshotCache()
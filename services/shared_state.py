@@ -0,0 +1,299 @@
+import time
+import uuid
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from config import SHARED_STATE_URL, SHARED_STATE_PREFIX
+from services.persistent_cache import PersistentCache, persistent_cache
+from utils.cache import TTLCache
+from utils.ratelimit import RateLimiter
+
+try:
+    from redis import asyncio as redis
+    from redis.exceptions import RedisError
+except ImportError:  # redis is optional; only SHARED_STATE_URL needs it
+    redis = None
+    RedisError = OSError
+
+logger = logging.getLogger(__name__)
+
+class StateUnavailable(Exception):
+    """The shared store could not be reached, so the answer is unknown."""
+
+class SharedState:
+    """
+    State every bot instance must agree on: cached blobs, fetch locks,
+    rate-limit buckets and small hashes (watch subscriptions).
+
+    `MemoryState` keeps it in this process, which is all a single instance
+    needs. `RedisState` keeps it in Redis, so several webhook workers share
+    caches, limits and subscriptions. `distributed` tells callers whether
+    a round trip can find anything their local caches do not already hold.
+    """
+
+    distributed = False
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def acquire(self, key: str, ttl: float) -> bool:
+        """
+        Take the lock `key` for `ttl` seconds, or extend it if this instance
+        already holds it. Raises StateUnavailable if the store is down.
+        """
+        raise NotImplementedError
+
+    async def release(self, key: str) -> None:
+        """Drop the lock `key` if this instance holds it."""
+        raise NotImplementedError
+
+    async def allow(self, key: str, capacity: int, window: float, cost: float = 1) -> bool:
+        """Token bucket: `capacity` requests, regained over `window` seconds."""
+        raise NotImplementedError
+
+    async def hset(self, name: str, field: str, value: bytes) -> None:
+        raise NotImplementedError
+
+    async def hdel(self, name: str, *fields: str) -> None:
+        raise NotImplementedError
+
+    async def hgetall(self, name: str) -> Dict[str, bytes]:
+        """All fields of the hash `name`. Raises StateUnavailable if the store is down."""
+        raise NotImplementedError
+
+    async def get_or_load(
+        self,
+        key: str,
+        load: Callable[[], Awaitable[Any]],
+        ttl: float,
+        lock_ttl: float,
+        encode: Callable[[Any], bytes],
+        decode: Callable[[bytes], Any],
+        poll: float = 0.05
+    ) -> Any:
+        """
+        Read `key`, or load and store it. Only one instance loads a key at a
+        time; the others wait for its result, and load it themselves only if
+        the lock holder fails or takes longer than `lock_ttl`.
+        """
+        blob = await self.get(key)
+        if blob is not None:
+            return decode(blob)
+
+        lock = f"lock:{key}"
+        give_up = time.monotonic() + lock_ttl
+        try:
+            locked = await self.acquire(lock, lock_ttl)
+            while not locked and time.monotonic() < give_up:
+                await asyncio.sleep(poll)
+                blob = await self.get(key)
+                if blob is not None:
+                    return decode(blob)
+                locked = await self.acquire(lock, lock_ttl)
+        except StateUnavailable:
+            # Nobody can coordinate the load; do it here
+            locked = False
+
+        try:
+            value = await load()
+            await self.set(key, encode(value), ttl)
+            return value
+        finally:
+            if locked:
+                try:
+                    await self.release(lock)
+                except StateUnavailable:
+                    pass  # The lock expires on its own
+
+class MemoryState(SharedState):
+    """
+    Shared state for a single bot instance. With a `store`, hashes are
+    also written to SQLite and loaded back on start, so watch
+    subscriptions survive restarts.
+    """
+
+    def __init__(self, max_entries: int = 10000, store: Optional[PersistentCache] = None):
+        self._values = TTLCache(max_size=max_entries, ttl=60)
+        self._limiters: Dict[Tuple[int, float], RateLimiter] = {}
+        self._hashes: Dict[str, Dict[str, bytes]] = {}
+        self._store = store
+
+    async def start(self) -> None:
+        if self._store is not None:
+            self._hashes = await self._store.hashes()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._values.get(key)
+        return entry.value if entry is not None else None
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._values.set(key, value, ttl=ttl)
+
+    async def acquire(self, key: str, ttl: float) -> bool:
+        # The only instance holds every lock; it coalesces its own work locally
+        return True
+
+    async def release(self, key: str) -> None:
+        pass
+
+    async def allow(self, key: str, capacity: int, window: float, cost: float = 1) -> bool:
+        limiter = self._limiters.get((capacity, window))
+        if limiter is None:
+            limiter = self._limiters[(capacity, window)] = RateLimiter(capacity, window)
+        return limiter.is_allowed(key, cost)
+
+    async def hset(self, name: str, field: str, value: bytes) -> None:
+        self._hashes.setdefault(name, {})[field] = value
+        if self._store is not None:
+            self._store.hset(name, field, value)
+
+    async def hdel(self, name: str, *fields: str) -> None:
+        values = self._hashes.get(name, {})
+        for field in fields:
+            values.pop(field, None)
+        if self._store is not None:
+            self._store.hdel(name, *fields)
+
+    async def hgetall(self, name: str) -> Dict[str, bytes]:
+        return dict(self._hashes.get(name, {}))
+
+# Refill the bucket by the time elapsed since the last request, then take `cost`.
+# Redis' own clock is used so instances with skewed clocks agree.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return allowed
+"""
+
+# Take the lock, or extend it when this instance already holds it
+ACQUIRE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return 1
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+class RedisState(SharedState):
+    """
+    Shared state in Redis (or anything speaking its protocol, e.g. Valkey).
+
+    If Redis becomes unreachable, cached values and rate limits fall back
+    to an in-process MemoryState, so the instance keeps answering on its
+    own until Redis is back. Locks, hash writes and hash reads raise
+    StateUnavailable instead: answering them from local state would make
+    every instance a lock holder and let an empty or stale local hash
+    overwrite the shared one.
+    """
+
+    distributed = True
+
+    def __init__(self, url: str, prefix: str = SHARED_STATE_PREFIX, client=None):
+        if client is None:
+            if redis is None:
+                raise RuntimeError("SHARED_STATE_URL is set but the redis package is not installed")
+            client = redis.Redis.from_url(url)
+        self.url = url
+        self.prefix = prefix
+        self._client = client
+        # Identifies this instance's locks
+        self._owner = uuid.uuid4().hex
+        self._local = MemoryState()
+        self._token_bucket = client.register_script(TOKEN_BUCKET_SCRIPT)
+        self._acquire = client.register_script(ACQUIRE_SCRIPT)
+        self._release = client.register_script(RELEASE_SCRIPT)
+        self._failing = False
+
+    async def start(self) -> None:
+        try:
+            await self._client.ping()
+            logger.info(f"Sharing state through Redis at {self.url.rsplit('@', 1)[-1]}")
+        except RedisError as e:
+            logger.error(f"Redis is unreachable, running on local state until it is back: {str(e)}")
+            self._failing = True
+
+    async def close(self) -> None:
+        close = getattr(self._client, "aclose", None) or self._client.close
+        await close()
+
+    async def _call(self, remote: Awaitable[Any], name: Optional[str] = None, *args) -> Any:
+        """Await `remote`; if Redis fails, answer from local state with `name`, or raise StateUnavailable without one."""
+        try:
+            result = await remote
+        except RedisError as e:
+            if not self._failing:
+                logger.error(f"Redis call failed, running on local state until it is back: {str(e)}")
+                self._failing = True
+            if name is None:
+                raise StateUnavailable(str(e)) from e
+            return await getattr(self._local, name)(*args)
+        if self._failing:
+            logger.info("Redis is reachable again")
+            self._failing = False
+        return result
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._call(self._client.get(self.prefix + key), "get", key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self._call(self._client.set(self.prefix + key, value, px=max(1, int(ttl * 1000))), "set", key, value, ttl)
+
+    async def acquire(self, key: str, ttl: float) -> bool:
+        remote = self._acquire(keys=[self.prefix + key], args=[self._owner, max(1, int(ttl * 1000))])
+        return bool(await self._call(remote))
+
+    async def release(self, key: str) -> None:
+        await self._call(self._release(keys=[self.prefix + key], args=[self._owner]))
+
+    async def allow(self, key: str, capacity: int, window: float, cost: float = 1) -> bool:
+        remote = self._token_bucket(keys=[self.prefix + key], args=[capacity, capacity / window, cost])
+        return bool(await self._call(remote, "allow", key, capacity, window, cost))
+
+    async def hset(self, name: str, field: str, value: bytes) -> None:
+        await self._call(self._client.hset(self.prefix + name, field, value))
+
+    async def hdel(self, name: str, *fields: str) -> None:
+        if fields:
+            await self._call(self._client.hdel(self.prefix + name, *fields))
+
+    async def hgetall(self, name: str) -> Dict[str, bytes]:
+        values = await self._call(self._client.hgetall(self.prefix + name))
+        return {(field.decode() if isinstance(field, bytes) else field): value for field, value in values.items()}
+
+def create_shared_state(url: str = SHARED_STATE_URL) -> SharedState:
+    return RedisState(url) if url else MemoryState(store=persistent_cache)
+
+# Create a singleton instance
+shared_state = create_shared_state()
@@ -0,0 +1,299 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+from telebot.asyncio_helper import ApiTelegramException
+from config import (
+    TELEGRAM_RATE,
+    TELEGRAM_CHAT_RATE,
+    TELEGRAM_GROUP_RATE,
+    TELEGRAM_BURST,
+    TELEGRAM_MAX_RETRIES,
+    TELEGRAM_MAX_RETRY_AFTER,
+    TELEGRAM_STATUS_DELAY
+)
+from utils import metrics
+from utils.metrics import span
+from utils.ratelimit import RateLimiter
+from utils.resilience import time_left
+
+logger = logging.getLogger(__name__)
+
+# Key of the bot-wide bucket
+GLOBAL = "global"
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds Telegram asked to wait before retrying, None if `error` is not a 429."""
+    if isinstance(error, ApiTelegramException) and error.error_code == 429:
+        parameters = (error.result_json or {}).get("parameters") or {}
+        return float(parameters.get("retry_after", 1))
+    return None
+
+class TelegramSender:
+    """
+    Every call the bot makes to Telegram goes through here.
+
+    Calls are paced to stay within Telegram's limits instead of running
+    into 429s: one token bucket for the whole bot and one per chat, slower
+    for groups. Callers reserve their turn and wait in order. If Telegram
+    still answers 429, the chat (or the bot, for calls outside a chat) is
+    held back for the `retry_after` it sent and the call is retried, up to
+    `max_retries` times and only while the request deadline allows.
+
+    Calls marked `optional` (progress updates) are skipped instead of
+    delayed when their chat is out of budget, and an edit still waiting for
+    its turn is replaced by a newer edit of the same message, so a burst of
+    updates costs one call.
+    """
+
+    def __init__(
+        self,
+        bot: AsyncTeleBot,
+        rate: float = TELEGRAM_RATE,
+        chat_rate: float = TELEGRAM_CHAT_RATE,
+        group_rate: float = TELEGRAM_GROUP_RATE,
+        burst: int = TELEGRAM_BURST,
+        max_retries: int = TELEGRAM_MAX_RETRIES,
+        max_retry_after: float = TELEGRAM_MAX_RETRY_AFTER
+    ):
+        self.bot = bot
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self._global = RateLimiter(max(1, int(rate)), max(1, int(rate)) / rate)
+        self._chats = RateLimiter(burst, burst / chat_rate)
+        self._groups = RateLimiter(burst, burst * 60 / group_rate)
+        # (method, chat_id, message_id) -> [args, kwargs, shared result, callers waiting on it]
+        self._edits: Dict[Tuple[str, int, int], list] = {}
+
+    def _buckets(self, chat_id: Optional[int]):
+        buckets = [(self._global, GLOBAL)]
+        if chat_id is not None:
+            # Groups, supergroups and channels have negative ids
+            buckets.append((self._groups if chat_id < 0 else self._chats, chat_id))
+        return buckets
+
+    async def _pace(self, chat_id: Optional[int], optional: bool = False) -> bool:
+        """Wait for a turn to call Telegram; optional calls only take one that is free right now."""
+        buckets = self._buckets(chat_id)
+        if optional:
+            if any(limiter.retry_after(key) > 0 for limiter, key in buckets):
+                metrics.telegram_calls_saved.inc(reason="throttled")
+                return False
+            for limiter, key in buckets:
+                limiter.is_allowed(key)
+            return True
+
+        delay = max(limiter.reserve(key) for limiter, key in buckets)
+        if delay > 0:
+            with span("telegram_wait"):
+                await asyncio.sleep(delay)
+        return True
+
+    async def _send(self, chat_id: Optional[int], method: str, *args, **kwargs) -> Any:
+        """Call `bot.<method>`, waiting out 429s. The caller has already paced the first attempt."""
+        attempt = 0
+        while True:
+            metrics.telegram_calls.inc(method=method)
+            try:
+                return await getattr(self.bot, method)(*args, **kwargs)
+            except ApiTelegramException as e:
+                wait = retry_after(e)
+                if wait is None or attempt >= self.max_retries or wait > time_left(self.max_retry_after):
+                    raise
+                attempt += 1
+                metrics.telegram_retries.inc()
+                logger.warning(f"Telegram asked to retry {method} in {wait:g}s")
+                limiter, key = self._buckets(chat_id)[-1]
+                limiter.pause(key, wait)
+                await self._pace(chat_id)
+
+    async def call(self, chat_id: Optional[int], method: str, *args, optional: bool = False, **kwargs) -> Any:
+        """Paced `bot.<method>(*args, **kwargs)`. Returns None if an optional call was skipped."""
+        if not await self._pace(chat_id, optional):
+            return None
+        return await self._send(chat_id, method, *args, **kwargs)
+
+    async def _edit(self, method: str, first: Any, chat_id: int, message_id: int, optional: bool, kwargs: Dict) -> Any:
+        key = (method, chat_id, message_id)
+        pending = self._edits.get(key)
+        if pending is not None:
+            # The earlier edit has not gone out yet; it goes out with this content instead
+            pending[0], pending[1] = first, kwargs
+            pending[3] += 1
+            metrics.telegram_calls_saved.inc(reason="superseded_edit")
+            return await asyncio.shield(pending[2])
+
+        pending = self._edits[key] = [first, kwargs, asyncio.get_running_loop().create_future(), 0]
+        try:
+            paced = await self._pace(chat_id, optional)
+        finally:
+            del self._edits[key]
+        try:
+            result = await self._send(chat_id, method, pending[0], chat_id, message_id, **pending[1]) if paced else None
+        except Exception as e:
+            if pending[3]:
+                pending[2].set_exception(e)
+            raise
+        pending[2].set_result(result)
+        return result
+
+    async def reply_to(self, message: types.Message, text: str, optional: bool = False, **kwargs) -> Optional[types.Message]:
+        return await self.call(message.chat.id, "reply_to", message, text, optional=optional, **kwargs)
+
+    async def send_message(self, chat_id: int, text: str, optional: bool = False, **kwargs) -> Optional[types.Message]:
+        return await self.call(chat_id, "send_message", chat_id, text, optional=optional, **kwargs)
+
+    async def send_photo(self, chat_id: int, photo: Any, optional: bool = False, **kwargs) -> Optional[types.Message]:
+        return await self.call(chat_id, "send_photo", chat_id, photo, optional=optional, **kwargs)
+
+    async def edit_message_text(self, text: str, chat_id: int, message_id: int, optional: bool = False, **kwargs) -> Any:
+        return await self._edit("edit_message_text", text, chat_id, message_id, optional, kwargs)
+
+    async def edit_message_caption(self, caption: str, chat_id: int, message_id: int, optional: bool = False, **kwargs) -> Any:
+        return await self._edit("edit_message_caption", caption, chat_id, message_id, optional, kwargs)
+
+    async def edit_message_media(self, media: types.InputMedia, chat_id: int, message_id: int, **kwargs) -> Any:
+        return await self._edit("edit_message_media", media, chat_id, message_id, False, kwargs)
+
+    async def delete_message(self, chat_id: int, message_id: int) -> Any:
+        # Deletes are not limited per chat
+        return await self.call(None, "delete_message", chat_id, message_id)
+
+    async def answer_inline_query(self, inline_query_id: str, results, **kwargs) -> Any:
+        return await self.call(None, "answer_inline_query", inline_query_id, results, **kwargs)
+
+    def status(
+        self,
+        message: types.Message,
+        text: str,
+        send: Optional[Callable[..., Awaitable[Optional[types.Message]]]] = None,
+        photo: bool = False,
+        delay: float = TELEGRAM_STATUS_DELAY
+    ) -> "StatusMessage":
+        """A "processing" reply to `message`, sent only if the answer takes longer than `delay`."""
+        return StatusMessage(self, message, text, send, photo, delay)
+
+class StatusMessage:
+    """
+    A "working on it" reply that only goes out if the answer is not ready
+    within `delay` seconds. An answer that arrives in time is sent as one
+    reply, with no status message to send and delete around it.
+
+    Once the status is out, progress updates are optional edits and the
+    answer replaces it in place when Telegram allows: text answers become
+    text or caption edits, and photos replace a photo status through a
+    media edit. A photo answer to a text status is sent as a new reply
+    and the status deleted.
+    """
+
+    def __init__(
+        self,
+        sender: TelegramSender,
+        message: types.Message,
+        text: str,
+        send: Optional[Callable[..., Awaitable[Optional[types.Message]]]] = None,
+        photo: bool = False,
+        delay: float = TELEGRAM_STATUS_DELAY
+    ):
+        self.sender = sender
+        self.message = message
+        self.photo = photo
+        self.sent: Optional[types.Message] = None
+        self._send = send or (lambda text, **kwargs: sender.reply_to(message, text, optional=True, **kwargs))
+        # What the status shows, or will show once sent
+        self._content: Tuple[str, Dict] = (text, {})
+        self._shown: Optional[Tuple[str, Dict]] = None
+        self._done = False
+        self._lock = asyncio.Lock()
+        self._timer = asyncio.ensure_future(self._post_later(delay))
+
+    async def _post_later(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        async with self._lock:
+            await self._post()
+
+    async def _post(self) -> None:
+        if self._done:
+            return
+        # Whatever happens, the status is posted at most once
+        self._done = True
+        text, kwargs = self._content
+        try:
+            self.sent = await self._send(text, **kwargs)
+        except Exception as e:
+            logger.warning(f"Error sending status message: {str(e)}")
+            return
+        if self.sent is not None:
+            self._shown = self._content
+
+    async def _edit(self, text: str, kwargs: Dict, optional: bool) -> Any:
+        if (text, kwargs) == self._shown:
+            metrics.telegram_calls_saved.inc(reason="unchanged")
+            return self.sent
+        method = self.sender.edit_message_caption if self.photo else self.sender.edit_message_text
+        result = await method(text, self.sent.chat.id, self.sent.message_id, optional=optional, **kwargs)
+        if result is not None:
+            self._shown = (text, kwargs)
+        return result
+
+    async def update(self, text: str, **kwargs) -> None:
+        """Change what the status says; an edit if it is already out."""
+        async with self._lock:
+            self._content = (text, kwargs)
+            if self.sent is not None:
+                await self._edit_quietly(text, kwargs)
+
+    async def show(self, text: str, **kwargs) -> None:
+        """Like `update`, but sends the status right away if it is not out yet."""
+        async with self._lock:
+            self._content = (text, kwargs)
+            self._timer.cancel()
+            if self.sent is None:
+                await self._post()
+            else:
+                await self._edit_quietly(text, kwargs)
+
+    async def _edit_quietly(self, text: str, kwargs: Dict) -> None:
+        try:
+            await self._edit(text, kwargs, optional=True)
+        except ApiTelegramException as e:
+            logger.warning(f"Error updating status message: {str(e)}")
+
+    async def answer(self, text: str, **kwargs) -> Any:
+        """Answer with text: an edit of the status if it is out, a reply otherwise."""
+        async with self._lock:
+            self.cancel()
+            if self.sent is None:
+                return await self.sender.reply_to(self.message, text, **kwargs)
+            return await self._edit(text, kwargs, optional=False)
+
+    async def answer_photo(self, photo: Any, caption: str, **kwargs) -> Any:
+        """Answer with a photo: a media edit of a photo status, a reply otherwise."""
+        async with self._lock:
+            self.cancel()
+            if self.sent is not None and self.photo:
+                media = types.InputMediaPhoto(photo, caption=caption, **kwargs)
+                return await self.sender.edit_message_media(media, self.sent.chat.id, self.sent.message_id)
+
+            sent = await self.sender.send_photo(
+                self.message.chat.id,
+                photo,
+                caption=caption,
+                reply_to_message_id=self.message.message_id,
+                **kwargs
+            )
+            if self.sent is not None:
+                try:
+                    await self.sender.delete_message(self.sent.chat.id, self.sent.message_id)
+                except Exception as e:
+                    logger.error(f"Error deleting processing message: {str(e)}")
+                self.sent = None
+            return sent
+
+    def cancel(self) -> None:
+        """Never send the status, if it is not out yet."""
+        if not self._done:
+            metrics.telegram_calls_saved.inc(reason="status_unsent")
+        self._done = True
+        self._timer.cancel()
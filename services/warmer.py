@@ -0,0 +1,163 @@
+import math
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from config import (
+    WARMER_INTERVAL,
+    WARMER_TOP,
+    WARMER_BUDGET,
+    WARMER_HALF_LIFE,
+    WARMER_MIN_SCORE,
+    WARMER_TRACKED,
+    WARMER_TRENDING_INTERVAL,
+    WARMER_CONCURRENCY
+)
+
+logger = logging.getLogger(__name__)
+
+TokenKey = Tuple[str, str]
+
+class WarmBudget:
+    """Upstream calls (and Telegram uploads) a warming round may still make."""
+
+    def __init__(self, calls: int):
+        self.left = calls
+        self.spent = 0
+
+    def take(self) -> bool:
+        """Spend one call if any are left."""
+        if self.left <= 0:
+            return False
+        self.left -= 1
+        self.spent += 1
+        return True
+
+class CacheWarmer:
+    """
+    Keeps the most requested tokens cached ahead of demand.
+
+    Every request adds one to its token's score and scores decay
+    exponentially with `half_life`, so a token asked for in a burst an hour
+    ago ranks below one asked for steadily. Every `interval` seconds the
+    `top` tokens scoring at least `min_score`, followed by trending tokens,
+    are handed to `warm`, which refreshes whatever would expire before the
+    next round, taking every upstream call and Telegram upload from the
+    round's WarmBudget of `budget` calls. Up to `concurrency` tokens are
+    warmed at once, so their DexScreener lookups share batched requests.
+    """
+
+    def __init__(
+        self,
+        warm: Callable[[str, str, WarmBudget], Awaitable[None]],
+        fetch_trending: Optional[Callable[[], Awaitable[List[Tuple[str, str]]]]] = None,
+        interval: float = WARMER_INTERVAL,
+        top: int = WARMER_TOP,
+        budget: int = WARMER_BUDGET,
+        half_life: float = WARMER_HALF_LIFE,
+        min_score: float = WARMER_MIN_SCORE,
+        max_tracked: int = WARMER_TRACKED,
+        trending_interval: float = WARMER_TRENDING_INTERVAL,
+        concurrency: int = WARMER_CONCURRENCY,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.warm = warm
+        self.fetch_trending = fetch_trending
+        self.interval = interval
+        self.top = top
+        self.budget = budget
+        self.decay = math.log(2) / half_life
+        self.min_score = min_score
+        self.max_tracked = max_tracked
+        self.trending_interval = trending_interval
+        self.concurrency = concurrency
+        self._clock = clock
+        # key -> [score, last update, chain, address]
+        self._scores: Dict[TokenKey, list] = {}
+        self._trending: List[Tuple[str, str]] = []
+        self._trending_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def record(self, key: TokenKey, chain: str, address: str, weight: float = 1.0) -> None:
+        """Count a request for a token."""
+        now = self._clock()
+        entry = self._scores.get(key)
+        if entry is None:
+            self._scores[key] = [weight, now, chain, address]
+            if len(self._scores) > self.max_tracked:
+                self._prune(now)
+        else:
+            entry[0] = entry[0] * math.exp(-self.decay * (now - entry[1])) + weight
+            entry[1] = now
+
+    def score(self, key: TokenKey) -> float:
+        entry = self._scores.get(key)
+        if entry is None:
+            return 0.0
+        return entry[0] * math.exp(-self.decay * (self._clock() - entry[1]))
+
+    def hottest(self) -> List[Tuple[str, str]]:
+        """The `top` tokens by decayed score, at least `min_score` each."""
+        now = self._clock()
+        ranked = sorted(
+            ((score * math.exp(-self.decay * (now - updated)), chain, address)
+             for score, updated, chain, address in self._scores.values()),
+            reverse=True
+        )
+        return [(chain, address) for score, chain, address in ranked[:self.top] if score >= self.min_score]
+
+    def _prune(self, now: float) -> None:
+        # Forget the coldest tenth at once so pruning stays rare
+        ranked = sorted(self._scores, key=lambda key: self._scores[key][0] * math.exp(-self.decay * (now - self._scores[key][1])))
+        for key in ranked[:max(1, len(ranked) // 10)]:
+            del self._scores[key]
+
+    async def _candidates(self, budget: WarmBudget) -> List[Tuple[str, str]]:
+        """Tokens to warm this round; fetching the trending feed comes out of `budget`."""
+        now = self._clock()
+        if self.fetch_trending is not None and (self._trending_at is None or now - self._trending_at >= self.trending_interval):
+            self._trending_at = now
+            budget.take()
+            try:
+                self._trending = await self.fetch_trending()
+            except Exception as e:
+                logger.warning(f"Error fetching trending tokens: {str(e)}")
+
+        candidates = self.hottest()
+        seen = set(candidates)
+        for token in self._trending:
+            if len(candidates) >= self.top:
+                break
+            if token not in seen:
+                seen.add(token)
+                candidates.append(token)
+        return candidates
+
+    async def warm_round(self) -> int:
+        """Warm the current candidates within the budget. Returns the upstream calls made."""
+        budget = WarmBudget(self.budget)
+        candidates = await self._candidates(budget)
+        slots = asyncio.Semaphore(max(1, self.concurrency))
+
+        async def warm(chain: str, address: str) -> None:
+            async with slots:
+                if budget.left <= 0:
+                    return
+                try:
+                    await self.warm(chain, address, budget)
+                except Exception as e:
+                    logger.warning(f"Error warming {chain}:{address}: {str(e)}")
+
+        await asyncio.gather(*(warm(chain, address) for chain, address in candidates))
+        return budget.spent
+
+    async def run(self) -> None:
+        """Warm caches every `interval` seconds. Cancel the task to stop."""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.warm_round()
+            except Exception as e:
+                logger.error(f"Error warming caches: {str(e)}", exc_info=True)
@@ -0,0 +1,267 @@
+import time
+import heapq
+import random
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
+from config import (
+    WATCH_INTERVAL,
+    WATCH_JITTER,
+    WATCH_BATCH_SIZE,
+    WATCH_DEFAULT_THRESHOLD,
+    WATCH_TOP20_DELTA,
+    WATCH_MAX_PER_CHAT,
+    WATCH_MAX_PENDING_ALERTS
+)
+
+logger = logging.getLogger(__name__)
+
+TokenKey = Tuple[str, str]
+# (price in USD or None, top-20 concentration in % or None)
+Snapshot = Tuple[Optional[float], Optional[float]]
+
+class Subscription:
+    """One chat watching one token, with the baseline its alerts compare against."""
+
+    __slots__ = ("chat_id", "chain", "address", "threshold", "base_price", "base_top20")
+
+    def __init__(self, chat_id: int, chain: str, address: str, threshold: float):
+        self.chat_id = chat_id
+        self.chain = chain
+        self.address = address
+        self.threshold = threshold
+        self.base_price: Optional[float] = None
+        self.base_top20: Optional[float] = None
+
+class TokenWatch:
+    """All subscriptions for one token; the token is polled once for all of them."""
+
+    __slots__ = ("key", "chain", "address", "subscribers", "due")
+
+    def __init__(self, key: TokenKey, chain: str, address: str):
+        self.key = key
+        self.chain = chain
+        self.address = address
+        self.subscribers: Dict[int, Subscription] = {}
+        self.due = 0.0
+
+class WatchScheduler:
+    """
+    Polls watched tokens and pushes alerts to subscribed chats.
+
+    Tokens, not subscriptions, are scheduled: a min-heap of due times holds
+    one entry per watched token, so polling load grows with the number of
+    distinct tokens rather than subscribers. Due tokens are fetched in
+    batches and rescheduled with a jittered interval to spread the load.
+
+    When several bot instances run, every instance keeps the schedule but
+    only the one for which `should_poll` returns True fetches and alerts.
+
+    Alerts are sent from their own tasks, so a token with many subscribers
+    does not hold up polling while its alerts wait for their turn to be
+    sent. Polling only waits once `max_pending_alerts` are still unsent.
+    """
+
+    def __init__(
+        self,
+        fetch_batch: Callable[[Sequence[Tuple[str, str]]], Awaitable[Dict[TokenKey, Snapshot]]],
+        notify: Callable[[int, str], Awaitable[None]],
+        interval: float = WATCH_INTERVAL,
+        jitter: float = WATCH_JITTER,
+        batch_size: int = WATCH_BATCH_SIZE,
+        default_threshold: float = WATCH_DEFAULT_THRESHOLD,
+        top20_delta: float = WATCH_TOP20_DELTA,
+        max_per_chat: int = WATCH_MAX_PER_CHAT,
+        max_pending_alerts: int = WATCH_MAX_PENDING_ALERTS,
+        should_poll: Optional[Callable[[], Awaitable[bool]]] = None
+    ):
+        self.fetch_batch = fetch_batch
+        self.notify = notify
+        self.should_poll = should_poll
+        self.interval = interval
+        self.jitter = jitter
+        self.batch_size = batch_size
+        self.default_threshold = default_threshold
+        self.top20_delta = top20_delta
+        self.max_per_chat = max_per_chat
+        self.max_pending_alerts = max_pending_alerts
+
+        self.tokens: Dict[TokenKey, TokenWatch] = {}
+        self._by_chat: Dict[int, Dict[TokenKey, Subscription]] = {}
+        self._heap: List[Tuple[float, int, TokenKey]] = []
+        self._seq = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._alerts: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return sum(len(subs) for subs in self._by_chat.values())
+
+    def subscribe(
+        self,
+        chat_id: int,
+        key: TokenKey,
+        chain: str,
+        address: str,
+        threshold: Optional[float] = None
+    ) -> Tuple[Optional[Subscription], Optional[str]]:
+        """Add or update a subscription. Returns (subscription, error_message)."""
+        chat_subs = self._by_chat.setdefault(chat_id, {})
+        if key not in chat_subs and len(chat_subs) >= self.max_per_chat:
+            return None, f"You can watch at most {self.max_per_chat} tokens per chat."
+
+        watch = self.tokens.get(key)
+        if watch is None:
+            watch = self.tokens[key] = TokenWatch(key, chain, address)
+            # Poll new tokens right away to record the baseline
+            self._schedule(watch, time.monotonic())
+
+        subscription = Subscription(chat_id, chain, address, threshold or self.default_threshold)
+        old = watch.subscribers.get(chat_id)
+        if old is not None:
+            subscription.base_price, subscription.base_top20 = old.base_price, old.base_top20
+        watch.subscribers[chat_id] = subscription
+        chat_subs[key] = subscription
+        return subscription, None
+
+    def unsubscribe(self, chat_id: int, key: TokenKey) -> bool:
+        chat_subs = self._by_chat.get(chat_id, {})
+        if chat_subs.pop(key, None) is None:
+            return False
+        if not chat_subs:
+            del self._by_chat[chat_id]
+
+        watch = self.tokens.get(key)
+        if watch is not None:
+            watch.subscribers.pop(chat_id, None)
+            if not watch.subscribers:
+                # Its heap entry is skipped lazily when it comes due
+                del self.tokens[key]
+        return True
+
+    def unsubscribe_chat(self, chat_id: int) -> None:
+        for key in list(self._by_chat.get(chat_id, {})):
+            self.unsubscribe(chat_id, key)
+
+    def subscriptions(self, chat_id: int) -> List[Subscription]:
+        return list(self._by_chat.get(chat_id, {}).values())
+
+    def sync(self, wanted: Dict[Tuple[int, TokenKey], Tuple[str, str, float]]) -> None:
+        """
+        Match the subscriptions to `wanted` ((chat_id, key) -> (chain, address, threshold)),
+        e.g. after another instance changed them. Baselines of kept subscriptions survive.
+        """
+        for chat_id, chat_subs in list(self._by_chat.items()):
+            for key in list(chat_subs):
+                if (chat_id, key) not in wanted:
+                    self.unsubscribe(chat_id, key)
+        for (chat_id, key), (chain, address, threshold) in wanted.items():
+            current = self._by_chat.get(chat_id, {}).get(key)
+            if current is None or current.threshold != threshold:
+                self.subscribe(chat_id, key, chain, address, threshold)
+
+    def _schedule(self, watch: TokenWatch, due: float) -> None:
+        watch.due = due
+        self._seq += 1
+        heapq.heappush(self._heap, (due, self._seq, watch.key))
+        if self._wakeup is not None and self._heap[0][2] == watch.key:
+            self._wakeup.set()
+
+    def _next_due(self) -> float:
+        spread = self.interval * self.jitter
+        return time.monotonic() + self.interval + random.uniform(-spread, spread)
+
+    def _pop_due(self, now: float) -> List[TokenWatch]:
+        """Pop up to one batch of due tokens, dropping stale heap entries."""
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+            when, _, key = heapq.heappop(self._heap)
+            watch = self.tokens.get(key)
+            if watch is not None and watch.due == when:
+                due.append(watch)
+        return due
+
+    async def run(self) -> None:
+        """Poll due tokens forever. Cancel the task to stop."""
+        self._wakeup = asyncio.Event()
+        try:
+            await self._run()
+        finally:
+            for task in self._alerts:
+                task.cancel()
+
+    async def _run(self) -> None:
+        while True:
+            now = time.monotonic()
+            batch = self._pop_due(now)
+            if not batch:
+                timeout = self._heap[0][0] - now if self._heap else None
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                if self.should_poll is None or await self.should_poll():
+                    await self._poll(batch)
+            except Exception as e:
+                logger.error(f"Error polling watched tokens: {str(e)}", exc_info=True)
+            finally:
+                for watch in batch:
+                    if self.tokens.get(watch.key) is watch:
+                        self._schedule(watch, self._next_due())
+
+    async def _poll(self, batch: List[TokenWatch]) -> None:
+        snapshots = await self.fetch_batch([(watch.chain, watch.address) for watch in batch])
+        for watch in batch:
+            snapshot = snapshots.get(watch.key)
+            if snapshot is None:
+                continue
+            for subscription in list(watch.subscribers.values()):
+                alert = self._check(subscription, *snapshot)
+                if alert:
+                    await self._dispatch(subscription.chat_id, alert)
+
+    async def _dispatch(self, chat_id: int, alert: str) -> None:
+        """Send an alert in the background, waiting only while too many are still unsent."""
+        while len(self._alerts) >= self.max_pending_alerts:
+            await asyncio.wait(self._alerts, return_when=asyncio.FIRST_COMPLETED)
+        task = asyncio.ensure_future(self._notify(chat_id, alert))
+        self._alerts.add(task)
+        task.add_done_callback(self._alerts.discard)
+
+    async def _notify(self, chat_id: int, alert: str) -> None:
+        try:
+            await self.notify(chat_id, alert)
+        except Exception as e:
+            logger.error(f"Error sending watch alert: {str(e)}")
+
+    def _check(self, subscription: Subscription, price: Optional[float], top20: Optional[float]) -> Optional[str]:
+        """Compare a snapshot against the subscription baseline; move the baseline on alert."""
+        reasons = []
+        if price is not None:
+            if not subscription.base_price:
+                subscription.base_price = price
+            else:
+                change = (price - subscription.base_price) / subscription.base_price * 100
+                if abs(change) >= subscription.threshold:
+                    reasons.append(f"{'📈' if change > 0 else '📉'} Price {change:+.1f}% (now ${price:.8g})")
+                    subscription.base_price = price
+
+        if top20 is not None:
+            if subscription.base_top20 is not None:
+                delta = top20 - subscription.base_top20
+                if abs(delta) >= self.top20_delta:
+                    reasons.append(f"👥 Top20 concentration {delta:+.1f} pts (now {top20:.1f}%)")
+                    subscription.base_top20 = top20
+            else:
+                subscription.base_top20 = top20
+
+        if not reasons:
+            return None
+        return (
+            f"🔔 *Watch alert* ({subscription.chain})\n"
+            f"`{subscription.address}`\n"
+            + "\n".join(reasons)
+        )
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+from typing import List, Optional
+from aiohttp import web
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+from config import (
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBHOOK_WORKERS,
+    WEBHOOK_QUEUE_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+class WebhookServer:
+    """
+    Receives Telegram updates over HTTP and processes them with a worker pool.
+
+    Each update is acknowledged as soon as it is queued. A fixed number of
+    worker tasks drain the bounded queue, so one slow update never blocks
+    the others. When the queue is full the server answers 503 and Telegram
+    redelivers the update later.
+    """
+
+    def __init__(
+        self,
+        bot: AsyncTeleBot,
+        host: str = WEBHOOK_HOST,
+        port: int = WEBHOOK_PORT,
+        path: str = WEBHOOK_PATH,
+        secret: Optional[str] = WEBHOOK_SECRET,
+        workers: int = WEBHOOK_WORKERS,
+        queue_size: int = WEBHOOK_QUEUE_SIZE
+    ):
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret = secret
+        self.workers = workers
+        self.queue_size = queue_size
+
+        self.app = web.Application()
+        self.app.router.add_post(self.path, self.handle_update)
+        self._queue: Optional[asyncio.Queue] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self.dropped = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        if self.secret and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != self.secret:
+            return web.Response(status=403)
+
+        try:
+            update = types.Update.de_json(await request.text())
+        except Exception as e:
+            logger.warning(f"Invalid webhook payload: {str(e)}")
+            return web.Response(status=400)
+
+        try:
+            self._queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning("Update queue full, asking Telegram to retry")
+            return web.Response(status=503)
+
+        return web.Response()
+
+    async def _worker(self) -> None:
+        while True:
+            update = await self._queue.get()
+            try:
+                await self.bot.process_new_updates([update])
+            except Exception as e:
+                logger.error(f"Error processing update: {str(e)}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    async def start(self) -> None:
+        """Start the HTTP server and the update workers."""
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Webhook server listening on {self.host}:{self.port}{self.path} with {self.workers} workers")
+
+    async def stop(self, drain_timeout: float = 10) -> None:
+        """Stop accepting updates, let queued ones finish, then stop the workers."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Dropping {self._queue.qsize()} queued updates on shutdown")
+
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
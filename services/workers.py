@@ -0,0 +1,109 @@
+import os
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+from config import WORKER_PROCESSES, WORKER_QUEUE_SIZE
+from utils import metrics
+from utils.analytics import HolderStats
+from utils.mapdata import HolderMap
+
+logger = logging.getLogger(__name__)
+
+def analyze_job(blob: bytes) -> bytes:
+    """Worker side of map analysis: HolderMap bytes in, HolderStats bytes out."""
+    return HolderMap.from_bytes(blob).stats.to_bytes()
+
+class WorkerPool:
+    """
+    Worker processes for CPU-bound stages (map analysis, rendering).
+
+    Jobs are module-level functions that take and return bytes, so a map
+    crosses the process boundary as one compact buffer instead of a pickled
+    object graph. At most `queue_size` jobs are queued or running; further
+    callers wait for a slot, which keeps a burst from piling up work the
+    workers cannot finish. A slot stays taken until the worker is done,
+    even if the caller stopped waiting. If a worker dies the pool is replaced and the
+    job retried once.
+    """
+
+    def __init__(self, processes: int = WORKER_PROCESSES, queue_size: int = WORKER_QUEUE_SIZE):
+        self.processes = processes or os.cpu_count() or 1
+        self.queue_size = queue_size or 4 * self.processes
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.restarts = 0
+
+    def start(self) -> None:
+        """Spawn the worker processes ahead of the first job."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            for _ in range(self.processes):
+                self._executor.submit(int)
+
+    def shutdown(self, wait: bool = False) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def _replace(self, broken: ProcessPoolExecutor) -> None:
+        # Concurrent jobs all see the same broken pool; replace it once
+        if self._executor is broken:
+            logger.error("A worker process died, restarting the worker pool")
+            self.restarts += 1
+            metrics.worker_restarts.inc()
+            broken.shutdown(wait=False)
+            self._executor = None
+            self.start()
+
+    async def run(self, job: Callable[..., Any], *args) -> Any:
+        """Run `job(*args)` in a worker process once a queue slot is free."""
+        for attempt in range(2):
+            self.start()
+            executor = self._executor
+            try:
+                return await self._submit(executor, job, *args)
+            except BrokenProcessPool:
+                self._replace(executor)
+                if attempt:
+                    raise
+
+    async def _submit(self, executor: ProcessPoolExecutor, job: Callable[..., Any], *args) -> Any:
+        # A caller that gives up (e.g. on a timeout) cannot stop a job a worker
+        # has started, so the slot is freed when the job finishes, not the caller
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.queue_size)
+        await self._slots.acquire()
+        loop = asyncio.get_running_loop()
+        try:
+            future = executor.submit(job, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        metrics.worker_jobs_in_flight.inc()
+
+        def finished(_) -> None:
+            try:
+                loop.call_soon_threadsafe(self._finished)
+            except RuntimeError:
+                pass  # The event loop is closed; so are the slots
+
+        future.add_done_callback(finished)
+        return await asyncio.wrap_future(future)
+
+    def _finished(self) -> None:
+        metrics.worker_jobs_in_flight.dec()
+        self._slots.release()
+
+    async def analyze(self, data: HolderMap) -> None:
+        """Compute the map's holder analytics in a worker; the addresses stay behind."""
+        stats = await self.run(analyze_job, data.to_bytes(with_addresses=False))
+        data.stats = HolderStats.from_bytes(stats)
+
+# Create a singleton instance
+worker_pool = WorkerPool()
@@ -0,0 +1,19 @@
+import os
+import sys
+
+# Run from anywhere: the bot's modules are imported from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# main.py creates its bot at import time
+os.environ.setdefault("BUBBLER_TOKEN", "123456:test")
+
+class FakeClock:
+    """A clock the test moves by hand."""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
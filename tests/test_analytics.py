@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from utils.analytics import HolderStats, analyze, cluster_labels, gini, hhi, nakamoto, top_n
+
+def links(*pairs):
+    pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+    return pairs[:, 0], pairs[:, 1]
+
+def test_cluster_labels_point_at_the_biggest_holder():
+    sources, targets = links((4, 2), (2, 0), (3, 5))
+    assert cluster_labels(6, sources, targets).tolist() == [0, 1, 0, 3, 0, 3]
+
+def test_cluster_labels_follow_long_chains():
+    count = 1000
+    # Links run from the smallest holder up, so every hop needs a merge
+    sources, targets = np.arange(count - 1, 0, -1), np.arange(count - 2, -1, -1)
+    assert (cluster_labels(count, sources, targets) == 0).all()
+
+def test_concentration_metrics():
+    equal = np.full(4, 25.0)
+    assert gini(equal) == pytest.approx(0)
+    assert hhi(equal) == pytest.approx(2500)
+    assert nakamoto(equal) == 3
+
+    skewed = np.array([0, 0, 0, 100.0])
+    assert gini(skewed) == pytest.approx(0.75)
+    assert hhi(skewed) == pytest.approx(10_000)
+    assert nakamoto(skewed) == 1
+
+    # The listed holders never reach a majority
+    assert nakamoto(np.array([10.0, 5.0])) is None
+    assert top_n(np.array([1.0, 5.0, 3.0, 4.0]), 2) == pytest.approx(9)
+    assert gini(np.array([])) == 0
+
+def test_clusters_count_as_one_holder():
+    percentages = np.array([20.0, 15, 10, 10, 5] + [1.0] * 40)
+    # Holders 1, 3 and 4 are one wallet cluster worth 30%
+    sources, targets = links((1, 3), (4, 3))
+    stats = analyze(percentages, sources, targets)
+
+    assert stats.holders == 45
+    assert stats.clusters == 1 and stats.clustered_wallets == 3
+    assert stats.largest_cluster == pytest.approx(30)
+    assert stats.top20 == pytest.approx(20 + 15 + 10 + 10 + 5 + 15)
+    # Clustered: 30, 20, 10 and the 17 largest 1% holders
+    assert stats.cluster_top20 == pytest.approx(30 + 20 + 10 + 17)
+    assert stats.decentralization_score == pytest.approx(100 - stats.cluster_top20 / 2)
+    # More than half: 20+15+10+10 wallet by wallet, 30+20+10 by cluster
+    assert stats.nakamoto == 4 and stats.cluster_nakamoto == 3
+
+def test_stats_survive_the_binary_form():
+    stats = analyze(np.array([10.0, 5.0]), *links())
+    assert stats.nakamoto is None
+
+    copy = HolderStats.from_bytes(stats.to_bytes())
+    assert copy.as_dict() == stats.as_dict()
@@ -0,0 +1,61 @@
+from conftest import FakeClock
+from utils.cache import TTLCache
+
+def test_fresh_then_stale_then_gone():
+    clock = FakeClock()
+    cache = TTLCache(max_size=10, ttl=10, stale_ttl=5, clock=clock)
+    cache.set("a", 1)
+
+    entry = cache.get("a")
+    assert entry.value == 1 and cache.is_fresh(entry)
+
+    clock.advance(12)
+    entry = cache.get("a")
+    assert entry.value == 1 and not cache.is_fresh(entry)
+    assert cache.ttl_left(entry) < 0
+
+    clock.advance(5)
+    assert cache.get("a") is None
+    assert "a" not in cache
+    assert (cache.hits, cache.stale_hits, cache.misses) == (1, 1, 1)
+
+def test_refresh_replaces_stale_entry():
+    clock = FakeClock()
+    cache = TTLCache(max_size=10, ttl=10, stale_ttl=5, clock=clock)
+    cache.set("a", 1)
+    clock.advance(11)
+    assert not cache.is_fresh(cache.get("a"))
+
+    cache.set("a", 2)
+    entry = cache.get("a")
+    assert entry.value == 2 and cache.is_fresh(entry)
+
+def test_negative_entries_are_never_stale():
+    clock = FakeClock()
+    cache = TTLCache(max_size=10, ttl=10, stale_ttl=60, negative_ttl=2, clock=clock)
+    cache.set_negative("a", "not found")
+    assert cache.get("a").negative
+
+    clock.advance(2)
+    assert cache.get("a") is None
+
+def test_evicts_least_recently_used():
+    cache = TTLCache(max_size=2, ttl=10, clock=FakeClock())
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert "a" in cache and "c" in cache
+    assert "b" not in cache
+    assert cache.evictions == 1
+
+def test_peek_leaves_order_and_counters_alone():
+    cache = TTLCache(max_size=2, ttl=10, clock=FakeClock())
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.peek("a").value == 1
+    cache.set("c", 3)
+
+    assert "a" not in cache
+    assert cache.stats()["hits"] == 0
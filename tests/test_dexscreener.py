@@ -0,0 +1,63 @@
+import asyncio
+from typing import List
+from services.dexscreener import DexScreenerBatcher
+
+def pair(address: str, quote: str = "usdc") -> dict:
+    return {"baseToken": {"address": address}, "quoteToken": {"address": quote}}
+
+class StubBatcher(DexScreenerBatcher):
+    """Answers from `pairs_by_token`, capped at `max_pairs` pairs per request like the real API."""
+
+    def __init__(self, pairs_by_token, **kwargs):
+        super().__init__(window=0.01, **kwargs)
+        self.pairs_by_token = pairs_by_token
+        self.asked: List[List[str]] = []
+
+    async def _request(self, addresses: List[str]) -> List[dict]:
+        self.asked.append(sorted(addresses))
+        pairs = [p for address in addresses for p in self.pairs_by_token.get(address, [])]
+        return pairs[:self.max_pairs]
+
+def lookup(batcher: DexScreenerBatcher, *addresses: str):
+    async def scenario():
+        return await asyncio.gather(*(batcher.get_pairs(address) for address in addresses))
+    return asyncio.run(scenario())
+
+def test_concurrent_lookups_share_one_request():
+    batcher = StubBatcher({"0xa": [pair("0xa")], "0xb": [pair("0xb")]})
+    a, b, c = lookup(batcher, "0xA", "0xb", "0xc")
+    assert (len(a), len(b), c) == (1, 1, [])
+    assert batcher.asked == [["0xa", "0xb", "0xc"]]
+
+def test_tokens_crowded_out_of_a_full_response_are_asked_again():
+    batcher = StubBatcher({"0xa": [pair("0xa")] * 3, "0xb": [pair("0xb")]}, max_pairs=3)
+    a, b = lookup(batcher, "0xa", "0xb")
+    assert (len(a), len(b)) == (3, 1)
+    assert batcher.asked == [["0xa", "0xb"], ["0xb"]]
+
+def test_batches_filled_by_other_tokens_are_halved():
+    # Pairs quoting in 0xa and 0xb whose base token is something else
+    crowd = [pair("0xother", quote="0xa")] * 4
+    batcher = StubBatcher({"0xa": crowd, "0xb": [pair("0xb")], "0xc": [pair("0xc")]}, max_pairs=4)
+    a, b, c = lookup(batcher, "0xa", "0xb", "0xc")
+    assert (a, len(b), len(c)) == ([], 1, 1)
+    assert batcher.asked[0] == ["0xa", "0xb", "0xc"]
+    # A token that fills a response on its own is not asked again
+    assert batcher.asked.count(["0xa"]) == 1
+
+def test_a_response_with_room_left_is_final():
+    batcher = StubBatcher({"0xa": [pair("0xa")]}, max_pairs=3)
+    a, b = lookup(batcher, "0xa", "0xb")
+    assert (len(a), b) == (1, [])
+    assert len(batcher.asked) == 1
+
+def test_errors_reach_every_caller():
+    class Failing(StubBatcher):
+        async def _request(self, addresses):
+            raise ValueError("DexScreener API error: 500")
+
+    async def scenario():
+        batcher = Failing({})
+        return await asyncio.gather(batcher.get_pairs("0xa"), batcher.get_pairs("0xb"), return_exceptions=True)
+
+    assert [type(error) for error in asyncio.run(scenario())] == [ValueError, ValueError]
@@ -0,0 +1,90 @@
+import time
+import asyncio
+from types import SimpleNamespace
+import numpy as np
+import pytest
+import main
+from services.history import HolderHistory
+
+def history(tmp_path) -> HolderHistory:
+    return HolderHistory(path=str(tmp_path / "history.sqlite3"), interval=1, holders=5, keyframe_interval=3)
+
+def record(history: HolderHistory, key, taken_at: int, addresses) -> None:
+    percentages = np.linspace(30, 1, len(addresses))
+    history._record(key, taken_at, addresses, percentages, len(addresses), float(percentages.sum()))
+
+def table(history: HolderHistory, query: str):
+    return history._db().execute(query).fetchall()
+
+def test_compaction_keeps_what_remaining_snapshots_need(tmp_path):
+    holders = history(tmp_path)
+    key = ("eth", "0xabc")
+    for step in range(10):
+        # Three holders stay, two are replaced every time
+        record(holders, key, 1000 + step * 10, ["stay0", "stay1", "stay2", f"a{step}", f"b{step}"])
+    before = holders._compare(key, 1065, 10)
+
+    holders._compact(1065)
+    # The keyframe at 1060 and its deltas remain
+    assert [row[0] for row in table(holders, "SELECT taken_at FROM snapshots")] == [1060, 1070, 1080, 1090]
+    assert sorted(row[0] for row in table(holders, "SELECT address FROM addresses")) == sorted(
+        ["stay0", "stay1", "stay2"] + [f"{prefix}{step}" for prefix in "ab" for step in range(6, 10)]
+    )
+    assert holders._compare(key, 1065, 10) == before
+
+    # New snapshots still intern correctly after IDs were freed
+    record(holders, key, 2000, ["stay0", "new0"])
+    assert ("new0", 0.0, 1.0) in holders._compare(key, 1065, 10)
+
+def test_compaction_drops_tokens_nobody_looked_up(tmp_path):
+    holders = history(tmp_path)
+    record(holders, ("eth", "0xold"), 1000, ["shared", "old"])
+    record(holders, ("eth", "0xnew"), 1000, ["shared"])
+    record(holders, ("eth", "0xnew"), 2000, ["shared", "new"])
+
+    holders._compact(1500)
+    assert table(holders, "SELECT chain, address FROM tokens") == [("eth", "0xnew")]
+    assert sorted(table(holders, "SELECT address, refs FROM addresses")) == [("new", 1), ("shared", 1)]
+
+EVM = "0x" + "ab" * 20
+
+class Replies:
+    def __init__(self):
+        self.texts = []
+
+    async def reply_to(self, message, text, **kwargs):
+        self.texts.append(text)
+
+def history_message(text: str):
+    return SimpleNamespace(text=text, chat=SimpleNamespace(id=1, type="private"), from_user=SimpleNamespace(id=7), message_id=5)
+
+@pytest.mark.parametrize("days", ["nan", "inf", "-inf", "0", "-3d"])
+def test_history_rejects_non_finite_and_non_positive_days(monkeypatch, days):
+    replies = Replies()
+    monkeypatch.setattr(main, "sender", replies)
+    asyncio.run(main.history_command(history_message(f"/history eth {EVM} {days}")))
+    assert replies.texts == ["The number of days must be a positive number."]
+
+def test_history_clamps_days_to_the_retention_period(monkeypatch, tmp_path):
+    replies = Replies()
+    store = HolderHistory(path=str(tmp_path / "history.sqlite3"), retention_days=30)
+    asked = []
+
+    async def series(key, since):
+        asked.append(since)
+        return []
+
+    async def within_rate_limits(message):
+        return True
+
+    async def get_token_data(chain, address):
+        raise ValueError("no data")
+
+    monkeypatch.setattr(store, "series", series)
+    monkeypatch.setattr(main, "holder_history", store)
+    monkeypatch.setattr(main, "sender", replies)
+    monkeypatch.setattr(main, "within_rate_limits", within_rate_limits)
+    monkeypatch.setattr(main, "get_token_data", get_token_data)
+    asyncio.run(main.history_command(history_message(f"/history eth {EVM} 1000000")))
+    assert len(asked) == 1
+    assert asked[0] == pytest.approx(time.time() - 30 * 86400, abs=60)
@@ -0,0 +1,97 @@
+import asyncio
+import pytest
+from services.job_queue import JobQueue, Overloaded
+
+async def hold(queue: JobQueue, priority: int, release: asyncio.Event) -> None:
+    async with queue.slot(priority):
+        await release.wait()
+
+async def started(task: asyncio.Task) -> None:
+    """Let `task` run up to where it waits."""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def test_full_queue_sheds_jobs_that_do_not_outrank_the_waiting_ones():
+    async def scenario():
+        queue = JobQueue(concurrency=1, max_depth=1, max_wait=60, update_interval=60)
+        release = asyncio.Event()
+        running = asyncio.ensure_future(hold(queue, 0, release))
+        await started(running)
+        waiting = asyncio.ensure_future(hold(queue, 1, release))
+        await started(waiting)
+        assert queue.running == 1 and len(queue) == 1
+
+        with pytest.raises(Overloaded, match="depth"):
+            await hold(queue, 1, release)
+
+        release.set()
+        await asyncio.gather(running, waiting)
+        assert queue.running == 0 and len(queue) == 0
+
+    asyncio.run(scenario())
+
+def test_higher_priority_job_displaces_the_lowest_waiting_one():
+    async def scenario():
+        queue = JobQueue(concurrency=1, max_depth=1, max_wait=60, update_interval=60)
+        release = asyncio.Event()
+        order = []
+
+        async def job(priority: int) -> None:
+            async with queue.slot(priority):
+                order.append(priority)
+                await release.wait()
+
+        running = asyncio.ensure_future(job(0))
+        await started(running)
+        low = asyncio.ensure_future(job(2))
+        await started(low)
+        high = asyncio.ensure_future(job(1))
+        await started(high)
+
+        with pytest.raises(Overloaded, match="displaced"):
+            await low
+
+        release.set()
+        await asyncio.gather(running, high)
+        assert order == [0, 1]
+        assert queue.running == 0
+
+    asyncio.run(scenario())
+
+def test_jobs_expected_to_wait_too_long_are_turned_away():
+    async def scenario():
+        queue = JobQueue(concurrency=1, max_depth=10, max_wait=0.5, update_interval=60)
+        # Jobs take a second each, so a second job would wait longer than max_wait
+        queue._job_seconds = 1.0
+        release = asyncio.Event()
+        running = asyncio.ensure_future(hold(queue, 0, release))
+        await started(running)
+
+        with pytest.raises(Overloaded, match="wait"):
+            await hold(queue, 0, release)
+
+        release.set()
+        await running
+
+    asyncio.run(scenario())
+
+def test_waiting_jobs_start_in_priority_order():
+    async def scenario():
+        queue = JobQueue(concurrency=1, max_depth=10, max_wait=60, update_interval=60)
+        release = asyncio.Event()
+        order = []
+
+        async def job(priority: int) -> None:
+            async with queue.slot(priority):
+                order.append(priority)
+                await release.wait()
+
+        tasks = []
+        for priority in (0, 3, 1, 2):
+            tasks.append(asyncio.ensure_future(job(priority)))
+            await started(tasks[-1])
+        release.set()
+        await asyncio.gather(*tasks)
+        assert order == [0, 1, 2, 3]
+
+    asyncio.run(scenario())
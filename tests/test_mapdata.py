@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from utils.mapdata import HolderMap, decode_map_data, dumps, from_payload
+
+PAYLOAD = {
+    "full_name": "Test Token",
+    "symbol": "TST",
+    "chain": "eth",
+    "token_address": "0xabc",
+    "dt_update": "2024-01-01",
+    "nodes": [
+        {"address": "0xsmall", "percentage": 5, "transaction_count": 3},
+        {"address": "0xbig", "percentage": 60, "is_contract": True},
+        {"address": "0xmid", "percentage": 35, "transaction_count": 7}
+    ],
+    "links": [
+        {"source": 0, "target": 1},
+        {"source": 2, "target": 7},
+        {"source": 2, "target": 0}
+    ]
+}
+
+def test_from_payload_orders_holders_and_remaps_links():
+    data = from_payload(PAYLOAD)
+    assert data.title == "Test Token (TST)"
+    assert data.addresses == ["0xbig", "0xmid", "0xsmall"]
+    assert data.percentages.tolist() == [60, 35, 5]
+    assert data.transaction_counts.tolist() == [0, 7, 3]
+    assert data.contracts.tolist() == [True, False, False]
+    # The link to a missing node is dropped; the others follow their nodes
+    assert list(zip(data.sources.tolist(), data.targets.tolist())) == [(2, 0), (1, 2)]
+
+def test_missing_fields_get_defaults():
+    data = from_payload({})
+    assert data.title == "Unknown Token (UNKNOWN)"
+    assert len(data) == 0 and len(data.sources) == 0
+
+@pytest.mark.parametrize("with_addresses", [True, False])
+def test_bytes_roundtrip(with_addresses):
+    data = from_payload(PAYLOAD)
+    copy = HolderMap.from_bytes(data.to_bytes(with_addresses=with_addresses))
+
+    for name in ("full_name", "symbol", "chain", "token_address", "dt_update"):
+        assert getattr(copy, name) == getattr(data, name)
+    for name in ("percentages", "transaction_counts", "contracts", "sources", "targets"):
+        np.testing.assert_array_equal(getattr(copy, name), getattr(data, name))
+    assert copy.addresses == (data.addresses if with_addresses else [])
+
+def test_head_keeps_links_between_the_largest_holders():
+    head = from_payload(PAYLOAD).head(2)
+    assert head.addresses == ["0xbig", "0xmid"]
+    assert len(head.sources) == 0
+    assert head.stats.holders == 2
+
+def test_decode_map_data_rejects_bad_bodies():
+    assert decode_map_data(dumps(PAYLOAD)).symbol == "TST"
+    with pytest.raises(ValueError):
+        decode_map_data(b"<html>")
+    with pytest.raises(ValueError):
+        decode_map_data(b"[]")
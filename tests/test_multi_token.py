@@ -0,0 +1,50 @@
+import numpy as np
+import main
+from utils.mapdata import HolderMap
+
+EVM = "0x" + "ab" * 20
+EVM2 = "0x" + "cd" * 20
+SOL = "So11111111111111111111111111111111111111112"
+
+def holder_map(symbol: str, percentages) -> HolderMap:
+    count = len(percentages)
+    return HolderMap(
+        f"{symbol} Token", symbol, "eth", EVM, None, [f"0x{i:040x}" for i in range(count)],
+        np.array(percentages, dtype=np.float64), np.zeros(count, dtype=np.int64),
+        np.zeros(count, dtype=bool), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    )
+
+def test_chain_names_apply_to_the_addresses_after_them():
+    tokens, error = main.parse_token_list(f"{EVM} eth {EVM2} sol {SOL}")
+    assert error is None
+    assert tokens == [(None, EVM), ("eth", EVM2), ("sol", SOL)]
+
+def test_duplicates_are_dropped_case_insensitively():
+    tokens, error = main.parse_token_list(f"eth {EVM} {EVM.upper().replace('0X', '0x')}")
+    assert tokens == [("eth", EVM)] and error is None
+
+def test_invalid_and_oversized_lists_are_rejected():
+    assert main.parse_token_list("eth nonsense")[1].startswith("nonsense:")
+    assert main.parse_token_list("eth")[1] == "Please provide at least one contract address."
+
+    addresses = " ".join("0x" + f"{i:040x}" for i in range(main.MULTI_TOKEN_MAX + 1))
+    tokens, error = main.parse_token_list(f"eth {addresses}")
+    assert tokens == [] and str(main.MULTI_TOKEN_MAX) in error
+
+def test_comparison_table_has_one_column_per_token():
+    dex = {"price": 1.5, "market_cap": 2e6, "liquidity": 3e5, "price_change": {"1h": 0, "24h": -4.25}}
+    tokens = [("eth", EVM), ("eth", EVM2), ("sol", SOL)]
+    results = {
+        0: (holder_map("AAA", [30, 20, 10]), dex),
+        1: ValueError("Token not found")
+    }
+    text = main.format_comparison(tokens, results)
+    lines = text.split("\n")
+    table = lines[lines.index("```") + 1:lines.index("```", lines.index("```") + 1)]
+
+    rows = {row.split("  ")[0].strip(): row.split()[-3:] for row in table[1:]}
+    assert table[0].split() == ["AAA", "0xcdcd…", "So1111…"]
+    assert rows["24H"] == ["-4.2%", "n/a", "…"]
+    assert rows["Top20"][0] == "60.0%"
+    # Failed lookups are explained under the table; pending ones are not
+    assert lines[-1] == f"⚠️ `{EVM2}`: Token not found"
@@ -0,0 +1,70 @@
+import asyncio
+from services.persistent_cache import PersistentCache
+
+DECODERS = {"map": bytes.decode, "dex": bytes.decode}
+
+def open_cache(path, **kwargs) -> PersistentCache:
+    cache = PersistentCache(path=str(path), **kwargs)
+    cache.start()
+    return cache
+
+def compact(cache: PersistentCache) -> None:
+    cache._executor.submit(cache._flush_and_compact, cache._take_accesses()).result()
+
+def test_entries_and_hashes_survive_a_restart(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    cache = open_cache(path)
+    cache.put("map", ("eth", "0xa"), "map a", ttl=60, serialize=str.encode)
+    cache.put("dex", ("eth", "0xa"), b"dex a", ttl=60)
+    cache.put("map", ("eth", "0xb"), b"map b", ttl=60)
+    cache.put("map", ("eth", "0xexpired"), b"old", ttl=-1)
+    cache.touch(("eth", "0xa"))
+    cache.touch(("eth", "0xexpired"))
+    cache.hset("watches", "1:eth:0xa", b"10")
+    cache.hset("watches", "2:eth:0xa", b"20")
+    cache.hdel("watches", "2:eth:0xa")
+    cache.close()
+
+    cache = open_cache(path)
+    # Only tokens someone asked for are warmed, and only their live entries
+    warmed = asyncio.run(cache.warm(10, DECODERS))
+    assert sorted((kind, key, value) for kind, key, value, _ in warmed) == [
+        ("dex", ("eth", "0xa"), "dex a"),
+        ("map", ("eth", "0xa"), "map a")
+    ]
+    assert all(0 < ttl <= 60 for _, _, _, ttl in warmed)
+    assert asyncio.run(cache.hashes()) == {"watches": {"1:eth:0xa": b"10"}}
+    cache.close()
+
+def test_warm_prefers_the_most_requested_tokens(tmp_path):
+    cache = open_cache(tmp_path / "cache.sqlite3")
+    for address, hits in (("0xa", 1), ("0xb", 5), ("0xc", 3)):
+        cache.put("map", ("eth", address), address.encode(), ttl=60)
+        for _ in range(hits):
+            cache.touch(("eth", address))
+    compact(cache)
+
+    warmed = asyncio.run(cache.warm(2, DECODERS))
+    assert sorted(value for _, _, value, _ in warmed) == ["0xb", "0xc"]
+    cache.close()
+
+def test_compaction_evicts_the_least_requested_tokens(tmp_path):
+    cache = open_cache(tmp_path / "cache.sqlite3", max_bytes=250)
+    for address, hits in (("0xa", 3), ("0xb", 1), ("0xc", 2)):
+        cache.put("map", ("eth", address), b"x" * 100, ttl=60)
+        for _ in range(hits):
+            cache.touch(("eth", address))
+    cache.put("dex", ("eth", "0xd"), b"x", ttl=-1)
+    compact(cache)
+
+    rows = cache._executor.submit(
+        lambda: cache._db().execute("SELECT kind, address FROM entries ORDER BY address").fetchall()
+    ).result()
+    assert rows == [("map", "0xa"), ("map", "0xc")]
+    cache.close()
+
+def test_disabled_without_a_path():
+    cache = open_cache("")
+    cache.put("map", ("eth", "0xa"), b"x", ttl=60)
+    assert asyncio.run(cache.warm(10, DECODERS)) == []
+    assert asyncio.run(cache.hashes()) == {}
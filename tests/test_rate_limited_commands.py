@@ -0,0 +1,60 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+import main
+
+EVM = "0x" + "ab" * 20
+EVM2 = "0x" + "cd" * 20
+
+class Replies:
+    def __init__(self):
+        self.texts = []
+
+    async def reply_to(self, message, text, **kwargs):
+        self.texts.append(text)
+
+    async def answer_inline_query(self, inline_query_id, results, **kwargs):
+        self.texts.append(results)
+
+def message(text: str):
+    return SimpleNamespace(text=text, chat=SimpleNamespace(id=1, type="private"), from_user=SimpleNamespace(id=7), message_id=5)
+
+@pytest.fixture
+def limited(monkeypatch):
+    """Every user is over their limit; records any chain detection attempted anyway."""
+    detected = []
+    replies = Replies()
+
+    async def within_rate_limits(message):
+        return False
+
+    async def resolve_chain(address):
+        detected.append(address)
+        return "eth"
+
+    monkeypatch.setattr(main, "within_rate_limits", within_rate_limits)
+    monkeypatch.setattr(main, "resolve_chain", resolve_chain)
+    monkeypatch.setattr(main, "sender", replies)
+    return detected, replies
+
+@pytest.mark.parametrize("handler, text", [
+    (main.compare_command, f"/compare {EVM} {EVM2}"),
+    (main.watch_command, f"/watch {EVM} 15"),
+    (main.getinfo_command, f"/getinfo {EVM} {EVM2}")
+])
+def test_rate_limited_commands_detect_no_chains(limited, handler, text):
+    detected, replies = limited
+    asyncio.run(handler(message(text)))
+    assert detected == []
+    assert replies.texts == [main.ERROR_MESSAGES["rate_limit"]]
+
+def test_rate_limited_inline_queries_start_no_lookups(limited, monkeypatch):
+    detected, replies = limited
+
+    async def allow(key, capacity, window, cost=1):
+        return False
+
+    monkeypatch.setattr(main.shared_state, "allow", allow)
+    asyncio.run(main.inline_query(SimpleNamespace(id="1", query=EVM, from_user=SimpleNamespace(id=7))))
+    assert detected == [] and not main._inline_preparations
+    assert replies.texts == [[]]
@@ -0,0 +1,44 @@
+import pytest
+from conftest import FakeClock
+from utils.ratelimit import RateLimiter
+
+def test_burst_then_refill():
+    clock = FakeClock()
+    limiter = RateLimiter(max_requests=2, window=2, clock=clock)
+    assert limiter.is_allowed("u")
+    assert limiter.is_allowed("u")
+    assert not limiter.is_allowed("u")
+    assert limiter.retry_after("u") == pytest.approx(1)
+
+    clock.advance(1)
+    assert limiter.is_allowed("u")
+    # Other keys have their own bucket
+    assert limiter.is_allowed("v")
+
+def test_reserve_queues_callers_in_order():
+    clock = FakeClock()
+    limiter = RateLimiter(max_requests=1, window=1, clock=clock)
+    assert limiter.reserve("c") == 0
+    assert limiter.reserve("c") == pytest.approx(1)
+    assert limiter.reserve("c") == pytest.approx(2)
+
+    clock.advance(2)
+    assert limiter.reserve("c") == pytest.approx(1)
+
+def test_pause_holds_back_the_next_request():
+    clock = FakeClock()
+    limiter = RateLimiter(max_requests=3, window=3, clock=clock)
+    limiter.pause("c", 1)
+    assert limiter.reserve("c") == pytest.approx(1)
+
+    # A pause never shortens a wait that is already longer
+    limiter.pause("c", 0.5)
+    assert limiter.reserve("c") == pytest.approx(2)
+
+def test_idle_buckets_are_dropped():
+    clock = FakeClock()
+    limiter = RateLimiter(max_requests=1, window=10, clock=clock)
+    limiter.is_allowed("a")
+    clock.advance(11)
+    limiter.is_allowed("b")
+    assert len(limiter) == 1
@@ -0,0 +1,82 @@
+import asyncio
+import pytest
+from conftest import FakeClock
+from utils.resilience import CircuitBreaker, hedged
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10, clock=FakeClock())
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow() and not breaker.is_open
+
+    breaker.record_failure()
+    assert breaker.is_open
+    assert not breaker.allow()
+
+def test_breaker_lets_one_trial_through_per_period():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+
+    clock.advance(10)
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # A failed trial keeps it open for another period
+    breaker.record_failure()
+    clock.advance(5)
+    assert not breaker.allow()
+    clock.advance(5)
+    assert breaker.allow()
+
+    breaker.record_success()
+    assert not breaker.is_open
+    assert breaker.allow() and breaker.allow()
+
+class Attempts:
+    """An upstream call that never answers and remembers whether it was cancelled."""
+
+    def __init__(self):
+        self.started = 0
+        self.cancelled = 0
+
+    async def __call__(self):
+        self.started += 1
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+async def cancel_after(coro, seconds: float) -> None:
+    task = asyncio.ensure_future(coro)
+    await asyncio.sleep(seconds)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    # Let the attempts see their cancellation
+    await asyncio.sleep(0)
+
+def test_hedged_cancels_the_first_attempt_with_the_caller():
+    attempts = Attempts()
+    asyncio.run(cancel_after(hedged(attempts, delay=1), 0.01))
+    assert (attempts.started, attempts.cancelled) == (1, 1)
+
+def test_hedged_cancels_both_attempts_with_the_caller():
+    attempts = Attempts()
+    asyncio.run(cancel_after(hedged(attempts, delay=0.01), 0.05))
+    assert (attempts.started, attempts.cancelled) == (2, 2)
+
+def test_hedged_returns_the_faster_attempt():
+    calls = []
+
+    async def fetch():
+        attempt = len(calls) + 1
+        calls.append(attempt)
+        await asyncio.sleep(0.2 if attempt == 1 else 0.01)
+        return attempt
+
+    assert asyncio.run(hedged(fetch, delay=0.02)) == 2
@@ -0,0 +1,73 @@
+import asyncio
+import pytest
+from services.shared_state import RedisState, StateUnavailable
+
+fakeredis = pytest.importorskip("fakeredis")
+
+def redis_state():
+    server = fakeredis.FakeServer()
+    state = RedisState("redis://fake", prefix="test:", client=fakeredis.FakeAsyncRedis(server=server))
+    return state, server
+
+def test_values_and_hashes_go_to_redis():
+    async def scenario():
+        state, _ = redis_state()
+        await state.set("k", b"v", ttl=10)
+        await state.hset("watches", "1:eth:0xabc", b"10")
+        await state.hset("watches", "2:eth:0xabc", b"20")
+        await state.hdel("watches", "2:eth:0xabc")
+        return await state.get("k"), await state.hgetall("watches")
+
+    value, watches = asyncio.run(scenario())
+    assert value == b"v"
+    assert watches == {"1:eth:0xabc": b"10"}
+
+def test_cache_falls_back_to_local_state_while_redis_is_down():
+    async def scenario():
+        state, server = redis_state()
+        server.connected = False
+        await state.set("k", b"local", ttl=10)
+        value = await state.get("k")
+        allowed = await state.allow("ratelimit:user:1", capacity=1, window=60)
+        limited = await state.allow("ratelimit:user:1", capacity=1, window=60)
+        return value, allowed, limited
+
+    assert asyncio.run(scenario()) == (b"local", True, False)
+
+def test_locks_and_hashes_raise_while_redis_is_down():
+    async def scenario():
+        state, server = redis_state()
+        await state.hset("watches", "1:eth:0xabc", b"10")
+        server.connected = False
+        for call in (
+            state.acquire("lock:k", 10),
+            state.release("lock:k"),
+            state.hgetall("watches"),
+            state.hset("watches", "2:eth:0xabc", b"20"),
+            state.hdel("watches", "1:eth:0xabc")
+        ):
+            with pytest.raises(StateUnavailable):
+                await call
+
+        # Nothing was written to the local fallback that could later overwrite Redis
+        server.connected = True
+        return await state.hgetall("watches")
+
+    assert asyncio.run(scenario()) == {"1:eth:0xabc": b"10"}
+
+def test_get_or_load_loads_locally_while_redis_is_down():
+    async def scenario():
+        state, server = redis_state()
+        server.connected = False
+        loads = []
+
+        async def load():
+            loads.append(1)
+            return "fresh"
+
+        first = await state.get_or_load("k", load, ttl=10, lock_ttl=1, encode=str.encode, decode=bytes.decode)
+        second = await state.get_or_load("k", load, ttl=10, lock_ttl=1, encode=str.encode, decode=bytes.decode)
+        return first, second, len(loads)
+
+    # The second call is answered from the local fallback cache
+    assert asyncio.run(scenario()) == ("fresh", "fresh", 1)
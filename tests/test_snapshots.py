@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from utils.snapshots import Snapshot, decode, encode_delta, encode_keyframe, holder_ids, is_keyframe
+
+def snapshot(ids, percentages) -> Snapshot:
+    return Snapshot.from_holders(np.array(ids), np.array(percentages, dtype=np.float64))
+
+def assert_same(a: Snapshot, b: Snapshot) -> None:
+    np.testing.assert_array_equal(a.ids, b.ids)
+    np.testing.assert_array_equal(a.shares, b.shares)
+
+def test_keyframe_roundtrip():
+    first = snapshot([7, 3, 12, 5], [10.5, 20.25, 0.0001, 3])
+    blob = encode_keyframe(first)
+    assert is_keyframe(blob)
+    assert_same(decode(blob), first)
+    assert sorted(holder_ids(blob).tolist()) == [3, 5, 7, 12]
+
+def test_delta_roundtrip():
+    previous = snapshot([1, 2, 3, 4], [40, 30, 20, 10])
+    # 4 left, 9 arrived, 2 moved, 1 and 3 did not change
+    current = snapshot([1, 2, 3, 9], [40, 25, 20, 15])
+    blob = encode_delta(previous, current)
+    assert not is_keyframe(blob)
+    assert_same(decode(blob, previous), current)
+    assert set(holder_ids(blob).tolist()) == {2, 4, 9}
+
+def test_delta_chain_roundtrip():
+    rng = np.random.default_rng(1)
+    states = []
+    ids = rng.choice(10_000, size=500, replace=False)
+    for _ in range(10):
+        # Replace a few holders and move some shares
+        ids[rng.choice(len(ids), size=20, replace=False)] = rng.choice(np.arange(10_000, 20_000), size=20, replace=False)
+        ids = np.unique(ids)
+        states.append(snapshot(ids, rng.random(len(ids)) * 5))
+
+    blobs = [encode_keyframe(states[0])] + [encode_delta(a, b) for a, b in zip(states, states[1:])]
+    decoded = None
+    mentioned = set()
+    for blob, state in zip(blobs, states):
+        decoded = decode(blob, decoded)
+        assert_same(decoded, state)
+        mentioned.update(holder_ids(blob).tolist())
+        assert set(decoded.ids.tolist()) <= mentioned
+
+def test_delta_needs_its_predecessor():
+    previous = snapshot([1], [50])
+    with pytest.raises(ValueError):
+        decode(encode_delta(previous, snapshot([1], [60])))
+
+def test_repeated_ids_are_summed():
+    merged = snapshot([5, 5, 2], [1, 2, 3])
+    assert merged.ids.tolist() == [2, 5]
+    assert merged.percentages(np.array([5, 2, 8])).tolist() == [3, 3, 0]
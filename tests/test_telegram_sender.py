@@ -0,0 +1,53 @@
+import asyncio
+from types import SimpleNamespace
+from services.telegram_sender import TelegramSender
+
+class FakeBot:
+    """Records the Telegram calls that actually go out."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.calls.append(("send_message", text))
+        return SimpleNamespace(chat=SimpleNamespace(id=chat_id), message_id=len(self.calls))
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        self.calls.append(("edit_message_text", text, message_id))
+        return text
+
+def test_waiting_edit_is_superseded_by_a_newer_one():
+    async def scenario():
+        bot = FakeBot()
+        sender = TelegramSender(bot, rate=100, chat_rate=20, burst=1)
+        # Use up the chat's budget so the edits have to wait for their turn
+        await sender.send_message(1, "hello")
+        results = await asyncio.gather(*(sender.edit_message_text(f"edit {i}", 1, 42) for i in range(5)))
+        return bot.calls, results
+
+    calls, results = asyncio.run(scenario())
+    assert calls == [("send_message", "hello"), ("edit_message_text", "edit 4", 42)]
+    # Every caller gets the result of the edit that went out
+    assert results == ["edit 4"] * 5
+
+def test_edits_of_different_messages_all_go_out():
+    async def scenario():
+        bot = FakeBot()
+        sender = TelegramSender(bot, rate=100, chat_rate=20, burst=1)
+        await sender.send_message(1, "hello")
+        await asyncio.gather(sender.edit_message_text("a", 1, 42), sender.edit_message_text("b", 1, 43))
+        return bot.calls
+
+    assert sorted(asyncio.run(scenario())[1:]) == [("edit_message_text", "a", 42), ("edit_message_text", "b", 43)]
+
+def test_optional_calls_are_skipped_when_the_chat_is_out_of_budget():
+    async def scenario():
+        bot = FakeBot()
+        sender = TelegramSender(bot, rate=100, chat_rate=1, burst=1)
+        await sender.send_message(1, "hello")
+        skipped = await sender.send_message(1, "progress", optional=True)
+        return bot.calls, skipped
+
+    calls, skipped = asyncio.run(scenario())
+    assert skipped is None
+    assert calls == [("send_message", "hello")]
@@ -0,0 +1,111 @@
+import asyncio
+import numpy as np
+import pytest
+import main
+from conftest import FakeClock
+from services.warmer import CacheWarmer, WarmBudget
+from utils.mapdata import HolderMap
+
+def warmer(clock, **kwargs) -> CacheWarmer:
+    async def warm(chain, address, budget):
+        pass
+
+    options = dict(top=2, half_life=60, min_score=0.5, clock=clock)
+    options.update(kwargs)
+    return CacheWarmer(warm, **options)
+
+def test_budget_stops_at_zero():
+    budget = WarmBudget(2)
+    assert budget.take() and budget.take()
+    assert not budget.take()
+    assert (budget.left, budget.spent) == (0, 2)
+
+def test_scores_halve_every_half_life():
+    clock = FakeClock()
+    warmer_ = warmer(clock)
+    key = ("eth", "0xa")
+    warmer_.record(key, "eth", "0xa")
+    warmer_.record(key, "eth", "0xa")
+
+    clock.advance(60)
+    assert warmer_.score(key) == pytest.approx(1)
+    warmer_.record(key, "eth", "0xa")
+    clock.advance(60)
+    assert warmer_.score(key) == pytest.approx(1)
+
+def test_recent_demand_outranks_an_old_burst():
+    clock = FakeClock()
+    warmer_ = warmer(clock)
+    for _ in range(8):
+        warmer_.record(("eth", "0xburst"), "eth", "0xburst")
+    clock.advance(240)
+    for _ in range(2):
+        warmer_.record(("eth", "0xsteady"), "eth", "0xsteady")
+    clock.advance(60)
+    warmer_.record(("eth", "0xcold"), "eth", "0xcold", weight=0.1)
+
+    # burst: 8 / 32, steady: 2 / 2, cold is under min_score
+    assert warmer_.hottest() == [("eth", "0xsteady")]
+
+def test_tracking_is_bounded():
+    clock = FakeClock()
+    warmer_ = warmer(clock, max_tracked=10)
+    for i in range(11):
+        warmer_.record(("eth", str(i)), "eth", str(i), weight=i + 1)
+    assert len(warmer_) == 10
+    assert warmer_.score(("eth", "0")) == 0
+
+def test_round_spends_at_most_the_budget():
+    async def scenario():
+        warmed = []
+
+        async def warm(chain, address, budget):
+            # Each token needs two calls; the third token gets none
+            for _ in range(2):
+                if budget.take():
+                    warmed.append(address)
+
+        async def fetch_trending():
+            return [("eth", "0xhot"), ("eth", "0xtrend")]
+
+        warmer_ = CacheWarmer(warm, fetch_trending, top=3, budget=5, min_score=0, clock=FakeClock())
+        warmer_.record(("eth", "0xhot"), "eth", "0xhot")
+        spent = await warmer_.warm_round()
+        return spent, warmed
+
+    spent, warmed = asyncio.run(scenario())
+    # One call for the trending feed, four for the tokens
+    assert spent == 5
+    assert sorted(warmed) == ["0xhot", "0xhot", "0xtrend", "0xtrend"]
+
+def test_warming_shares_the_fetch_of_a_lookup_in_flight(monkeypatch):
+    address = "0x" + "ef" * 20
+    key = main.token_key("eth", address)
+    token_data = HolderMap(
+        "Test Token", "TST", "eth", address, None, ["0x" + "01" * 20], np.array([50.0]),
+        np.zeros(1, dtype=np.int64), np.zeros(1, dtype=bool), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    )
+    fetches = []
+
+    async def fetch_token_data(chain, address):
+        fetches.append(address)
+        await asyncio.sleep(0.01)
+        return token_data
+
+    async def fetch_map_image(chain, address, token_data):
+        raise ValueError("no image")
+
+    monkeypatch.setattr(main, "fetch_token_data", fetch_token_data)
+    monkeypatch.setattr(main, "fetch_map_image", fetch_map_image)
+    monkeypatch.setattr(main.holder_history, "record", lambda key, data: None)
+    main.map_cache.delete(key)
+
+    async def run():
+        return await asyncio.gather(main.get_token_data("eth", address), main.warm_token("eth", address, WarmBudget(1)))
+
+    try:
+        found, _ = asyncio.run(run())
+    finally:
+        main.map_cache.delete(key)
+    assert found is token_data
+    assert fetches == [address]
@@ -0,0 +1,102 @@
+import asyncio
+import pytest
+import main
+from services.watcher import WatchScheduler
+
+KEY = ("eth", "0xabc")
+
+def scheduler(**kwargs) -> WatchScheduler:
+    async def fetch_batch(tokens):
+        return {}
+
+    async def notify(chat_id, text):
+        pass
+
+    return WatchScheduler(fetch_batch, notify, top20_delta=5, **kwargs)
+
+def test_first_snapshot_sets_the_baseline():
+    watches = scheduler()
+    subscription, _ = watches.subscribe(1, KEY, "eth", "0xabc", 10)
+    assert watches._check(subscription, 1.0, 40.0) is None
+    assert (subscription.base_price, subscription.base_top20) == (1.0, 40.0)
+
+def test_price_alert_moves_the_baseline():
+    watches = scheduler()
+    subscription, _ = watches.subscribe(1, KEY, "eth", "0xabc", 10)
+    watches._check(subscription, 1.0, None)
+
+    assert watches._check(subscription, 1.05, None) is None
+    alert = watches._check(subscription, 0.85, None)
+    assert "Price -15.0%" in alert and "0xabc" in alert
+    assert subscription.base_price == 0.85
+    # Measured from the new baseline, not the first price
+    assert watches._check(subscription, 0.9, None) is None
+
+def test_concentration_alert():
+    watches = scheduler()
+    subscription, _ = watches.subscribe(1, KEY, "eth", "0xabc", 10)
+    watches._check(subscription, None, 40.0)
+    assert watches._check(subscription, None, 44.0) is None
+    assert "Top20 concentration +6.0 pts" in watches._check(subscription, None, 46.0)
+
+def test_per_chat_limit():
+    watches = scheduler(max_per_chat=1)
+    assert watches.subscribe(1, KEY, "eth", "0xabc")[1] is None
+    assert watches.subscribe(1, ("eth", "0xdef"), "eth", "0xdef")[1] is not None
+    # Changing an existing subscription does not count against the limit
+    assert watches.subscribe(1, KEY, "eth", "0xabc", 20)[0].threshold == 20
+
+def test_sync_keeps_baselines_and_drops_unwanted_subscriptions():
+    watches = scheduler()
+    kept, _ = watches.subscribe(1, KEY, "eth", "0xabc", 10)
+    kept.base_price = 2.0
+    watches.subscribe(2, KEY, "eth", "0xabc", 10)
+    other = ("sol", "So1")
+
+    watches.sync({
+        (1, KEY): ("eth", "0xabc", 25),
+        (3, other): ("sol", "So1", 10)
+    })
+
+    assert [s.chat_id for s in watches.tokens[KEY].subscribers.values()] == [1]
+    assert watches.subscriptions(1)[0].threshold == 25
+    assert watches.subscriptions(1)[0].base_price == 2.0
+    assert watches.subscriptions(2) == []
+    assert other in watches.tokens and len(watches) == 2
+
+    watches.sync({})
+    assert len(watches) == 0 and not watches.tokens
+
+def test_poll_sends_alerts_to_every_subscriber():
+    async def scenario():
+        prices = iter([1.0, 2.0])
+        sent = []
+
+        async def fetch_batch(tokens):
+            return {KEY: (next(prices), None) for chain, address in tokens}
+
+        async def notify(chat_id, text):
+            sent.append(chat_id)
+
+        watches = WatchScheduler(fetch_batch, notify, max_pending_alerts=1)
+        for chat_id in (1, 2, 3):
+            watches.subscribe(chat_id, KEY, "eth", "0xabc", 10)
+        batch = list(watches.tokens.values())
+        await watches._poll(batch)
+        await watches._poll(batch)
+        await asyncio.gather(*watches._alerts)
+        return sorted(sent)
+
+    assert asyncio.run(scenario()) == [1, 2, 3]
+
+EVM = "0x" + "ab" * 20
+
+def test_watch_args_threshold():
+    assert main.parse_watch_args(f"eth {EVM} 15%") == ("eth", EVM, 15.0, None)
+    assert main.parse_watch_args(EVM) == (None, EVM, None, None)
+
+@pytest.mark.parametrize("threshold", ["nan", "inf", "-inf", "0", "-5"])
+def test_watch_args_reject_non_finite_and_non_positive_thresholds(threshold):
+    chain, address, value, error = main.parse_watch_args(f"eth {EVM} {threshold}")
+    assert (chain, address, value) == (None, None, None)
+    assert main.WATCH_USAGE in error
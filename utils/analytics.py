@@ -0,0 +1,123 @@
+import struct
+import numpy as np
+from typing import Optional
+
+class HolderStats:
+    """Concentration metrics of one token's holder map. Percentages are of total supply."""
+
+    __slots__ = (
+        "holders", "top10", "top20", "gini", "hhi", "nakamoto",
+        "clusters", "clustered_wallets", "largest_cluster",
+        "cluster_top20", "cluster_hhi", "cluster_nakamoto"
+    )
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            setattr(self, name, values[name])
+
+    @property
+    def decentralization_score(self) -> float:
+        # Linked wallets count as one holder, so split supply cannot game the score
+        return max(0.0, 100 - self.cluster_top20 / 2)
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def to_bytes(self) -> bytes:
+        """Fixed-size binary form, for passing stats between processes. A missing Nakamoto count is -1."""
+        values = self.as_dict()
+        for name in ("nakamoto", "cluster_nakamoto"):
+            if values[name] is None:
+                values[name] = -1
+        return _STATS.pack(*(values[name] for name in self.__slots__))
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "HolderStats":
+        values = dict(zip(cls.__slots__, _STATS.unpack(blob)))
+        for name in ("nakamoto", "cluster_nakamoto"):
+            if values[name] < 0:
+                values[name] = None
+        return cls(**values)
+
+# Field order of HolderStats.__slots__
+_STATS = struct.Struct("<q4dqqq3dq")
+
+def cluster_labels(count: int, sources: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """
+    Connected components of the wallet link graph.
+
+    Vectorized union-find: every edge hooks the larger root onto the smaller
+    one, then pointer jumping compresses the paths. Repeats until no edge
+    joins two different roots. Each node is labelled with the smallest index
+    in its component, i.e. the cluster's biggest holder.
+    """
+    labels = np.arange(count, dtype=np.int64)
+    if count == 0 or len(sources) == 0:
+        return labels
+
+    while True:
+        root_a, root_b = labels[sources], labels[targets]
+        pending = root_a != root_b
+        if not pending.any():
+            return labels
+        low = np.minimum(root_a[pending], root_b[pending])
+        high = np.maximum(root_a[pending], root_b[pending])
+        np.minimum.at(labels, high, low)
+        # Path compression: point every node at its root
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+
+def top_n(shares: np.ndarray, count: int) -> float:
+    """Combined share of the `count` largest holders."""
+    if len(shares) <= count:
+        return float(shares.sum())
+    return float(np.partition(shares, len(shares) - count)[-count:].sum())
+
+def gini(shares: np.ndarray) -> float:
+    """Gini coefficient of the listed holdings (0 = equal, 1 = one holder has everything)."""
+    n = len(shares)
+    total = shares.sum()
+    if n == 0 or total <= 0:
+        return 0.0
+    ordered = np.sort(shares)
+    ranks = np.arange(1, n + 1)
+    return float(2 * np.dot(ranks, ordered) / (n * total) - (n + 1) / n)
+
+def hhi(shares: np.ndarray) -> float:
+    """Herfindahl-Hirschman index on the 0-10,000 scale (shares in percent)."""
+    return float(np.dot(shares, shares))
+
+def nakamoto(shares: np.ndarray, threshold: float = 50.0) -> Optional[int]:
+    """Fewest holders that together hold more than `threshold` percent, None if the listed holders never do."""
+    cumulative = np.cumsum(np.sort(shares)[::-1])
+    index = int(np.searchsorted(cumulative, threshold, side="right"))
+    return index + 1 if index < len(cumulative) else None
+
+def analyze(percentages: np.ndarray, sources: np.ndarray, targets: np.ndarray) -> HolderStats:
+    """Compute holder and cluster concentration metrics from holder percentages and wallet links."""
+    count = len(percentages)
+
+    labels = cluster_labels(count, sources, targets)
+    # Indexed by root; labels that are not a root have size 0
+    totals = np.bincount(labels, weights=percentages, minlength=count)
+    cluster_sizes = np.bincount(labels, minlength=count)
+    multi = cluster_sizes > 1
+    cluster_shares = totals[cluster_sizes > 0]
+
+    return HolderStats(
+        holders=count,
+        top10=top_n(percentages, 10),
+        top20=top_n(percentages, 20),
+        gini=gini(percentages),
+        hhi=hhi(percentages),
+        nakamoto=nakamoto(percentages),
+        clusters=int(multi.sum()),
+        clustered_wallets=int(cluster_sizes[multi].sum()),
+        largest_cluster=float(totals[multi].max()) if multi.any() else 0.0,
+        cluster_top20=top_n(cluster_shares, 20),
+        cluster_hhi=hhi(cluster_shares),
+        cluster_nakamoto=nakamoto(cluster_shares)
+    )
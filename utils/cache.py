@@ -0,0 +1,122 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+class CacheEntry:
+    """A cached value with its freshness deadlines."""
+
+    __slots__ = ("value", "expires_at", "stale_until", "negative")
+
+    def __init__(self, value: Any, expires_at: float, stale_until: float, negative: bool = False):
+        self.value = value
+        self.expires_at = expires_at
+        self.stale_until = stale_until
+        self.negative = negative
+
+class TTLCache:
+    """
+    Size-bounded LRU cache with per-entry TTL and a stale-while-revalidate window.
+
+    An entry is fresh until `ttl` has elapsed, then stale for another
+    `stale_ttl` seconds (callers may serve it while refreshing), then gone.
+    Negative entries record a known failure and are never served stale.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        stale_ttl: float = 0,
+        negative_ttl: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.peek(key) is not None
+
+    def peek(self, key: Hashable) -> Optional[CacheEntry]:
+        """Return a live entry without touching LRU order or counters."""
+        entry = self._entries.get(key)
+        if entry is None or self._clock() >= entry.stale_until:
+            return None
+        return entry
+
+    def get(self, key: Hashable) -> Optional[CacheEntry]:
+        """
+        Return the entry for `key` if it is fresh or stale, otherwise None.
+        Use `is_fresh` on the result to decide whether to revalidate.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        now = self._clock()
+        if now >= entry.stale_until:
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        if now < entry.expires_at:
+            self.hits += 1
+        else:
+            self.stale_hits += 1
+        return entry
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return self._clock() < entry.expires_at
+
+    def ttl_left(self, entry: CacheEntry) -> float:
+        """Seconds until `entry` goes stale; negative once it has."""
+        return entry.expires_at - self._clock()
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value; it is served stale for `stale_ttl` after expiry."""
+        now = self._clock()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        self._store(key, CacheEntry(value, expires_at, expires_at + self.stale_ttl))
+
+    def set_negative(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a known failure (e.g. an error message) with the shorter negative TTL."""
+        expires_at = self._clock() + (self.negative_ttl if ttl is None else ttl)
+        self._store(key, CacheEntry(value, expires_at, expires_at, negative=True))
+
+    def delete(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def _store(self, key: Hashable, entry: CacheEntry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for logging and metrics."""
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": (self.hits + self.stale_hits) / lookups if lookups else 0.0
+        }
@@ -0,0 +1,193 @@
+import json
+import struct
+import numpy as np
+from typing import List, Optional, Union
+from utils.analytics import HolderStats, analyze
+
+try:
+    import orjson
+    loads = orjson.loads
+    dumps = orjson.dumps
+except ImportError:  # Fall back to the standard library parser
+    orjson = None
+    loads = json.loads
+
+    def dumps(value) -> bytes:
+        return json.dumps(value, separators=(",", ":")).encode()
+
+_HEADER = struct.Struct("<I")
+
+class HolderMap:
+    """
+    The parts of a Bubblemaps map-data payload the bot uses, in compact form.
+
+    Per-holder fields live in NumPy arrays (one entry per node, largest
+    holder first) instead of one dict per node, so a cached map costs a few
+    bytes per holder. Analytics are computed once, on first use.
+    """
+
+    __slots__ = (
+        "full_name", "symbol", "chain", "token_address", "dt_update",
+        "addresses", "percentages", "transaction_counts", "contracts",
+        "sources", "targets", "_stats"
+    )
+
+    def __init__(
+        self,
+        full_name: str,
+        symbol: str,
+        chain: str,
+        token_address: str,
+        dt_update: Optional[str],
+        addresses: List[str],
+        percentages: np.ndarray,
+        transaction_counts: np.ndarray,
+        contracts: np.ndarray,
+        sources: np.ndarray,
+        targets: np.ndarray
+    ):
+        self.full_name = full_name
+        self.symbol = symbol
+        self.chain = chain
+        self.token_address = token_address
+        self.dt_update = dt_update
+        self.addresses = addresses
+        self.percentages = percentages
+        self.transaction_counts = transaction_counts
+        self.contracts = contracts
+        self.sources = sources
+        self.targets = targets
+        self._stats: Optional[HolderStats] = None
+
+    def __len__(self) -> int:
+        return len(self.percentages)
+
+    @property
+    def title(self) -> str:
+        return f"{self.full_name} ({self.symbol})"
+
+    @property
+    def stats(self) -> HolderStats:
+        if self._stats is None:
+            self._stats = analyze(self.percentages, self.sources, self.targets)
+        return self._stats
+
+    @stats.setter
+    def stats(self, stats: HolderStats) -> None:
+        # Computed elsewhere, e.g. by a worker process
+        self._stats = stats
+
+    @property
+    def analyzed(self) -> bool:
+        return self._stats is not None
+
+    def head(self, count: int) -> "HolderMap":
+        """The `count` largest holders and the links between them."""
+        if count >= len(self):
+            return self
+        keep = (self.sources < count) & (self.targets < count)
+        return HolderMap(
+            self.full_name, self.symbol, self.chain, self.token_address, self.dt_update,
+            self.addresses[:count], self.percentages[:count], self.transaction_counts[:count],
+            self.contracts[:count], self.sources[keep], self.targets[keep]
+        )
+
+    def to_bytes(self, with_addresses: bool = True) -> bytes:
+        """
+        Serialize for the persistent cache and worker processes: a small JSON
+        header, then the raw arrays. Jobs that do not need the wallet
+        addresses can leave them out.
+        """
+        header = dumps({
+            "full_name": self.full_name,
+            "symbol": self.symbol,
+            "chain": self.chain,
+            "token_address": self.token_address,
+            "dt_update": self.dt_update,
+            "holders": len(self),
+            "links": len(self.sources),
+            "addresses": with_addresses
+        })
+        return b"".join((
+            _HEADER.pack(len(header)),
+            header,
+            self.percentages.astype(np.float64).tobytes(),
+            self.transaction_counts.astype(np.int64).tobytes(),
+            self.contracts.astype(np.bool_).tobytes(),
+            self.sources.astype(np.int64).tobytes(),
+            self.targets.astype(np.int64).tobytes(),
+            "\n".join(self.addresses).encode() if with_addresses else b""
+        ))
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "HolderMap":
+        """Inverse of `to_bytes`. The arrays are read-only views into `blob`."""
+        (header_size,) = _HEADER.unpack_from(blob)
+        offset = _HEADER.size + header_size
+        header = loads(blob[_HEADER.size:offset])
+        holders, links = header["holders"], header["links"]
+
+        def take(dtype, count):
+            nonlocal offset
+            array = np.frombuffer(blob, dtype=dtype, count=count, offset=offset)
+            offset += array.nbytes
+            return array
+
+        percentages = take(np.float64, holders)
+        transaction_counts = take(np.int64, holders)
+        contracts = take(np.bool_, holders)
+        sources = take(np.int64, links)
+        targets = take(np.int64, links)
+        addresses = blob[offset:].decode().split("\n") if holders and header.get("addresses", True) else []
+        return cls(
+            header["full_name"], header["symbol"], header["chain"], header["token_address"], header["dt_update"],
+            addresses, percentages, transaction_counts, contracts, sources, targets
+        )
+
+def from_payload(payload: dict) -> HolderMap:
+    """Pick the fields the bot needs out of a decoded map-data payload."""
+    nodes = payload.get('nodes') or []
+    count = len(nodes)
+
+    # Largest holder first, which the formatter and cluster labels rely on
+    percentages = np.fromiter((node.get('percentage') or 0 for node in nodes), dtype=np.float64, count=count)
+    order = np.argsort(-percentages, kind="stable")
+    if not np.array_equal(order, np.arange(count)):
+        nodes = [nodes[i] for i in order]
+        percentages = percentages[order]
+    position = np.empty(count, dtype=np.int64)
+    position[order] = np.arange(count)
+
+    links = payload.get('links') or []
+    endpoints = np.fromiter(
+        (index for link in links for index in (link.get('source', -1), link.get('target', -1))),
+        dtype=np.int64,
+        count=2 * len(links)
+    ).reshape(-1, 2)
+    # Drop links that point outside the node list
+    endpoints = endpoints[((endpoints >= 0) & (endpoints < count)).all(axis=1)]
+    endpoints = position[endpoints]
+
+    return HolderMap(
+        full_name=payload.get('full_name') or 'Unknown Token',
+        symbol=payload.get('symbol') or 'UNKNOWN',
+        chain=payload.get('chain') or '',
+        token_address=payload.get('token_address') or '',
+        dt_update=payload.get('dt_update'),
+        addresses=[node.get('address') or '' for node in nodes],
+        percentages=percentages,
+        transaction_counts=np.fromiter((node.get('transaction_count') or 0 for node in nodes), dtype=np.int64, count=count),
+        contracts=np.fromiter((bool(node.get('is_contract')) for node in nodes), dtype=np.bool_, count=count),
+        sources=endpoints[:, 0].copy(),
+        targets=endpoints[:, 1].copy()
+    )
+
+def decode_map_data(raw: Union[bytes, str]) -> HolderMap:
+    """Parse a map-data response body straight into a HolderMap; the raw payload is not kept."""
+    try:
+        payload = loads(raw)
+    except ValueError as e:
+        raise ValueError(f"Invalid map-data response: {str(e)}")
+    if not isinstance(payload, dict):
+        raise ValueError("Invalid map-data response")
+    return from_payload(payload)
@@ -0,0 +1,259 @@
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+request_logger = logging.getLogger("bubbler.requests")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: "Registry" = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in sorted(self._values.items())]
+
+class Gauge(_Metric):
+    """A value that goes up and down."""
+
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in sorted(self._values.items())]
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram, as Prometheus expects."""
+
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, series in sorted(self._values.items()):
+            for bound, count in zip(self.buckets, series):
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {count}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+class Registry:
+    """Holds metrics and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> None:
+        self._metrics.append(metric)
+
+    def on_collect(self, collector: Callable[[], None]) -> None:
+        """Run `collector` before every render, e.g. to copy cache stats into gauges."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                request_logger.warning(f"Metrics collector failed: {str(e)}")
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+REGISTRY = Registry()
+
+# Bot metrics
+requests_total = Counter("bubbler_requests_total", "Handled bot requests by command and outcome", ("command", "outcome"))
+requests_in_flight = Gauge("bubbler_requests_in_flight", "Bot requests being processed", ("command",))
+request_seconds = Histogram("bubbler_request_seconds", "End-to-end request latency", ("command",))
+stage_seconds = Histogram("bubbler_stage_seconds", "Latency of each request stage", ("stage",))
+upstream_requests = Counter("bubbler_upstream_requests_total", "Upstream HTTP calls by status", ("upstream", "status"))
+upstream_seconds = Histogram("bubbler_upstream_seconds", "Upstream HTTP call latency", ("upstream", "status"))
+upstream_in_flight = Gauge("bubbler_upstream_in_flight", "Upstream HTTP calls in flight", ("upstream",))
+cache_hit_ratio = Gauge("bubbler_cache_hit_ratio", "Cache hits (fresh or stale) over lookups", ("cache",))
+cache_entries = Gauge("bubbler_cache_entries", "Entries held in each cache", ("cache",))
+coalesced_in_flight = Gauge("bubbler_coalesced_in_flight", "Shared upstream fetches in flight")
+hedged_requests = Counter("bubbler_hedged_requests_total", "Duplicate upstream calls sent because the first was slow", ("upstream",))
+worker_jobs_in_flight = Gauge("bubbler_worker_jobs_in_flight", "CPU jobs queued or running in worker processes")
+worker_restarts = Counter("bubbler_worker_restarts_total", "Worker pool restarts after a worker process died")
+warmer_calls = Counter("bubbler_warmer_upstream_calls_total", "Upstream calls made by the cache warmer", ("kind",))
+warmer_tracked = Gauge("bubbler_warmer_tracked_tokens", "Tokens whose request rate the cache warmer tracks")
+job_queue_depth = Gauge("bubbler_job_queue_depth", "Lookups waiting in the job queue")
+jobs_shed = Counter("bubbler_jobs_shed_total", "Lookups turned away by the job queue", ("reason",))
+telegram_calls = Counter("bubbler_telegram_calls_total", "Telegram API calls by method", ("method",))
+telegram_calls_saved = Counter("bubbler_telegram_calls_saved_total", "Telegram calls merged or dropped", ("reason",))
+telegram_retries = Counter("bubbler_telegram_retries_total", "Telegram calls retried after a 429")
+circuit_open = Gauge("bubbler_circuit_open", "1 while an upstream's circuit breaker is open", ("upstream",))
+
+class RequestTrace:
+    """Stage timings of one request, logged as a single structured line."""
+
+    __slots__ = ("request_id", "command", "fields", "stages", "started")
+
+    def __init__(self, command: str, **fields):
+        self.request_id = uuid.uuid4().hex[:12]
+        self.command = command
+        self.fields = fields
+        self.stages: Dict[str, float] = {}
+        self.started = time.perf_counter()
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("bubbler_request_trace", default=None)
+
+def current_request_id() -> str:
+    trace = _current_trace.get()
+    return trace.request_id if trace else "-"
+
+def annotate(**fields) -> None:
+    """Attach fields (e.g. outcome="not_found") to the current request's log line."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.fields.update(fields)
+
+@contextmanager
+def request_trace(command: str, log: bool = False, **fields) -> Iterator[RequestTrace]:
+    """
+    Time a whole request and collect its stage spans.
+
+    Tasks started inside the block inherit the trace, so spans recorded by
+    concurrent fetches land on the request that started them.
+    """
+    trace = RequestTrace(command, **fields)
+    token = _current_trace.set(trace)
+    outcome = "ok"
+    requests_in_flight.inc(command=command)
+    try:
+        yield trace
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        _current_trace.reset(token)
+        requests_in_flight.dec(command=command)
+        elapsed = time.perf_counter() - trace.started
+        request_seconds.observe(elapsed, command=command)
+        requests_total.inc(command=command, outcome=trace.fields.get("outcome", outcome))
+        if log:
+            request_logger.info(json.dumps({
+                "request_id": trace.request_id,
+                "command": command,
+                "total_ms": round(elapsed * 1000, 1),
+                "stages_ms": {name: round(value * 1000, 1) for name, value in trace.stages.items()},
+                **trace.fields
+            }, default=str))
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time one stage of the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_seconds.observe(elapsed, stage=stage)
+        trace: Optional[RequestTrace] = _current_trace.get()
+        if trace is not None:
+            trace.stages[stage] = trace.stages.get(stage, 0) + elapsed
+
+async def timed(stage: str, awaitable):
+    """Await `awaitable` inside a span; handy inside asyncio.gather."""
+    with span(stage):
+        return await awaitable
+
+@contextmanager
+def upstream_call(upstream: str) -> Iterator[Dict[str, str]]:
+    """
+    Time an upstream HTTP call. Set `status` on the yielded dict:
+
+        with upstream_call("bubblemaps") as call:
+            ...
+            call["status"] = response.status
+    """
+    call = {"status": "error"}
+    start = time.perf_counter()
+    upstream_in_flight.inc(upstream=upstream)
+    try:
+        yield call
+    finally:
+        upstream_in_flight.dec(upstream=upstream)
+        elapsed = time.perf_counter() - start
+        upstream_requests.inc(upstream=upstream, status=call["status"])
+        upstream_seconds.observe(elapsed, upstream=upstream, status=call["status"])
@@ -0,0 +1,102 @@
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List
+
+class RateLimiter:
+    """
+    Token-bucket rate limiter keyed by user or chat id.
+
+    Each key may burst up to `max_requests` and regains them at
+    `max_requests / window` per second. Checks are O(1). Buckets are kept
+    in least-recently-used order and dropped once idle long enough to have
+    refilled completely, so memory is bounded by the number of active keys.
+    """
+
+    def __init__(self, max_requests: int, window: float, clock: Callable[[], float] = time.monotonic):
+        self.max_requests = max_requests
+        self.window = window
+        self.rate = max_requests / window
+        self._clock = clock
+        # key -> [tokens, last_update]
+        self._buckets: "OrderedDict[Hashable, List[float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _refill(self, key: Hashable) -> List[float]:
+        now = self._clock()
+        self._evict_idle(now)
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(self.max_requests), now]
+        else:
+            bucket[0] = min(self.max_requests, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def is_allowed(self, key: Hashable, cost: float = 1) -> bool:
+        """Take `cost` tokens from the bucket for `key` if it has them."""
+        bucket = self._refill(key)
+        if bucket[0] < cost:
+            return False
+        bucket[0] -= cost
+        return True
+
+    def reserve(self, key: Hashable, cost: float = 1) -> float:
+        """
+        Take `cost` tokens from the bucket for `key`, going into debt if it is
+        short. Returns the seconds to wait before using them; later callers
+        queue up behind the debt, so waiters are served in order.
+        """
+        bucket = self._refill(key)
+        bucket[0] -= cost
+        return max(0.0, -bucket[0] / self.rate)
+
+    def pause(self, key: Hashable, seconds: float) -> None:
+        """Make the next request of `key` wait at least `seconds`, e.g. when the other side asked to back off."""
+        bucket = self._refill(key)
+        bucket[0] = min(bucket[0], 1 - seconds * self.rate)
+
+    def retry_after(self, key: Hashable, cost: float = 1) -> float:
+        """Seconds until `key` can make a request again."""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return 0.0
+        tokens = min(self.max_requests, bucket[0] + (self._clock() - bucket[1]) * self.rate)
+        return max(0.0, (cost - tokens) / self.rate)
+
+    def _evict_idle(self, now: float) -> None:
+        # The oldest bucket is first; anything idle for a whole window (plus any debt) is full again
+        while self._buckets:
+            key, (tokens, last_update) = next(iter(self._buckets.items()))
+            if now - last_update < self.window + max(0.0, -tokens) / self.rate:
+                break
+            del self._buckets[key]
+
+class UpstreamLimiter:
+    """
+    Global concurrency caps per upstream service.
+
+        async with upstream_limits.limit("bubblemaps"):
+            ...
+    """
+
+    def __init__(self, limits: Dict[str, int]):
+        self.limits = dict(limits)
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def limit(self, name: str) -> asyncio.Semaphore:
+        # Created lazily so they bind to the running event loop
+        semaphore = self._semaphores.get(name)
+        if semaphore is None:
+            semaphore = self._semaphores[name] = asyncio.Semaphore(self.limits[name])
+        return semaphore
+
+    def in_flight(self, name: str) -> int:
+        semaphore = self._semaphores.get(name)
+        if semaphore is None:
+            return 0
+        return self.limits[name] - semaphore._value
@@ -0,0 +1,136 @@
+import time
+import asyncio
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+class UpstreamUnavailable(ValueError):
+    """An upstream timed out or its circuit breaker is open."""
+
+class CircuitBreaker:
+    """
+    Stops calling an upstream after repeated failures.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    calls fail immediately. Every `reset_timeout` seconds one trial call is
+    let through: success closes the circuit, failure keeps it open.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        reset_timeout: float,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        now = self._clock()
+        if now - self.opened_at < self.reset_timeout:
+            return False
+        # Let this call through as the trial; the rest wait for another period
+        self.opened_at = now
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.opened_at is None and self.failures >= self.failure_threshold:
+            self.opened_at = self._clock()
+
+class LatencyTracker:
+    """Recent latencies of one upstream, for picking a hedging delay."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """The `pct` percentile of recent latencies, None until enough samples exist."""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+# Monotonic time by which the current request must be answered, if any
+_deadline: contextvars.ContextVar = contextvars.ContextVar("bubbler_request_deadline", default=None)
+
+@contextmanager
+def request_deadline(seconds: float) -> Iterator[None]:
+    """Bound every upstream call made inside the block (and tasks it starts) by one deadline."""
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def time_left(timeout: float) -> float:
+    """`timeout`, shortened to what is left of the request deadline."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return timeout
+    return min(timeout, deadline - time.monotonic())
+
+async def with_timeout(name: str, awaitable: Awaitable[Any], timeout: float) -> Any:
+    """Await within `timeout` (capped by the request deadline); time-outs raise UpstreamUnavailable."""
+    remaining = time_left(timeout)
+    if remaining <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise UpstreamUnavailable(f"{name} was skipped, the request ran out of time")
+    try:
+        return await asyncio.wait_for(awaitable, remaining)
+    except asyncio.TimeoutError:
+        raise UpstreamUnavailable(f"{name} did not respond in time")
+
+async def hedged(
+    fn: Callable[[], Awaitable[Any]],
+    delay: Optional[float],
+    on_hedge: Optional[Callable[[], None]] = None
+) -> Any:
+    """
+    Call `fn`; if it has not finished after `delay` seconds, call it again
+    and return whichever succeeds first. The loser is cancelled.
+    """
+    if delay is None:
+        return await fn()
+
+    first = asyncio.ensure_future(fn())
+    pending = {first}
+    error: Optional[BaseException] = None
+    try:
+        # Cancelling the caller cancels every attempt still running
+        done, pending = await asyncio.wait(pending, timeout=delay)
+        if done:
+            return first.result()
+
+        if on_hedge is not None:
+            on_hedge()
+        pending.add(asyncio.ensure_future(fn()))
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,152 @@
+import zlib
+import struct
+import numpy as np
+from typing import Optional, Tuple
+
+# Shares are stored as integers, in units of 1/SCALE of a percent of supply
+SCALE = 10_000
+
+KEYFRAME = 0
+DELTA = 1
+
+_KIND = struct.Struct("<B")
+_KEYFRAME_COUNTS = struct.Struct("<I")
+_DELTA_COUNTS = struct.Struct("<III")
+
+class Snapshot:
+    """
+    One token's holder distribution at one point in time.
+
+    Holders are interned address IDs, kept sorted so two snapshots can be
+    compared with array operations, next to their shares of supply as
+    integers (see SCALE).
+    """
+
+    __slots__ = ("ids", "shares")
+
+    def __init__(self, ids: np.ndarray, shares: np.ndarray):
+        self.ids = ids
+        self.shares = shares
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_holders(cls, ids: np.ndarray, percentages: np.ndarray) -> "Snapshot":
+        """Build from per-holder IDs and percentages in any order; repeated IDs are summed."""
+        ids = np.asarray(ids, dtype=np.uint32)
+        shares = np.rint(np.asarray(percentages, dtype=np.float64) * SCALE).astype(np.int32)
+        order = np.argsort(ids, kind="stable")
+        ids, shares = ids[order], shares[order]
+        ids, starts = np.unique(ids, return_index=True)
+        if len(ids) < len(order):
+            shares = np.add.reduceat(shares, starts).astype(np.int32)
+        return cls(ids, shares)
+
+    def largest(self, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        """IDs and percentages of the `count` largest holders, largest first."""
+        order = np.argsort(-self.shares, kind="stable")[:count]
+        return self.ids[order], self.shares[order] / SCALE
+
+    def percentages(self, ids: np.ndarray) -> np.ndarray:
+        """Percentage held by each of `ids`; 0 for holders not in the snapshot."""
+        ids = np.asarray(ids, dtype=np.uint32)
+        if len(self.ids) == 0:
+            return np.zeros(len(ids))
+        index = np.minimum(np.searchsorted(self.ids, ids), len(self.ids) - 1)
+        found = self.ids[index] == ids
+        return np.where(found, self.shares[index], 0) / SCALE
+
+def _gaps(ids: np.ndarray) -> bytes:
+    # Sorted IDs as differences from the previous one: small numbers that compress well
+    return np.diff(ids, prepend=np.uint32(0)).astype(np.uint32).tobytes()
+
+def _ungap(blob: bytes, offset: int, count: int) -> Tuple[np.ndarray, int]:
+    gaps = np.frombuffer(blob, dtype=np.uint32, count=count, offset=offset)
+    return np.cumsum(gaps, dtype=np.uint32), offset + gaps.nbytes
+
+def _int32(blob: bytes, offset: int, count: int) -> Tuple[np.ndarray, int]:
+    values = np.frombuffer(blob, dtype=np.int32, count=count, offset=offset)
+    return values, offset + values.nbytes
+
+def encode_keyframe(snapshot: Snapshot) -> bytes:
+    """A snapshot that decodes on its own."""
+    payload = b"".join((
+        _KEYFRAME_COUNTS.pack(len(snapshot)),
+        _gaps(snapshot.ids),
+        snapshot.shares.astype(np.int32).tobytes()
+    ))
+    return _KIND.pack(KEYFRAME) + zlib.compress(payload)
+
+def encode_delta(previous: Snapshot, current: Snapshot) -> bytes:
+    """
+    `current` as changes against `previous`: holders that left, holders that
+    arrived with their shares, and share changes of the rest. Holders whose
+    share did not move cost nothing.
+    """
+    _, in_previous, in_current = np.intersect1d(previous.ids, current.ids, assume_unique=True, return_indices=True)
+    removed = np.delete(previous.ids, in_previous)
+    arrived = np.ones(len(current), dtype=bool)
+    arrived[in_current] = False
+    changes = current.shares[in_current].astype(np.int64) - previous.shares[in_previous]
+    changed = changes != 0
+
+    payload = b"".join((
+        _DELTA_COUNTS.pack(len(removed), int(arrived.sum()), int(changed.sum())),
+        _gaps(removed),
+        _gaps(current.ids[arrived]),
+        current.shares[arrived].astype(np.int32).tobytes(),
+        _gaps(current.ids[in_current[changed]]),
+        changes[changed].astype(np.int32).tobytes()
+    ))
+    return _KIND.pack(DELTA) + zlib.compress(payload)
+
+def is_keyframe(blob: bytes) -> bool:
+    return _KIND.unpack_from(blob)[0] == KEYFRAME
+
+def holder_ids(blob: bytes) -> np.ndarray:
+    """
+    Every holder ID a snapshot mentions, without decoding its chain. The
+    holders of any snapshot are among the IDs its keyframe and the deltas
+    up to it mention.
+    """
+    (kind,) = _KIND.unpack_from(blob)
+    payload = zlib.decompress(blob[_KIND.size:])
+    if kind == KEYFRAME:
+        (count,) = _KEYFRAME_COUNTS.unpack_from(payload)
+        return _ungap(payload, _KEYFRAME_COUNTS.size, count)[0]
+
+    removed_count, arrived_count, changed_count = _DELTA_COUNTS.unpack_from(payload)
+    removed, offset = _ungap(payload, _DELTA_COUNTS.size, removed_count)
+    arrived, offset = _ungap(payload, offset, arrived_count)
+    _, offset = _int32(payload, offset, arrived_count)
+    changed, _ = _ungap(payload, offset, changed_count)
+    return np.concatenate((removed, arrived, changed))
+
+def decode(blob: bytes, previous: Optional[Snapshot] = None) -> Snapshot:
+    """Inverse of `encode_keyframe`, or of `encode_delta` given the same `previous`."""
+    (kind,) = _KIND.unpack_from(blob)
+    payload = zlib.decompress(blob[_KIND.size:])
+
+    if kind == KEYFRAME:
+        (count,) = _KEYFRAME_COUNTS.unpack_from(payload)
+        ids, offset = _ungap(payload, _KEYFRAME_COUNTS.size, count)
+        shares, _ = _int32(payload, offset, count)
+        return Snapshot(ids, shares.copy())
+
+    if previous is None:
+        raise ValueError("A delta snapshot needs the snapshot before it")
+    removed_count, arrived_count, changed_count = _DELTA_COUNTS.unpack_from(payload)
+    removed, offset = _ungap(payload, _DELTA_COUNTS.size, removed_count)
+    arrived, offset = _ungap(payload, offset, arrived_count)
+    arrived_shares, offset = _int32(payload, offset, arrived_count)
+    changed, offset = _ungap(payload, offset, changed_count)
+    changes, _ = _int32(payload, offset, changed_count)
+
+    keep = ~np.isin(previous.ids, removed, assume_unique=True)
+    ids, shares = previous.ids[keep], previous.shares[keep].copy()
+    shares[np.searchsorted(ids, changed)] += changes
+    ids = np.concatenate((ids, arrived))
+    shares = np.concatenate((shares, arrived_shares))
+    order = np.argsort(ids, kind="stable")
+    return Snapshot(ids[order], shares[order])